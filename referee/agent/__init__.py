@@ -10,7 +10,12 @@ from ..game import Action, PlayerColor, PlayerException
 from ..options import PlayerLoc, TIME_LIMIT_NOVALUE
 from .client import RemoteProcessClassClient, AsyncProcessStatus, \
     WrappedProcessException
+from .io import CallLatency, LATENCY_STAGES, _IDLE, _PONDER
 from .resources import ResourceLimitException
+from .pool import AgentProcessPool
+from .forkserver import enable_forkserver
+from .affinity import physical_cores
+from .inprocess import InProcessPlayer
 
 RECV_TIMEOUT = TIME_LIMIT_NOVALUE # Max seconds for agent to reply (wall clock)
 
@@ -35,6 +40,18 @@ class AgentProxyPlayer(Player):
         log: LogStream = NullLogger(),
         intercept_exc_type: Type[Exception] = PlayerException,
         subproc_output: bool = True,
+        pool: AgentProcessPool | None = None,
+        forkserver: bool = False,
+        ponder: bool = False,
+        ponder_cap: float | None = None,
+        board_mirror: str | None = None,
+        time_accounting: str = "tree",
+        space_accounting: str = "rss",
+        space_rlimit: bool = False,
+        gc_policy: str = "full",
+        host: tuple[str, int] | None = None,
+        seed: int | None = None,
+        cpus: frozenset[int] | None = None,
     ):
         '''
         Create an agent proxy player.
@@ -57,6 +74,36 @@ class AgentProxyPlayer(Player):
             caught from the agent process. 
         subproc_output: Whether to print the agent's stderr stream to the
             terminal. This is useful for debugging.
+        pool: If given, the agent process is taken from (and returned to) this
+            pool of warm processes, rather than started for this game only.
+        forkserver: Whether to fork the agent process from the fork server
+            (see `forkserver.py`) rather than starting a new interpreter.
+        ponder: Whether to let the agent think during its opponent's turn, if
+            it has a `ponder(signal, **referee)` method (see `PonderSignal`).
+        ponder_cap: If None, pondering CPU time counts towards the agent's
+            time limit. Otherwise, pondering is stopped after this many
+            seconds of CPU time per opponent turn, and is not counted.
+        board_mirror: Name of the shared memory board mirror (see
+            `referee.game.mirror`), passed to the agent's constructor.
+        time_accounting: How the agent is charged for time (see
+            `TIME_ACCOUNTING_MODES`). By default, this is the CPU time of the
+            agent process and any child processes it starts.
+        space_accounting: How the agent is charged for space (see
+            `SPACE_ACCOUNTING_MODES`). By default, this is the resident set
+            size of the agent process, sampled throughout each call.
+        space_rlimit: Whether to also limit the address space of the agent
+            process, so that allocations beyond the space limit fail
+            immediately (as a resource limit exception).
+        gc_policy: How garbage is collected in the agent process (see
+            `GC_POLICIES`). By default, all garbage is collected before each
+            call, off the clock.
+        host: Address (host, port) of an agent host to run the agent process
+            on (see `RemoteSocketPlayer`), rather than a local subprocess.
+        seed: If given, the agent process seeds its random number generators
+            (`random`, and numpy's if loaded) with this before constructing
+            the agent, so that games can be reproduced.
+        cpus: If given, the agent process (if local) is pinned to these CPUs
+            (see `referee.agent.affinity`).
         '''
         super().__init__(color)
 
@@ -72,21 +119,39 @@ class AgentProxyPlayer(Player):
             recv_timeout = RECV_TIMEOUT, 
             subproc_output = subproc_output,
             log = log,
+            forkserver = forkserver,
+            time_accounting = time_accounting,
+            space_accounting = space_accounting,
+            space_rlimit = space_rlimit,
+            gc_policy = gc_policy,
+            host = host,
+            seed = seed,
+            cpus = cpus,
             # Class constructor arguments (passed to agent)
-            color = color
+            color = color,
+            **({"board_mirror": board_mirror} if board_mirror else {}),
         )
         self._log = log
         self._ret_symbol = f"⤷" if log.setting("unicode") else "->"
         self._InterceptExc = intercept_exc_type
+        self._pool = pool
+        self._failed = False
+        self._ponder = ponder
+        self._ponder_cap = ponder_cap
+        self._space_accounting = space_accounting
 
     @contextmanager
     def _intercept_exc(self):
         try:
             yield
 
+        # Whatever happened, the agent process is not in a known state after
+        # an exception and must not be reused for another game (see 'pool').
+
         # Reraising exceptions as PlayerExceptions to determine win/loss
         # outcomes in calling code (see the 'game' module).
         except ResourceLimitException as e:
+            self._failed = True
             self._log.error(f"resource limit exceeded (pid={self._agent.pid}): {str(e)}")
             self._log.error("\n")
             self._log.error(self._summarise_status(self._agent.status))
@@ -98,6 +163,7 @@ class AgentProxyPlayer(Player):
             )
 
         except WrappedProcessException as e:
+            self._failed = True
             err_lines = str(e.args[1]["stacktrace_str"]).splitlines()
 
             self._log.error(f"exception caught (pid={self._agent.pid}):")
@@ -112,6 +178,7 @@ class AgentProxyPlayer(Player):
             )
         
         except EOFError as e:
+            self._failed = True
             self._log.error(f"EOFError caught (pid={self._agent.pid}):")
 
             raise self._InterceptExc(
@@ -119,18 +186,39 @@ class AgentProxyPlayer(Player):
                 self._color
             )
 
+        except BaseException:
+            self._failed = True
+            raise
+
     async def __aenter__(self) -> 'AgentProxyPlayer':
         # Import the agent class (in a separate process). Note: We are wrapping
         # another async context manager here, so need to use the __aenter__ and
         # __aexit__ methods.
-        self._log.debug(f"creating agent subprocess...")
+        self._failed = False
         with self._intercept_exc():
-            await self._agent.__aenter__()
+            if self._pool is None:
+                self._log.debug(f"creating agent subprocess...")
+                await self._agent.__aenter__()
+            else:
+                self._log.debug(f"starting agent from process pool...")
+                await self._pool.start(self._agent)
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
-        await self._agent.__aexit__(exc_type, exc_value, traceback)
-        self._log.debug(f"agent process terminated")
+        if self._pool is None:
+            await self._agent.__aexit__(exc_type, exc_value, traceback)
+            self._log.debug(f"agent process terminated")
+        else:
+            # The process can be reused if this agent finished cleanly, even
+            # if the game ended early due to the other player.
+            reuse = not self._failed and (exc_type is None
+                or issubclass(exc_type, PlayerException))
+            if reuse and self._ponder and self._agent.alive:
+                # Stop any pondering (e.g. if the opponent's move ended the
+                # game), which would otherwise go on while the process idles
+                self._agent.notify(_IDLE)
+            await self._pool.release(self._agent, reuse)
+            self._log.debug(f"agent process released to pool (reuse={reuse})")
 
     async def action(self) -> Action:
         """
@@ -156,16 +244,120 @@ class AgentProxyPlayer(Player):
 
         self._log.debug(self._summarise_status(self._agent.status))
 
+    async def update_and_action(
+        self, 
+        color: PlayerColor, 
+        action: Action
+    ) -> Action:
+        """
+        Update the agent with the latest action and get its next action, in a
+        single (pipelined) round trip to the agent process.
+        """
+        self._log.debug(
+            f"call 'update({color!r}, {action!r})' + 'action()' (pipelined)...")
+
+        with self._intercept_exc():
+            _, next_action = await self._agent.pipeline(
+                ("update", (color, action), {}),
+                ("action", (), {}),
+            )
+
+        self._log.debug(f"{self._ret_symbol} {next_action!r}")
+        self._log.debug(self._summarise_status(self._agent.status))
+        return next_action
+
+    @property
+    def status(self) -> AsyncProcessStatus | None:
+        """
+        Resource usage status reported by the agent process after the last
+        call made to it.
+        """
+        return self._agent.status
+
+    @property
+    def preemptions(self) -> int | None:
+        """
+        Involuntary context switches of the agent process so far, or None if
+        unknown (e.g. on an agent host).
+        """
+        return self._agent.preemptions
+
+    @property
+    def call_latencies(self) -> list[CallLatency]:
+        """
+        Latency breakdown of each call made to the agent this game.
+        """
+        return self._agent.latencies
+
+    async def ponder(self):
+        """
+        Let the agent think in the background during the opponent's turn
+        (if enabled). The agent stops pondering when its next message
+        arrives.
+        """
+        if not self._ponder:
+            return
+        with self._intercept_exc():
+            self._agent.notify(_PONDER, self._ponder_cap)
+
     def _summarise_status(self, status: AsyncProcessStatus | None):
         if status is None:
             return "resources usage status: unknown\n"
 
         time_str = f"  time:  +{status.time_delta:6.3f}s  (just elapsed)   "\
-                   f"  {status.time_used:7.3f}s  (game total)\n"
+                   f"  {status.time_used:7.3f}s  (game total)\n"\
+                   f"         +{status.time_serialise:6.3f}s  (reply "\
+                   f"serialisation, not counted)\n"
+        if status.time_ponder > 0:
+            time_str += f"         +{status.time_ponder:6.3f}s  (pondering, "\
+                        f"{'not ' if self._ponder_cap is not None else ''}"\
+                        f"counted)\n"
+        time_str += f"  cpu:   +{status.time_cpu_thread:6.3f}s  (agent thread) "\
+                    f" +{status.time_cpu_threads:6.3f}s  (other threads) "\
+                    f" +{status.time_cpu_children:6.3f}s  (child processes) "\
+                    f" over +{status.time_compute:6.3f}s wall clock\n"
+        time_str += f"  gc:    +{status.time_gc:6.3f}s  (before call, not "\
+                    f"counted)  +{status.time_gc_auto:6.3f}s  (in "\
+                    f"{status.gc_collections} automatic collections, counted)"\
+                    f"\n"
+        latencies = self._agent.latencies
+        if latencies:
+            time_str += "  call:  " + "  ".join(
+                f"{stage} {getattr(latencies[-1], stage) * 1000:.3f}ms"
+                for stage in LATENCY_STAGES
+            ) + "  (last call, wall clock)\n"
         space_str = ""
         if status.space_known:
             space_str = f"  space: {status.space_curr:7.3f}MB (current usage)  "\
-                        f"  {status.space_peak:7.3f}MB (peak usage)\n"
+                        f"  {status.space_peak:7.3f}MB (peak usage)  "\
+                        f"  {status.space_call_peak:7.3f}MB (peak this call, "\
+                        f"{self._space_accounting})\n"
         else:
             space_str = "  space: unknown (check platform)\n"
         return f"resources usage status:\n{time_str}{space_str}"
+
+
+class RemoteSocketPlayer(AgentProxyPlayer):
+    """
+    An `AgentProxyPlayer` whose agent process is run by an agent host (see
+    `referee.agent.host`), e.g. on another machine, connected over TCP. The
+    agent's time and space are measured and limited on the host, and reported
+    as for a local agent process.
+    """
+
+    def __init__(self,
+        name: str,
+        color: PlayerColor,
+        agent_loc: PlayerLoc,
+        address: tuple[str, int],
+        time_limit: float | None,
+        space_limit: float | None,
+        **kwargs
+    ):
+        '''
+        Create a remote agent player. `address` is the (host, port) address
+        of the agent host, and other arguments are as for `AgentProxyPlayer`
+        (except `forkserver`, which is up to the host).
+        '''
+        super().__init__(name, color, agent_loc, time_limit, space_limit,
+            host=address, **kwargs)
@@ -0,0 +1,78 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# CPU affinity for agent processes. When games are played in parallel, agents
+# that spend a wall-clock budget (e.g. searching until `time.time()` passes a
+# deadline) get less done if they share cores with other agents, skewing
+# results. Agent processes can instead be pinned to dedicated physical cores
+# (each with all of its hardware threads, so no other agent runs on a sibling
+# hyperthread), and the contention they still see measured from their
+# involuntary context switches (preemptions). Linux only.
+
+import os
+from pathlib import Path
+
+_CPU_DIR = Path("/sys/devices/system/cpu")
+
+
+def physical_cores() -> list[frozenset[int]]:
+    """
+    The physical cores available to this process, each as the set of its
+    logical CPUs (hardware threads) that are available to this process.
+    """
+    available = os.sched_getaffinity(0)
+    cores: dict[frozenset[int], None] = {}
+    for cpu in sorted(available):
+        try:
+            siblings = _parse_cpu_list((_CPU_DIR /
+                f"cpu{cpu}/topology/thread_siblings_list").read_text())
+        except OSError:
+            siblings = {cpu}
+        cores[frozenset(siblings & available)] = None
+    return list(cores)
+
+
+def _parse_cpu_list(text: str) -> set[int]:
+    # e.g. "0-3,8,10-11"
+    cpus = set()
+    for part in text.strip().split(","):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def pin_process(pid: int, cpus: frozenset[int]):
+    """
+    Restrict a process (all of its threads, and any threads or processes it
+    starts from now on) to the given CPUs.
+    """
+    try:
+        threads = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        threads = [pid]
+    for tid in threads:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except ProcessLookupError:
+            pass
+
+
+def process_preemptions(pid: int) -> int | None:
+    """
+    Total involuntary context switches of a process' threads so far (times
+    they were descheduled while still runnable), or None if unknown.
+    """
+    try:
+        threads = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return None
+    total = 0
+    for tid in threads:
+        try:
+            status = Path(f"/proc/{pid}/task/{tid}/status").read_text()
+        except OSError:
+            continue # (the thread has exited)
+        for line in status.splitlines():
+            if line.startswith("nonvoluntary_ctxt_switches:"):
+                total += int(line.split()[1])
+    return total
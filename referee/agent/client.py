@@ -1,16 +1,26 @@
 # COMP30024 Artificial Intelligence, Semester 1 2024
 # Project Part B: Game Playing Agent
 
+import signal
 import sys
+import time
 from asyncio import subprocess, wait_for
 from asyncio.subprocess import create_subprocess_exec, Process
-from asyncio.exceptions import TimeoutError as AIOTimeoutError
+from asyncio.exceptions import TimeoutError as AIOTimeoutError, \
+    IncompleteReadError
 from typing import Any
 
 from ..log import NullLogger, LogStream
 from .resources import ResourceLimitException
-from .io import AsyncProcessStatus, m_pickle, m_unpickle,\
-    _SUBPROC_MODULE, _ACK, _REPLY_OK, _REPLY_EXC, _CHUNK_LIMIT_KB
+from .affinity import pin_process, process_preemptions
+from .forkserver import ForkedProcess, create_forked_process
+from .remote import HostedProcess, create_hosted_process
+from .io import AsyncProcessStatus, CallLatency, m_pickle, m_frame, \
+    m_frame_length, m_unframe_reply, _SUBPROC_MODULE, _ACK, _RESET, _REPLY_OK, _REPLY_EXC, \
+    _FRAME_HEADER
+
+_EXIT_WAIT_TIMEOUT = 1.0 # Seconds to wait for a process after EOF
+
 
 class WrappedProcessException(Exception):
     pass
@@ -29,6 +39,14 @@ class RemoteProcessClassClient:
         subproc_output: bool,
         *cons_args, 
         log: LogStream=NullLogger(),
+        forkserver: bool=False,
+        time_accounting: str="tree",
+        space_accounting: str="rss",
+        space_rlimit: bool=False,
+        gc_policy: str="full",
+        host: tuple[str, int] | None=None,
+        seed: int | None=None,
+        cpus: frozenset[int] | None=None,
         **cons_kwargs
     ):
         self._pkg = pkg
@@ -39,11 +57,23 @@ class RemoteProcessClassClient:
         self._recv_timeout = recv_timeout
         self._subproc_output = subproc_output
         self._log = log
+        self._forkserver = forkserver
+        self._time_accounting = time_accounting
+        self._space_accounting = space_accounting
+        self._space_rlimit = space_rlimit
+        self._gc_policy = gc_policy
+        self._host = host
+        self._seed = seed
+        self._cpus = cpus
         self._cons_args = cons_args
         self._cons_kwargs = cons_kwargs
-        self._proc: Process | None = None
+        self._proc: Process | ForkedProcess | HostedProcess | None = None
         self._status: AsyncProcessStatus | None = None
         self._killed: bool = False
+        # Timings of the last send (serialise, write, time sent), if the
+        # replies to come are for method calls, and the latency of each call
+        self._sent: tuple[float, float, float] | None = None
+        self._latencies: list[CallLatency] = []
 
     @property
     def pid(self) -> int:
@@ -54,15 +84,74 @@ class RemoteProcessClassClient:
     def status(self) -> AsyncProcessStatus | None:
         return self._status
 
-    async def _recv_reply(self):
+    @property
+    def preemptions(self) -> int | None:
+        """
+        Involuntary context switches of the (local) subprocess so far, or
+        None if unknown (see `process_preemptions`).
+        """
+        if self._proc is None or self._host is not None:
+            return None
+        return process_preemptions(self._proc.pid)
+
+    def _pin(self):
+        # Pin the (local) subprocess to its CPUs, if any were given
+        assert self._proc is not None
+        if self._cpus is not None and self._host is None:
+            pin_process(self._proc.pid, self._cpus)
+
+    @property
+    def latencies(self) -> list[CallLatency]:
+        """
+        Latency breakdown of each method call made since the class instance
+        was (re-)constructed.
+        """
+        return self._latencies
+
+    @property
+    def key(self) -> tuple[str, str, bool, tuple[str, int] | None]:
+        """
+        Processes with equal keys can be reused for one another (see
+        `adopt`).
+        """
+        return (self._pkg, self._cls, self._subproc_output, self._host)
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None \
+            and not self._killed
+
+    async def _recv_frame(self) -> bytes:
         assert self._proc is not None
         assert self._proc.stdout is not None
+        try:
+            header = await self._proc.stdout.readexactly(_FRAME_HEADER.size)
+            return await self._proc.stdout.readexactly(m_frame_length(header))
+        except IncompleteReadError as e:
+            if await self._exited_with(signal.SIGXCPU):
+                # Killed by the kernel for exceeding its CPU deadline while
+                # unable to raise an exception (see `CpuDeadline`)
+                self._killed = True
+                raise ResourceLimitException(
+                    f"exceeded available time") from e
+            raise EOFError("expected result, got EOF") from e
+
+    async def _exited_with(self, signum: int) -> bool:
+        assert self._proc is not None
+        try:
+            await wait_for(self._proc.wait(), timeout=_EXIT_WAIT_TIMEOUT)
+        except AIOTimeoutError:
+            return False
+        return self._proc.returncode == -signum
+
+    async def _recv_reply(self):
+        assert self._proc is not None
         # Read reply from subprocess (with hard timeout)
         self._log.debug(
             f"waiting for reply from subprocess {self._proc.pid} (stdout)")
         try:
-            line = await wait_for(
-                self._proc.stdout.readline(),
+            payload = await wait_for(
+                self._recv_frame(),
                 timeout=self._recv_timeout
             )
         except AIOTimeoutError as e:
@@ -75,10 +164,40 @@ class RemoteProcessClassClient:
                 f"({self._recv_timeout}s) exceeded"
             ) from e
 
-        if not line:
-            raise EOFError("expected result, got EOF")
+        reply = m_unframe_reply(payload)
+        if self._sent is not None:
+            self._record_latency(reply[0], time.monotonic())
+        return await self._process_reply(reply)
 
-        return await self._process_reply(m_unpickle(line))
+    def _record_latency(self, status: AsyncProcessStatus, read_time: float):
+        assert self._sent is not None
+        serialise, write, sent_time = self._sent
+        self._latencies.append(CallLatency(
+            serialise=serialise,
+            write=write,
+            queue=max(0.0, status.time_recv - sent_time),
+            gc=status.time_gc,
+            compute=status.time_compute,
+            reply_serialise=status.time_serialise,
+            read=max(0.0, read_time - status.time_reply),
+        ))
+
+    async def _send_calls(
+        self,
+        *calls: tuple[str, tuple[Any, ...], dict[str, Any]]
+    ):
+        # Send method call requests, timing serialisation and the write. For
+        # pipelined calls these times are for the whole batch.
+        assert self._proc is not None
+        assert self._proc.stdin is not None
+        start_time = time.monotonic()
+        data = b"".join(m_frame(call) for call in calls)
+        framed_time = time.monotonic()
+        self._proc.stdin.write(data)
+        await self._proc.stdin.drain()
+        sent_time = time.monotonic()
+        self._sent = (framed_time - start_time, sent_time - framed_time,
+            sent_time)
 
     async def _process_reply(self, reply: tuple[Any, ...]):
         assert self._proc is not None
@@ -120,24 +239,40 @@ class RemoteProcessClassClient:
         self._killed = True
 
     async def __aenter__(self):
-        # Start subprocess
-        self._proc = await create_subprocess_exec(
-            sys.executable, "-m", _SUBPROC_MODULE,
-            m_pickle((
-                self._pkg, self._cls,
-                self._time_limit, self._space_limit,
-                self._res_limit_tolerance,
-                self._cons_args, 
-                self._cons_kwargs
-            )),
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL if not self._subproc_output else None,
-            limit = _CHUNK_LIMIT_KB * 1000
-        )
+        self._sent = None
+        self._latencies = []
+
+        # Start subprocess (or fork it from the fork server, or start it on
+        # an agent host)
+        payload = m_pickle((
+            self._pkg, self._cls,
+            self._time_limit, self._space_limit,
+            self._res_limit_tolerance,
+            self._time_accounting,
+            self._space_accounting,
+            self._space_rlimit,
+            self._gc_policy,
+            self._seed,
+            self._cons_args, 
+            self._cons_kwargs
+        ))
+        if self._host is not None:
+            self._proc = await create_hosted_process(
+                self._host, payload, self._subproc_output)
+        elif self._forkserver:
+            self._proc = await create_forked_process(
+                payload, self._subproc_output)
+        else:
+            self._proc = await create_subprocess_exec(
+                sys.executable, "-m", _SUBPROC_MODULE, payload,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL if not self._subproc_output else None,
+            )
         assert self._proc is not None
         assert self._proc.stdin is not None
         self._log.debug(f"subprocess {self._proc.pid} started")
+        self._pin()
         
         # Expect ack that constructor was called
         try:
@@ -171,6 +306,69 @@ class RemoteProcessClassClient:
             raise RuntimeError(f"subprocess exited with code "
                                f"{self._proc.returncode}")
 
+    async def adopt(self, other: 'RemoteProcessClassClient'):
+        """
+        Take over the running subprocess of another (idle) client with the
+        same key (or this client's own, from a previous game), and
+        re-initialise it for this client: the class instance is reconstructed
+        with this client's constructor arguments, and resource usage is
+        tracked afresh under this client's limits. This avoids the
+        cost of starting a new interpreter and re-importing the class.
+        """
+        assert other.key == self.key and other.alive
+        if other is not self:
+            self._proc, other._proc = other._proc, None
+        assert self._proc is not None
+        assert self._proc.stdin is not None
+        self._pin()
+
+        self._log.debug(
+            f"re-initialising class '{self._pkg}:{self._cls}' "
+            f"on subprocess {self._proc.pid}"
+        )
+        self._sent = None
+        self._latencies = []
+        self._proc.stdin.write(m_frame((_RESET, (
+            self._time_limit, self._space_limit, self._res_limit_tolerance,
+            self._time_accounting, self._space_accounting, self._space_rlimit,
+            self._gc_policy, self._seed, self._cons_args, self._cons_kwargs
+        ), {})))
+        assert await self._recv_reply() == _ACK
+
+    def notify(self, name: str, *args, **kwargs):
+        """
+        Send a method call request for which no reply is expected (e.g. to
+        start pondering, see `subprocess.py`).
+        """
+        assert self._proc is not None
+        assert self._proc.stdin is not None
+
+        self._log.debug(
+            f"send notification '{name}' to subprocess {self._proc.pid} "
+            f"(stdin)"
+        )
+        self._proc.stdin.write(m_frame((name, args, kwargs)))
+
+    async def pipeline(
+        self, 
+        *calls: tuple[str, tuple[Any, ...], dict[str, Any]]
+    ) -> list[Any]:
+        """
+        Send several method calls (name, args, kwargs) at once and then wait
+        for their replies, in order. This costs one round trip rather than one
+        per call. If a call raises, its exception is raised immediately and
+        the remaining replies are not awaited.
+        """
+        assert self._proc is not None
+        assert self._proc.stdin is not None
+
+        self._log.debug(
+            f"send {len(calls)} pipelined method call requests to "
+            f"subprocess {self._proc.pid} (stdin)"
+        )
+        await self._send_calls(*calls)
+        return [await self._recv_reply() for _ in calls]
+
     # Support "transparent" method calls on subprocess class instance
     def __getattr__(self, name):
         if name.startswith("_"):
@@ -186,7 +384,7 @@ class RemoteProcessClassClient:
                 f"send method call request to subprocess "
                 f"{self._proc.pid} (stdin)"
             )
-            self._proc.stdin.write(m_pickle((name, args, kwargs)))
+            await self._send_calls((name, args, kwargs))
             return await self._recv_reply()
 
         return call
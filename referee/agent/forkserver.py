@@ -0,0 +1,279 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Fork-server launcher for agent subprocesses. Starting an agent normally means
+# booting a fresh interpreter and importing the referee, numpy and the agent
+# package, once per agent per game. With the fork server enabled, a single
+# long-lived template process imports all of that once, and each agent is a
+# fork of it. The agent's end of a socket pair is passed to the server (over a
+# control socket) and installed as the fork's stdin/stdout, after which the
+# usual subprocess entry point runs unchanged, so resource tracking (including
+# the `set_space_line` baseline) is set up afresh in every agent.
+#
+# Control protocol (one pickled message per packet):
+#
+#   referee -> server   (payload, subproc_output) + agent socket fd
+#   server -> referee   (_PID, pid)              reply to each spawn request
+#   server -> referee   (_EXIT, pid, returncode) whenever an agent exits
+#
+# The server exits when the referee closes its end of the control socket.
+
+import asyncio
+import os
+import pickle
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from importlib import import_module
+from importlib.util import find_spec
+from traceback import print_exc
+from typing import Iterable
+
+from .io import _SUBPROC_MODULE
+
+_PID = "__pid__"
+_EXIT = "__exit__"
+_MAX_MESSAGE = 1 << 16
+_WAIT_POLL_INTERVAL = 0.002 # Seconds between checks for agent exit
+
+
+class ForkServer:
+    """
+    Handle on a running fork server process (referee side).
+    """
+
+    def __init__(self, preload: Iterable[str] = ()):
+        modules = [_SUBPROC_MODULE]
+        if find_spec("numpy") is not None:
+            modules.append("numpy")
+        modules.extend(pkg for pkg in preload if pkg not in modules)
+
+        self._ctrl, server_ctrl = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._proc = subprocess.Popen(
+            [sys.executable, "-c", f"from {__name__} import main; main()",
+                str(server_ctrl.fileno()), *modules],
+            pass_fds=[server_ctrl.fileno()],
+            stdin=subprocess.DEVNULL,
+        )
+        server_ctrl.close()
+        self._returncodes: dict[int, int] = {}
+        # Held for each spawn request and its reply (exchanged on an executor
+        # thread, see `spawn`), and while collecting exit notifications
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    async def spawn(self, sock: socket.socket, payload: bytes,
+              subproc_output: bool) -> int:
+        """
+        Fork an agent process with `sock` as its stdin/stdout, returning its
+        pid. The request is made on an executor thread, so that other games
+        in the event loop carry on in the meantime. Raises RuntimeError if
+        the fork server has exited.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None,
+            self._spawn, sock, payload, subproc_output)
+
+    def _spawn(self, sock: socket.socket, payload: bytes,
+               subproc_output: bool) -> int:
+        with self._lock:
+            try:
+                socket.send_fds(self._ctrl,
+                    [pickle.dumps((payload, subproc_output))], [sock.fileno()])
+                while True:
+                    data = self._ctrl.recv(_MAX_MESSAGE)
+                    if not data:
+                        raise RuntimeError("fork server exited")
+                    message = pickle.loads(data)
+                    if message[0] == _PID:
+                        return message[1]
+                    self._handle(message)
+            except ConnectionError as e:
+                raise RuntimeError("fork server exited") from e
+
+    def returncode(self, pid: int) -> int | None:
+        """
+        Return the exit code of an agent process, or None if it is still
+        running (exit notifications are collected without blocking, unless a
+        spawn request is underway, which collects them itself).
+        """
+        if pid in self._returncodes or not self._lock.acquire(blocking=False):
+            return self._returncodes.get(pid)
+        try:
+            while pid not in self._returncodes:
+                try:
+                    data = self._ctrl.recv(_MAX_MESSAGE, socket.MSG_DONTWAIT)
+                except BlockingIOError:
+                    return None
+                if not data:
+                    raise RuntimeError("fork server exited")
+                self._handle(pickle.loads(data))
+            return self._returncodes[pid]
+        finally:
+            self._lock.release()
+
+    def _handle(self, message: tuple):
+        match message:
+            case (_EXIT, pid, returncode):
+                self._returncodes[pid] = returncode
+
+
+_server: ForkServer | None = None
+
+
+def enable_forkserver(preload: Iterable[str] = ()):
+    """
+    Start the fork server, preloading the agent subprocess module, numpy (if
+    installed) and the given agent packages. Packages that fail to import are
+    skipped by the fork server, and will instead be imported by each agent.
+    """
+    global _server
+    if _server is None or not _server.alive:
+        _server = ForkServer(preload)
+
+
+class ForkedProcess:
+    """
+    Adapter giving a forked agent process the parts of the interface of
+    `asyncio.subprocess.Process` used by `RemoteProcessClassClient`.
+    """
+
+    def __init__(self,
+        server: ForkServer,
+        pid: int,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        self._server = server
+        self.pid = pid
+        self.stdout = reader
+        self.stdin = writer
+
+    @property
+    def returncode(self) -> int | None:
+        return self._server.returncode(self.pid)
+
+    async def wait(self) -> int:
+        while (returncode := self.returncode) is None:
+            await asyncio.sleep(_WAIT_POLL_INTERVAL)
+        self.stdin.close()
+        return returncode
+
+    def kill(self):
+        if self.returncode is None:
+            os.kill(self.pid, signal.SIGKILL)
+
+    def terminate(self):
+        if self.returncode is None:
+            os.kill(self.pid, signal.SIGTERM)
+
+
+async def create_forked_process(
+    payload: bytes,
+    subproc_output: bool
+) -> ForkedProcess:
+    """
+    Fork a new agent process from the fork server (which is started on demand
+    if `enable_forkserver` wasn't called). `payload` is the pickled
+    constructor payload otherwise passed on the command line.
+    """
+    enable_forkserver()
+    assert _server is not None
+
+    parent_sock, child_sock = socket.socketpair()
+    try:
+        pid = await _server.spawn(child_sock, payload, subproc_output)
+    finally:
+        child_sock.close()
+
+    reader, writer = await asyncio.open_unix_connection(sock=parent_sock)
+    return ForkedProcess(_server, pid, reader, writer)
+
+
+# Fork server process entry point (started by `ForkServer`)
+def main():
+    ctrl = socket.socket(fileno=int(sys.argv[1]))
+    for module in sys.argv[2:]:
+        try:
+            import_module(module)
+        except Exception:
+            pass
+
+    def _reap(*_):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            try:
+                ctrl.send(pickle.dumps(
+                    (_EXIT, pid, os.waitstatus_to_exitcode(status))))
+            except OSError:
+                return # (the referee has gone, see below)
+
+    # Interrupts are handled by the referee (which then closes the control
+    # socket), not by the server
+    signal.signal(signal.SIGCHLD, _reap)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        try:
+            data, fds, _, _ = socket.recv_fds(ctrl, _MAX_MESSAGE, 1)
+        except ConnectionError:
+            break # (the referee was killed, e.g. a terminated match worker)
+        if not data:
+            break
+        payload, subproc_output = pickle.loads(data)
+
+        pid = os.fork()
+        if pid == 0:
+            ctrl.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            os._exit(_agent_main(fds[0], payload, subproc_output))
+
+        os.close(fds[0])
+        ctrl.send(pickle.dumps((_PID, pid)))
+
+
+def _agent_main(fd: int, payload: bytes, subproc_output: bool) -> int:
+    # Install the socket as stdin/stdout (and silence stderr if required), as
+    # if this process had been started with pipes
+    os.dup2(fd, 0)
+    os.dup2(fd, 1)
+    os.close(fd)
+    if not subproc_output:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 2)
+        os.close(devnull)
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+
+    # Forks would otherwise share the template's random state (the random
+    # module reseeds itself after a fork, but numpy does not)
+    random.seed()
+    if "numpy" in sys.modules:
+        sys.modules["numpy"].random.seed()
+
+    from .subprocess import main
+    try:
+        main(payload.decode("ascii"))
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 0 if e.code is None \
+            else 1
+    except KeyboardInterrupt:
+        return 0
+    except BaseException:
+        print_exc()
+        return 1
+    finally:
+        sys.stderr.flush()
+    return 0
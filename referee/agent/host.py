@@ -0,0 +1,242 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Agent host: runs agent processes on behalf of referees connecting over TCP,
+# e.g. on another machine (or another set of cores), so that each agent has
+# that machine's resources to itself. Start a host with
+#
+#   python -m referee.agent.host --port 7000
+#
+# and point the referee at it (see `RemoteSocketPlayer`). Each connection runs
+# one agent process, started exactly as the referee would start it locally;
+# the host relays the usual call/reply frames (see `io.py`) between the
+# connection and the agent's stdin/stdout, so time and space are measured and
+# limited in the agent process, and reported in each reply as usual.
+#
+# In addition to the relayed frames, the referee and host exchange control
+# messages, which are frames with the top bit of the length header set:
+#
+#   referee -> host   (_SPAWN, payload, subproc_output)   first message only
+#   host -> referee   (_PID, pid)                         reply to _SPAWN
+#   referee -> host   (_KILL,)                            kill the agent
+#   host -> referee   (_EXIT, returncode)                 last message
+#
+# When the referee ends its side of the connection, the agent's stdin is
+# closed (after which agents exit), and the agent is killed if it has not
+# exited within `_EXIT_GRACE` seconds.
+#
+# Agent hosts run whatever code they are sent (payloads are pickles), so each
+# connection must first authenticate with a token shared by the referee and
+# the host (see `remote.py`). The token is given by --token or the
+# environment variable REFEREE_HOST_TOKEN (on the referee's side, only the
+# latter), e.g.
+#
+#   export REFEREE_HOST_TOKEN=$(openssl rand -hex 32)
+#   python -m referee.agent.host --bind 0.0.0.0
+#
+# A host only listens on a non-loopback address if a token is set.
+
+import argparse
+import asyncio
+import ipaddress
+import pickle
+import sys
+from asyncio import StreamReader, StreamWriter
+from asyncio.exceptions import IncompleteReadError
+from asyncio.subprocess import create_subprocess_exec, PIPE, DEVNULL, Process
+
+from ..log import LogColor, LogLevel, LogStream, NullLogger
+from .forkserver import ForkedProcess, create_forked_process, \
+    enable_forkserver
+from .io import _SUBPROC_MODULE
+from .remote import _SPAWN, _PID, _KILL, _EXIT, _HOST_ROLE, DEFAULT_PORT, \
+    TOKEN_ENV, _authenticate, _control_frame, _read_frame, host_token
+
+_EXIT_GRACE = 5.0 # Seconds for an agent to exit after the referee hangs up
+_AUTH_TIMEOUT = 10.0 # Seconds for a referee to authenticate
+# Errors reading a frame from a referee that has gone, or sent a bad frame
+_READ_ERRORS = (IncompleteReadError, ConnectionError, pickle.UnpicklingError,
+    EOFError)
+
+
+class AgentHost:
+    """
+    Agent host server (see above).
+    """
+
+    def __init__(self,
+        bind: str,
+        port: int,
+        token: bytes,
+        forkserver: bool = False,
+        log: LogStream = NullLogger(),
+    ):
+        self._bind = bind
+        self._port = port
+        self._token = token
+        self._forkserver = forkserver
+        self._log = log
+
+    async def start(self) -> asyncio.Server:
+        """
+        Start listening for referees (on an ephemeral port if the port is 0;
+        see `address`), without waiting for them.
+        """
+        if self._forkserver:
+            enable_forkserver()
+        server = await asyncio.start_server(
+            self._handle, self._bind, self._port)
+        self.address: tuple[str, int] = \
+            server.sockets[0].getsockname()[:2]
+        self._log.info("agent host listening on {}:{}".format(*self.address))
+        return server
+
+    async def serve(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    async def _start(self,
+        payload: bytes,
+        subproc_output: bool
+    ) -> Process | ForkedProcess:
+        if self._forkserver:
+            return await create_forked_process(payload, subproc_output)
+        return await create_subprocess_exec(
+            sys.executable, "-m", _SUBPROC_MODULE, payload,
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=DEVNULL if not subproc_output else None,
+        )
+
+    async def _handle(self, reader: StreamReader, writer: StreamWriter):
+        peer = "{}:{}".format(*writer.get_extra_info("peername")[:2])
+        try:
+            await self._serve_agent(peer, reader, writer)
+        finally:
+            writer.close()
+
+    async def _serve_agent(self,
+        peer: str,
+        reader: StreamReader,
+        writer: StreamWriter,
+    ):
+        try:
+            await asyncio.wait_for(
+                _authenticate(reader, writer, self._token, _HOST_ROLE),
+                timeout=_AUTH_TIMEOUT)
+        except (IncompleteReadError, ConnectionError,
+                asyncio.TimeoutError) as e:
+            self._log.warning(f"{peer}: not authenticated ({e!r})")
+            return
+        try:
+            match await _read_frame(reader):
+                case (True, (_SPAWN, payload, subproc_output)):
+                    pass
+                case _:
+                    self._log.warning(f"{peer}: expected spawn request")
+                    return
+            proc = await self._start(payload, subproc_output)
+        except _READ_ERRORS as e:
+            self._log.warning(f"{peer}: bad spawn request ({e!r})")
+            return
+
+        self._log.info(f"{peer}: started agent process {proc.pid}")
+        writer.write(_control_frame((_PID, proc.pid)))
+        calls = asyncio.create_task(self._relay_calls(reader, proc))
+        try:
+            # Relay replies until the agent exits (raw bytes, as the agent
+            # only writes whole frames)
+            assert proc.stdout is not None
+            while data := await proc.stdout.read(1 << 16):
+                writer.write(data)
+                await writer.drain()
+            returncode = await proc.wait()
+            self._log.info(f"{peer}: agent process {proc.pid} exited "
+                           f"with code {returncode}")
+            writer.write(_control_frame((_EXIT, returncode)))
+            await writer.drain()
+        except ConnectionError:
+            self._log.info(f"{peer}: connection lost")
+            self._kill(proc)
+            await proc.wait()
+        finally:
+            calls.cancel()
+
+    async def _relay_calls(self,
+        reader: StreamReader,
+        proc: Process | ForkedProcess
+    ):
+        assert proc.stdin is not None
+        try:
+            while True:
+                is_control, frame = await _read_frame(reader)
+                if is_control:
+                    if frame == (_KILL,):
+                        self._kill(proc)
+                    continue
+                proc.stdin.write(frame)
+                await proc.stdin.drain()
+        except _READ_ERRORS:
+            # The referee has ended the connection (or broken the protocol):
+            # end the agent's input, and kill the agent if it doesn't exit in
+            # good time
+            proc.stdin.close()
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=_EXIT_GRACE)
+            except asyncio.TimeoutError:
+                self._kill(proc)
+
+    def _kill(self, proc: Process | ForkedProcess):
+        if proc.returncode is None:
+            self._log.info(f"killing agent process {proc.pid}")
+            proc.kill()
+
+
+def _is_loopback(bind: str) -> bool:
+    if bind == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(bind).is_loopback
+    except ValueError:
+        return False # (a host name, or the empty wildcard address)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m referee.agent.host",
+        description="Run agent processes for referees connecting over TCP.",
+    )
+    parser.add_argument(
+        "-b", "--bind", default="127.0.0.1",
+        help="address to listen on (default: %(default)s). Addresses other "
+             "than loopback require a token.")
+    parser.add_argument(
+        "-p", "--port", type=int, default=DEFAULT_PORT,
+        help="port to listen on (default: %(default)s).")
+    parser.add_argument(
+        "--token",
+        help=f"secret that referees must authenticate with (default: "
+             f"${TOKEN_ENV}, which referees read too). Agent hosts run "
+             f"whatever code referees send, so set a long random token.")
+    parser.add_argument(
+        "-F", "--forkserver", action="store_true",
+        help="fork agent processes from a template process with the referee "
+             "and numpy preloaded (see referee.agent.forkserver).")
+    args = parser.parse_args()
+    token = args.token.encode() if args.token is not None else host_token()
+    if not token and not _is_loopback(args.bind):
+        parser.error(f"a token (--token or ${TOKEN_ENV}) is required to "
+                     f"listen on '{args.bind}'")
+
+    LogStream.set_global_setting("level", LogLevel.INFO)
+    log = LogStream("host", LogColor.CYAN)
+    try:
+        asyncio.run(AgentHost(
+            args.bind, args.port, token, args.forkserver, log).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
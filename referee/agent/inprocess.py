@@ -0,0 +1,174 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from traceback import format_exc
+from typing import Any, Callable, Type
+
+from ..game.player import Player
+from ..log import LogStream, NullLogger
+from ..game import Action, PlayerColor, PlayerException
+from ..options import PlayerLoc
+from .resources import CountdownTimer, ResourceLimitException
+
+
+class InProcessPlayer(Player):
+    """
+    Run a (trusted) agent class directly in the referee process, without the
+    subprocess sandbox of `AgentProxyPlayer`. Calls to the agent are run on a
+    dedicated worker thread, and the CPU time of that thread is accounted for
+    and limited just as for a sandboxed agent. This avoids all serialisation
+    and process overhead, which is useful for high-volume self-play, but note:
+
+    * the agent shares the referee's memory, so space usage can't be measured
+      per agent (space limits are not enforced, and agents are told that their
+      remaining space is unknown),
+    * time limits are checked after each call returns, as for subprocesses,
+      but there is no way to kill a runaway agent thread,
+    * an agent can interfere with the referee (e.g. by mutating shared module
+      state, or printing to stdout). Only use this mode for your own agents.
+    """
+
+    def __init__(self,
+        name: str,
+        color: PlayerColor,
+        agent_loc: PlayerLoc,
+        time_limit: float | None,
+        space_limit: float | None,
+        res_limit_tolerance: float = 1.0,
+        log: LogStream = NullLogger(),
+        intercept_exc_type: Type[Exception] = PlayerException,
+        board_mirror: str | None = None,
+    ):
+        '''
+        Create an in-process agent player. Arguments are as for
+        `AgentProxyPlayer`.
+        '''
+        super().__init__(color)
+
+        assert isinstance(agent_loc, PlayerLoc), "agent_loc must be a PlayerLoc"
+        self._pkg, self._cls = agent_loc
+
+        self._name = name
+        self._time_limit = time_limit or 0
+        self._space_limit = space_limit
+        self._res_limit_tolerance = res_limit_tolerance
+        self._log = log
+        self._ret_symbol = f"⤷" if log.setting("unicode") else "->"
+        self._InterceptExc = intercept_exc_type
+        self._cons_kwargs = {"board_mirror": board_mirror} \
+            if board_mirror else {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._timer: CountdownTimer | None = None
+        self._instance: Any = None
+
+    def _referee(self) -> dict[str, Any]:
+        assert self._timer is not None
+        return {
+            "time_remaining": self._time_limit - self._timer.total()
+                if self._time_limit > 0 else None,
+            "space_remaining": None,
+            "space_limit": self._space_limit or None,
+        }
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Run fn on the worker thread, timing it with that thread's CPU clock.
+        # Garbage is not collected before each call (as it is in an agent
+        # subprocess) since this would collect the whole referee's garbage.
+        def _timed_call():
+            assert self._timer is not None
+            with self._timer:
+                return fn(*args, **self._referee())
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed_call)
+
+        except ResourceLimitException as e:
+            self._log.error(f"resource limit exceeded: {str(e)}")
+            self._log.error("\n")
+            self._log.error(self._summarise_time())
+            self._log.error("\n")
+
+            raise self._InterceptExc(
+                f"{str(e)} in {self._name} agent",
+                self._color
+            )
+
+        except Exception as e:
+            err_lines = format_exc().splitlines()
+
+            self._log.error(f"exception caught (in-process agent):")
+            self._log.error("\n")
+            self._log.error("\n".join([f">> {line}" for line in err_lines]))
+            self._log.error("\n")
+
+            raise self._InterceptExc(
+                f"error in {self._name} agent\n"
+                f"{self._ret_symbol} {err_lines[-1]}",
+                self._color
+            )
+
+    async def __aenter__(self) -> 'InProcessPlayer':
+        self._log.debug(f"creating in-process agent...")
+        if self._space_limit:
+            self._log.warning(
+                f"space limit is not enforced for in-process agents")
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=self._name)
+        self._timer = CountdownTimer(
+            self._time_limit, self._res_limit_tolerance,
+            clock=time.thread_time, collect=False)
+
+        try:
+            Cls = getattr(import_module(self._pkg), self._cls)
+        except Exception as e:
+            raise self._InterceptExc(
+                f"error in {self._name} agent\n"
+                f"{self._ret_symbol} {e.__class__.__name__}: {e}",
+                self._color
+            )
+        self._instance = await self._call(
+            lambda **referee: Cls(self._color, **self._cons_kwargs, **referee))
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._instance = None
+        if self._executor is not None:
+            # Don't wait for a (possibly runaway) agent call to finish
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._log.debug(f"in-process agent finished")
+
+    async def action(self) -> Action:
+        """
+        Get the agent's action for the current turn.
+        """
+        self._log.debug(f"call 'action()'...")
+
+        action: Action = await self._call(self._instance.action)
+
+        self._log.debug(f"{self._ret_symbol} {action!r}")
+        self._log.debug(self._summarise_time())
+        return action
+
+    async def update(self, color: PlayerColor, action: Action):
+        """
+        Update the agent with the latest action from the game.
+        """
+        self._log.debug(f"call 'update({color!r}, {action!r})'...")
+
+        await self._call(self._instance.update, color, action)
+
+        self._log.debug(self._summarise_time())
+
+    def _summarise_time(self) -> str:
+        assert self._timer is not None
+        return f"resources usage status:\n"\
+               f"  time:  +{self._timer.delta():6.3f}s  (just elapsed)   "\
+               f"  {self._timer.total():7.3f}s  (game total, thread CPU)\n"\
+               f"  space: unknown (in-process agent)\n"
@@ -3,17 +3,27 @@
 
 import binascii
 from contextlib import contextmanager
+import io
 import pickle
+import struct
 from dataclasses import dataclass
 from binascii import b2a_base64, a2b_base64
-from typing import Any
+from typing import Any, BinaryIO
 
 
 _SUBPROC_MODULE = "referee.agent.subprocess"
 _ACK = "ACK"
+_RESET = "__reset__"
+_PONDER = "__ponder__"
+_IDLE = "__idle__"
 _REPLY_OK = b"OK"
 _REPLY_EXC = b"EXC"
-_CHUNK_LIMIT_KB = 1024
+
+# Messages between the referee and agent subprocesses are binary frames: a
+# 4-byte big-endian payload length followed by the pickled payload. Reply
+# frames (see `ReplyWriter`) hold two consecutive pickles: the reply body,
+# then the process status.
+_FRAME_HEADER = struct.Struct(">I")
 
 
 class InterchangeException(Exception):
@@ -27,6 +37,71 @@ class AsyncProcessStatus:
     space_known: bool
     space_curr: float
     space_peak: float
+    time_serialise: float = 0.0
+    time_ponder: float = 0.0
+    # Per-call timings, see `CallLatency` (timestamps are `time.monotonic`,
+    # which is system-wide, so comparable with the referee's)
+    time_recv: float = 0.0
+    time_gc: float = 0.0
+    # Automatic garbage collections during the call (see `GcPolicy`)
+    time_gc_auto: float = 0.0
+    gc_collections: int = 0
+    time_compute: float = 0.0
+    time_reply: float = 0.0
+    # CPU time of the last call (see `CpuMeter`), whichever clock the agent
+    # is charged by
+    time_cpu_thread: float = 0.0
+    time_cpu_threads: float = 0.0
+    time_cpu_children: float = 0.0
+    # Peak space usage within the last call (see `MemoryWatcher`)
+    space_call_peak: float = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class CallLatency:
+    """
+    Breakdown of the wall-clock time (in seconds) of one call to an agent
+    process, from the referee starting to send it to the reply being read:
+
+      serialise        referee pickles and frames the call
+      write            referee writes the call to the process' stdin
+      queue            call in transit or waiting for the agent (e.g. behind
+                       an earlier pipelined call, or for pondering to stop)
+      gc               agent collects garbage before the call (off the clock)
+      compute          agent runs the call (wall clock)
+      reply_serialise  agent pickles the reply
+      read             reply in transit, read and unpickled by the referee
+    """
+    serialise: float
+    write: float
+    queue: float
+    gc: float
+    compute: float
+    reply_serialise: float
+    read: float
+
+    @property
+    def total(self) -> float:
+        return sum(getattr(self, stage) for stage in LATENCY_STAGES)
+
+
+LATENCY_STAGES = tuple(CallLatency.__dataclass_fields__)
+
+# Upper edges (seconds) of histogram buckets, see `latency_histogram`
+LATENCY_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+
+
+def latency_histogram(latencies: list[CallLatency], stage: str) -> list[int]:
+    """
+    Count the calls falling into each bucket of `LATENCY_BUCKETS` for the
+    given stage. The last count is of calls beyond the last bucket.
+    """
+    counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    for latency in latencies:
+        value = getattr(latency, stage)
+        counts[next((i for i, edge in enumerate(LATENCY_BUCKETS)
+            if value <= edge), len(LATENCY_BUCKETS))] += 1
+    return counts
 
 
 @contextmanager
@@ -47,3 +122,91 @@ def m_pickle(o: Any) -> bytes:
 def m_unpickle(b: bytes) -> Any:
     with catch_exceptions("unpickle", b):
         return pickle.loads(a2b_base64(b))
+
+
+def m_frame(o: Any) -> bytes:
+    """
+    Pickle an object into a length-prefixed frame. If the object cannot be
+    pickled an InterchangeException is raised (as by `ReplyWriter.dump`).
+    """
+    try:
+        payload = pickle.dumps(o, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        raise InterchangeException(f"cannot pickle object: {o}") from e
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+def m_frame_length(header: bytes) -> int:
+    """
+    Decode the payload length from a frame header.
+    """
+    return _FRAME_HEADER.unpack(header)[0]
+
+def m_unframe(payload: bytes) -> Any:
+    """
+    Unpickle a frame payload (i.e. the frame without its header).
+    """
+    with catch_exceptions("unpickle", payload):
+        return pickle.loads(payload)
+
+def m_unframe_reply(payload: bytes) -> tuple[Any, ...]:
+    """
+    Unpickle a reply frame payload (see `ReplyWriter`), returning the tuple
+    (status, arg0, arg1, ...).
+    """
+    with catch_exceptions("unpickle", payload):
+        unpickler = pickle.Unpickler(io.BytesIO(payload))
+        body = unpickler.load()
+        status = unpickler.load()
+    return (status, *body)
+
+
+class ReplyWriter:
+    """
+    Writes reply frames to a binary stream, serialising each reply exactly
+    once into a buffer that is reused between replies. The body is pickled
+    before the status so that the status can report how long the body took to
+    serialise.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._buffer = io.BytesIO()
+        self._pickler = pickle.Pickler(
+            self._buffer, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def begin(self):
+        """
+        Start a new frame (discarding any unfinished one).
+        """
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(bytes(_FRAME_HEADER.size))
+
+    def dump(self, o: Any):
+        """
+        Append a pickled object to the current frame. If the object cannot be
+        pickled the frame is left unchanged and an InterchangeException is
+        raised.
+        """
+        start = self._buffer.tell()
+        self._pickler.clear_memo()
+        try:
+            self._pickler.dump(o)
+        except Exception as e:
+            self._buffer.seek(start)
+            self._buffer.truncate()
+            raise InterchangeException(f"cannot pickle object: {o}") from e
+        finally:
+            # Don't keep references to the pickled objects alive
+            self._pickler.clear_memo()
+
+    def end(self):
+        """
+        Fill in the frame header and write the frame to the stream.
+        """
+        self._buffer.seek(0)
+        self._buffer.write(_FRAME_HEADER.pack(
+            len(self._buffer.getbuffer()) - _FRAME_HEADER.size))
+        with self._buffer.getbuffer() as frame:
+            self._stream.write(frame)
+        self._stream.flush()
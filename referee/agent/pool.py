@@ -0,0 +1,113 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+import asyncio
+
+from ..log import LogStream, NullLogger
+from .client import RemoteProcessClassClient
+
+
+class AgentProcessPool:
+    """
+    A pool of warm agent subprocesses, kept alive between games so that the
+    cost of starting an interpreter and importing the agent package is paid
+    once per process rather than once per game. A client started from the
+    pool takes over an idle process if one is available, which is then reset
+    with a fresh constructor call and fresh time/space accounting (see
+    `RemoteProcessClassClient.adopt`), so resource limits still apply per
+    game. Note that this class is implemented as an async context manager
+    which terminates all idle processes on exit.
+
+    A pool can be shared by games played at once in one event loop. If
+    `max_processes` is given, at most that many agent processes (busy or
+    idle) are alive at once: starting a client waits for a process to be
+    released, terminating an idle process of another agent if need be. Games
+    played at once must then need no more processes than this between them.
+    """
+
+    def __init__(self,
+        log: LogStream = NullLogger(),
+        max_processes: int | None = None,
+    ):
+        self._log = log
+        self._idle: dict[tuple, list[RemoteProcessClassClient]] = {}
+        self._slots = asyncio.Semaphore(max_processes) \
+            if max_processes is not None else None
+        self._waiting = 0
+
+    async def start(self, client: RemoteProcessClassClient):
+        """
+        Start a client, reusing an idle process if there is one. Used in
+        place of the client's `__aenter__`.
+        """
+        idle = self._idle.get(client.key, [])
+        while idle:
+            host = idle.pop()
+            if not host.alive:
+                continue
+            self._log.debug(f"reusing agent subprocess {host.pid}")
+            try:
+                await client.adopt(host)
+            except:
+                await self._discard(client)
+                raise
+            return
+
+        if self._slots is not None:
+            if self._slots.locked():
+                # Make room by terminating the longest idle process
+                await self._evict()
+            self._waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self._waiting -= 1
+        try:
+            await client.__aenter__()
+        except:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+
+    async def release(self, client: RemoteProcessClassClient, reuse: bool):
+        """
+        Return a client's process to the pool after a game. Used in place of
+        the client's `__aexit__`. Processes that should not be reused (e.g.
+        after an agent error) are terminated instead.
+        """
+        # (Processes are terminated rather than kept idle while other clients
+        # are waiting for a process to be released.)
+        if reuse and client.alive and not self._waiting:
+            self._idle.setdefault(client.key, []).append(client)
+        else:
+            await self._discard(client)
+
+    async def _evict(self):
+        for clients in self._idle.values():
+            if clients:
+                await self._discard(clients.pop(0))
+                return
+
+    async def _discard(self, client: RemoteProcessClassClient):
+        try:
+            await client.__aexit__(None, None, None)
+        except RuntimeError as e:
+            self._log.debug(f"discarded agent subprocess: {e}")
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    async def close(self):
+        """
+        Terminate all idle processes.
+        """
+        for clients in self._idle.values():
+            for client in clients:
+                await self._discard(client)
+        self._idle.clear()
+
+    async def __aenter__(self) -> 'AgentProcessPool':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
@@ -0,0 +1,183 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Referee side of the agent host protocol (see `host.py`, which also runs the
+# host): starting agent processes on agent hosts, and exchanging frames with
+# them as if they were local processes.
+#
+# Referees and hosts first authenticate each other with a shared secret token
+# (see `host_token`), before anything is unpickled: each side sends a random
+# nonce, and replies to the other's nonce with an HMAC of it (and its role)
+# keyed by the token.
+
+import asyncio
+import hashlib
+import hmac
+import os
+import pickle
+from asyncio import StreamReader, StreamWriter
+from asyncio.exceptions import IncompleteReadError
+
+from .io import _FRAME_HEADER
+
+_SPAWN = "__spawn__"
+_PID = "__pid__"
+_KILL = "__kill__"
+_EXIT = "__exit__"
+_CONTROL = 1 << 31 # Header flag of control frames
+_CONNECT_TIMEOUT = 10.0 # Seconds to connect to a host and start an agent
+_LOST = 1 # Return code reported if the connection to a host is lost
+
+DEFAULT_PORT = 7000
+TOKEN_ENV = "REFEREE_HOST_TOKEN"
+
+_NONCE_SIZE = 32
+_DIGEST_SIZE = hashlib.sha256().digest_size
+_REFEREE_ROLE = b"referee"
+_HOST_ROLE = b"host"
+
+
+def host_token() -> bytes:
+    """
+    The token shared by referees and agent hosts, from the environment
+    variable `REFEREE_HOST_TOKEN` (empty if unset, which is only allowed for
+    hosts listening on a loopback address).
+    """
+    return os.environ.get(TOKEN_ENV, "").encode()
+
+
+def _digest(token: bytes, role: bytes, nonce: bytes) -> bytes:
+    return hmac.new(token, role + nonce, hashlib.sha256).digest()
+
+
+async def _authenticate(
+    reader: StreamReader,
+    writer: StreamWriter,
+    token: bytes,
+    role: bytes,
+):
+    # Mutual challenge-response authentication (see above), as `role`. Both
+    # sides write before they read, so neither waits on the other. Raises
+    # ConnectionError if the other side doesn't know the token.
+    nonce = os.urandom(_NONCE_SIZE)
+    writer.write(nonce)
+    await writer.drain()
+    peer_nonce = await reader.readexactly(_NONCE_SIZE)
+    writer.write(_digest(token, role, peer_nonce))
+    await writer.drain()
+    peer_role = _HOST_ROLE if role == _REFEREE_ROLE else _REFEREE_ROLE
+    proof = await reader.readexactly(_DIGEST_SIZE)
+    if not hmac.compare_digest(proof, _digest(token, peer_role, nonce)):
+        raise ConnectionError("authentication failed (is the same token "
+                              "configured on both sides?)")
+
+
+def _control_frame(message: tuple) -> bytes:
+    payload = pickle.dumps(message)
+    return _FRAME_HEADER.pack(_CONTROL | len(payload)) + payload
+
+
+async def _read_frame(reader: StreamReader) -> tuple[bool, bytes]:
+    # Read a frame, returning (is control frame, frame), where the frame of a
+    # control message is its unpickled payload, and otherwise the raw frame
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    length, = _FRAME_HEADER.unpack(header)
+    if length & _CONTROL:
+        payload = await reader.readexactly(length & ~_CONTROL)
+        return True, pickle.loads(payload)
+    return False, header + await reader.readexactly(length)
+
+
+class HostedProcess:
+    """
+    Adapter giving an agent process on an agent host the parts of the
+    interface of `asyncio.subprocess.Process` used by
+    `RemoteProcessClassClient` (replies are read from `stdout`, and calls
+    written to `stdin`, as for a local process).
+
+    Note that `time.monotonic` timestamps in replies are those of the host, so
+    the queue and read stages of call latencies (see `CallLatency`) are only
+    meaningful for hosts on the same machine as the referee.
+    """
+
+    def __init__(self,
+        address: tuple[str, int],
+        pid: int,
+        reader: StreamReader,
+        writer: StreamWriter,
+    ):
+        self.address = address
+        self.pid = pid
+        self.stdin = writer
+        self.stdout = StreamReader()
+        self.returncode: int | None = None
+        self._reader = reader
+        self._relay = asyncio.create_task(self._relay_replies())
+
+    async def _relay_replies(self):
+        # Pass reply frames on to `stdout`, until the host reports the exit
+        # of the agent
+        try:
+            while True:
+                is_control, frame = await _read_frame(self._reader)
+                match is_control, frame:
+                    case (True, (_EXIT, returncode)):
+                        self.returncode = returncode
+                        break
+                    case (False, _):
+                        self.stdout.feed_data(frame)
+        except (IncompleteReadError, ConnectionError):
+            self.returncode = _LOST
+        finally:
+            self.stdout.feed_eof()
+            self.stdin.close()
+
+    async def wait(self) -> int:
+        await self._relay
+        assert self.returncode is not None
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None and not self.stdin.is_closing():
+            self.stdin.write(_control_frame((_KILL,)))
+
+    def terminate(self):
+        self.kill()
+
+
+async def create_hosted_process(
+    address: tuple[str, int],
+    payload: bytes,
+    subproc_output: bool,
+    token: bytes | None = None,
+) -> HostedProcess:
+    """
+    Start an agent process on the agent host at `address` (host, port),
+    authenticating with `token` (by default, `host_token()`). `payload` is
+    the pickled constructor payload otherwise passed on the command line.
+    """
+    if token is None:
+        token = host_token()
+
+    async def _connect():
+        reader, writer = await asyncio.open_connection(*address)
+        try:
+            await _authenticate(reader, writer, token, _REFEREE_ROLE)
+        except BaseException:
+            writer.close()
+            raise
+        writer.write(_control_frame((_SPAWN, payload, subproc_output)))
+        await writer.drain()
+        match await _read_frame(reader):
+            case (True, (_PID, pid)):
+                return HostedProcess(address, pid, reader, writer)
+            case reply:
+                writer.close()
+                raise ConnectionError(f"unexpected reply from agent host "
+                                      f"{address[0]}:{address[1]}: {reply}")
+
+    try:
+        return await asyncio.wait_for(_connect(), timeout=_CONNECT_TIMEOUT)
+    except (OSError, asyncio.TimeoutError, IncompleteReadError) as e:
+        raise ConnectionError(f"cannot start agent on agent host "
+            f"{address[0]}:{address[1]}: {e!r}") from e
@@ -2,8 +2,14 @@
 # Project Part B: Game Playing Agent
 
 import gc
+import math
+import os
+import resource
+import signal
+import threading
 import time
 from pathlib import Path
+from typing import Callable
 
 
 class ResourceLimitException(Exception):
@@ -19,17 +25,32 @@ class CountdownTimer:
       after the allocated time has passed
     """
 
-    def __init__(self, time_limit, tolerance=1.0):
+    def __init__(self, time_limit, tolerance=1.0,
+                 clock=time.process_time, collect=True, deadline=None,
+                 gc_policy=None):
         """
         Create a new countdown timer with time limit `limit`, in seconds
         (0 for unlimited time). If `tolerance` is specified, the timer will
         allow the process to run for `tolerance` times the specified limit
-        before throwing an exception.
+        before throwing an exception. `clock` is the CPU clock to use (e.g.
+        `time.thread_time` to time a single thread), and `collect` controls
+        whether garbage is collected before each timed section. If a
+        `deadline` (see `CpuDeadline`) is given, it is armed with the
+        remaining time for the duration of each timed section, so that the
+        exception is thrown as soon as the time runs out. If a `gc_policy`
+        (see `GcPolicy`) is given, it decides how garbage is collected before
+        each timed section instead of `collect`.
         """
         self._limit = time_limit
         self._tolerance = tolerance
+        self._clock_fn = clock
+        self._collect = collect
+        self._deadline = deadline
+        self._gc_policy = gc_policy
         self._clock = 0
         self._delta = 0
+        self._gc_time = 0.0
+        self._collected = False
 
     def total(self):
         return self._clock
@@ -37,16 +58,50 @@ class CountdownTimer:
     def delta(self):
         return self._delta
 
+    def gc_time(self):
+        return self._gc_time
+
+    def charge(self, elapsed):
+        """
+        Add time spent outside of a timed section (e.g. by a background
+        thread) to the total. The limit is checked when the next timed
+        section exits.
+        """
+        self._clock += elapsed
+
+    def collect(self):
+        """
+        Clean up memory ahead of the next timed section, rather than on
+        entering it (e.g. so that other measurements can be set up in
+        between, off the clock).
+        """
+        gc_start = time.perf_counter()
+        if self._gc_policy is not None:
+            self._gc_policy.collect()
+        elif self._collect:
+            gc.collect()
+        self._gc_time = time.perf_counter() - gc_start
+        self._collected = True
+
     def __enter__(self):
-        # clean up memory off the clock
-        gc.collect()
+        # clean up memory off the clock (unless done already)
+        if not self._collected:
+            self.collect()
+        self._collected = False
         # then start timing
-        self.start = time.process_time()
+        if self._gc_policy is not None:
+            self._gc_policy.start_section()
+        self.start = self._clock_fn()
+        if self._deadline is not None and self._limit:
+            self._deadline.arm(self._limit * self._tolerance - self._clock)
         return self  # unused
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._deadline is not None:
+            self._deadline.disarm()
+
         # accumulate elapsed time since __enter__
-        elapsed = time.process_time() - self.start
+        elapsed = self._clock_fn() - self.start
         self._clock += elapsed
         self._delta = elapsed
 
@@ -58,21 +113,506 @@ class CountdownTimer:
                 )
 
 
+# GC policies, i.e. how garbage is collected in an agent process (the same
+# policy applies to all agents in a game):
+#
+#   full          collect all generations before each call (off the clock)
+#   generational  collect only the young generations before each call (off
+#                 the clock), leaving older garbage to automatic collection
+#   freeze        as for full, but objects that survive construction are
+#                 frozen (`gc.freeze`), so later collections don't scan them
+#   deferred      no collection before calls, and automatic collection is
+#                 disabled; garbage is only collected between games (so
+#                 reference cycles accumulate over a game)
+#
+# Automatic collections during a call are counted against the agent's time
+# under every policy (as is any other work the agent causes), and are
+# reported separately.
+GC_POLICIES = ("full", "generational", "freeze", "deferred")
+
+
+class GcPolicy:
+    """
+    Garbage collection policy of an agent process (see `GC_POLICIES`), which
+    also measures the pauses of automatic collections in timed sections.
+    """
+
+    def __init__(self, policy: str = "full"):
+        if policy not in GC_POLICIES:
+            raise ValueError(f"unknown GC policy: '{policy}'")
+        self._policy = policy
+        self._pause_start = 0.0
+        self._pause_time = 0.0
+        self._collections = 0
+        if policy == "deferred":
+            gc.disable()
+        else:
+            gc.enable()
+        gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._pause_start = time.perf_counter()
+        else:
+            self._pause_time += time.perf_counter() - self._pause_start
+            self._collections += 1
+
+    def pause_time(self):
+        return self._pause_time
+
+    def collections(self):
+        return self._collections
+
+    def collect(self):
+        """
+        Collect garbage before a timed section, as per the policy.
+        """
+        match self._policy:
+            case "full" | "freeze":
+                gc.collect()
+            case "generational":
+                gc.collect(1)
+
+    def start_section(self):
+        """
+        Start measuring automatic collections (for `pause_time` and
+        `collections`) afresh.
+        """
+        self._pause_time = 0.0
+        self._collections = 0
+
+    def constructed(self):
+        """
+        Called after the agent has been constructed (off the clock).
+        """
+        if self._policy == "freeze":
+            gc.collect()
+            gc.freeze()
+
+    def close(self):
+        """
+        Called between games: unfreeze and collect everything left over from
+        the game, off the clock.
+        """
+        gc.callbacks.remove(self._on_gc)
+        gc.unfreeze()
+        gc.enable()
+        gc.collect()
+
+
+# Time accounting modes, i.e. which clock a CountdownTimer charges agents by:
+#
+#   process      CPU time of the agent process (all threads, except the
+#                memory sampler of `MemoryWatcher`, which is the referee's)
+#   tree         as above, plus the CPU time of all its child processes (both
+#                running and exited), so that agents can't escape the time
+#                limit by working in subprocesses
+#   wall-cores   wall-clock time multiplied by the number of cores the agent
+#                process may run on, so that parallel agents are charged for
+#                the cores they occupy, whether they use them or not
+TIME_ACCOUNTING_MODES = ("process", "tree", "wall-cores")
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _live_children(pid: int | str = "self") -> list[str]:
+    # Child pids of all threads of a process (requires a kernel with
+    # CONFIG_PROC_CHILDREN, otherwise no live children are found)
+    children = []
+    try:
+        for task in Path(f"/proc/{pid}/task").iterdir():
+            children.extend((task / "children").read_text().split())
+    except OSError:
+        pass
+    return children
+
+
+def _proc_cpu_time(pid: str) -> float:
+    # CPU time (user + system) of a running process, and of its children that
+    # have exited (and were waited for). The command name field may contain
+    # spaces, so fields are counted from its closing paren.
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return 0.0
+    fields = stat[stat.rindex(")") + 2:].split()
+    utime, stime, cutime, cstime = map(int, fields[11:15])
+    return (utime + stime + cutime + cstime) / _CLOCK_TICKS
+
+
+def children_cpu_time() -> float:
+    """
+    CPU time of all child processes of this process: those that have exited
+    (and were waited for), and all running descendants (including those
+    theirs have waited for).
+    """
+    total = 0.0
+    pending = _live_children()
+    while pending:
+        pid = pending.pop()
+        total += _proc_cpu_time(pid)
+        pending.extend(_live_children(pid))
+    # (Read after the running descendants, so that a child waited for in the
+    # meantime is counted twice rather than not at all; see `_Monotonic`.)
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return total + usage.ru_utime + usage.ru_stime
+
+
+def tree_cpu_time() -> float:
+    """
+    CPU time of this process (all threads) and all of its child processes.
+    """
+    return time.process_time() + children_cpu_time()
+
+
+class _Monotonic:
+    # A clock that never runs backwards, wrapping one that can (e.g.
+    # `tree_cpu_time`, when a child counted while running is waited for
+    # between two readings)
+
+    def __init__(self, clock: Callable[[], float]):
+        self._clock = clock
+        self._last = 0.0
+
+    def __call__(self) -> float:
+        self._last = max(self._last, self._clock())
+        return self._last
+
+
+class _WallCoresClock:
+    # Wall-clock time multiplied by the number of cores this process may run
+    # on. The number is read at every reading, as the process may be pinned
+    # to other cores after it starts (see `affinity`), and the time since the
+    # last reading is charged at the current number (so a change shifts the
+    # clock by at most that much, rather than rescaling all time so far).
+
+    def __init__(self):
+        self._state = (time.monotonic(), 0.0)
+
+    def __call__(self) -> float:
+        last, total = self._state
+        now = time.monotonic()
+        total += (now - last) * len(os.sched_getaffinity(0))
+        # (one assignment, in case a signal handler reads the clock too)
+        self._state = (now, total)
+        return total
+
+
+def accounting_clock(mode: str) -> Callable[[], float]:
+    """
+    Return the clock to charge agents by for a time accounting mode (see
+    `TIME_ACCOUNTING_MODES`).
+    """
+    match mode:
+        case "process":
+            return lambda: time.process_time() - _sampler_cpu_time()
+        case "tree":
+            return _Monotonic(lambda: tree_cpu_time() - _sampler_cpu_time())
+        case "wall-cores":
+            return _WallCoresClock()
+        case _:
+            raise ValueError(f"unknown time accounting mode: '{mode}'")
+
+
+# The kernel's CPU accounting for interval timers and `RLIMIT_CPU` may run
+# ahead of the process' CPU clock (e.g. when it is tick-based and counts time
+# stolen by a hypervisor), so timer expiry is checked against the accounting
+# clock, and the CPU limit is set well past the deadline: after this multiple
+# of the remaining time, plus a grace period (in seconds).
+_RLIMIT_FACTOR = 2.0
+_RLIMIT_GRACE = 1.0
+# Time (as measured by the accounting clock) for a timed section to end after
+# the deadline's exception is raised, before the process is terminated
+_EXCEPTION_GRACE = 0.5
+
+
+class CpuDeadline:
+    """
+    Kernel-enforced deadline for a timed section of code in the main thread of
+    a process (used by `CountdownTimer`), in two stages:
+
+    * an interval timer, which raises a `ResourceLimitException` in the main
+      thread once the remaining time has been used: `ITIMER_PROF` (process CPU
+      time) for the "process" accounting mode, or `ITIMER_REAL` for the "tree"
+      and "wall-cores" modes. The timer stays armed: if the section hasn't
+      ended `_EXCEPTION_GRACE` later (e.g. because the agent caught the
+      exception and carried on), the process sends itself `SIGXCPU`, and
+    * a soft `RLIMIT_CPU` past that, for when the exception can't be raised
+      because the main thread is stuck in native code: the kernel then
+      terminates the process with `SIGXCPU`.
+
+    In the "tree" mode, child processes use CPU time while this process may
+    not (e.g. while it waits on them), so a real-time timer is used: it first
+    expires once the remaining time could have been used on all available
+    cores at once, and is then re-armed with whatever remains, until it has
+    all been used. (`RLIMIT_CPU` still only covers this process.)
+    """
+
+    def __init__(self, mode: str):
+        if mode == "process":
+            self._which = signal.ITIMER_PROF
+            self._signum = signal.SIGPROF
+        else:
+            self._which = signal.ITIMER_REAL
+            self._signum = signal.SIGALRM
+        self._clock = accounting_clock(mode)
+        self._expiry = 0.0
+        self._armed = False
+        self._raised = False
+        self._rlimit = resource.getrlimit(resource.RLIMIT_CPU)
+
+    def _expired(self, signum, frame):
+        # A signal may still be pending when the deadline is disarmed
+        if not self._armed:
+            return
+        remaining = self._expiry - self._clock()
+        if remaining > 0:
+            signal.setitimer(self._which, self._interval(remaining))
+            return
+        if self._raised:
+            # The exception was swallowed: terminate the process, as the
+            # kernel would at the CPU limit
+            os.kill(os.getpid(), signal.SIGXCPU)
+            return
+        self._raised = True
+        self._expiry = self._clock() + _EXCEPTION_GRACE
+        signal.setitimer(self._which, self._interval(_EXCEPTION_GRACE))
+        raise ResourceLimitException(f"exceeded available time")
+
+    def _interval(self, remaining: float) -> float:
+        # Time until the timer next expires: in the "tree" and "wall-cores"
+        # modes, the accounting clock runs at most (or exactly) as many times
+        # faster than real time as there are cores available, which is read
+        # afresh as the process may have been pinned since (see `affinity`)
+        if self._which == signal.ITIMER_PROF:
+            return remaining
+        return remaining / len(os.sched_getaffinity(0))
+
+    def arm(self, remaining: float):
+        """
+        Arm the deadline to expire after `remaining` seconds (as measured by
+        the accounting clock).
+        """
+        remaining = max(remaining, 1e-6)
+        signal.signal(self._signum, self._expired)
+        self._expiry = self._clock() + remaining
+        self._armed = True
+        self._raised = False
+        signal.setitimer(self._which, self._interval(remaining))
+
+        soft, hard = self._rlimit
+        cpu_limit = math.ceil(time.process_time()
+            + remaining * _RLIMIT_FACTOR + _RLIMIT_GRACE)
+        if hard != resource.RLIM_INFINITY:
+            cpu_limit = min(cpu_limit, hard)
+        if soft == resource.RLIM_INFINITY or cpu_limit < soft:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, hard))
+
+    def disarm(self):
+        """
+        Disarm the deadline (and restore the original CPU limit).
+        """
+        self._armed = False
+        signal.setitimer(self._which, 0)
+        if resource.getrlimit(resource.RLIMIT_CPU) != self._rlimit:
+            resource.setrlimit(resource.RLIMIT_CPU, self._rlimit)
+
+
+class CpuMeter:
+    """
+    Context manager measuring the wall-clock time and CPU time of a section of
+    code (run on the calling thread), for reporting only. CPU time is split
+    between the calling thread, the process' other threads, and its child
+    processes. See `CountdownTimer` for enforcing limits.
+    """
+
+    def __init__(self):
+        self._wall = 0.0
+        self._thread = 0.0
+        self._cpu = 0.0
+        self._children = 0.0
+
+    def wall(self):
+        return self._wall
+
+    def thread(self):
+        return self._thread
+
+    def other_threads(self):
+        return max(0.0, self._cpu - self._thread)
+
+    def children(self):
+        return self._children
+
+    def __enter__(self):
+        self._wall_start = time.monotonic()
+        self._thread_start = time.thread_time()
+        self._cpu_start = time.process_time()
+        self._children_start = children_cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._wall = time.monotonic() - self._wall_start
+        self._thread = time.thread_time() - self._thread_start
+        self._cpu = time.process_time() - self._cpu_start
+        self._children = children_cpu_time() - self._children_start
+
+
+# Space accounting modes, i.e. which measure of memory MemoryWatcher charges
+# agents by:
+#
+#   vm    virtual memory size (VmSize/VmPeak), which includes memory that has
+#         been reserved but never used (e.g. by thread stacks or allocators)
+#   rss   resident set size (VmRSS/VmHWM), i.e. memory actually in use, but
+#         including pages shared with other processes
+#   uss   unique set size, i.e. resident memory not shared with any other
+#         process (more expensive to sample, and has no kernel peak counter)
+SPACE_ACCOUNTING_MODES = ("vm", "rss", "uss")
+
+_SAMPLE_INTERVAL = 0.005 # Seconds between memory samples during a call
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _get_curr_usage(mode: str) -> float:
+    # Current usage in MB, as cheaply as possible (for sampling)
+    if mode == "uss":
+        return _get_usage(mode)[0]
+    with Path("/proc/self/statm").open() as statm:
+        size, resident, *_ = statm.read().split()
+    return int(resident if mode == "rss" else size) * _PAGE_MB
+
+
+def _reset_peak_rss() -> bool:
+    # Reset the kernel's peak RSS counter (VmHWM) to the current RSS, so that
+    # it gives the exact peak from here on (if the kernel allows it)
+    try:
+        with Path("/proc/self/clear_refs").open("w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _get_usage(mode: str) -> tuple[float, float | None]:
+    # Current and peak usage in MB (the kernel keeps no peak for USS)
+    if mode == "uss":
+        uss = 0
+        with Path("/proc/self/smaps_rollup").open() as smaps:
+            for line in smaps:
+                if line.startswith("Private_"):
+                    uss += int(line.split()[1])
+        return uss / 1024, None # kB -> MB
+    curr_field, peak_field = ("VmRSS:", "VmHWM:") if mode == "rss" \
+        else ("VmSize:", "VmPeak:")
+    with Path("/proc/self/status").open() as proc_status:
+        for line in proc_status:
+            if line.startswith(curr_field):
+                curr_usage = int(line.split()[1]) / 1024  # kB -> MB
+            elif line.startswith(peak_field):
+                peak_usage = int(line.split()[1]) / 1024  # kB -> MB
+    return curr_usage, peak_usage # type: ignore
+
+
+class _MemorySampler(threading.Thread):
+    """
+    Background thread sampling the process' memory usage while active, to
+    catch short-lived peaks within a call. It sleeps between calls.
+    """
+
+    def __init__(self):
+        super().__init__(name="memory-sampler", daemon=True)
+        self._active = threading.Event()
+        self._lock = threading.Lock()
+        self._mode = "vm"
+        self._peak = 0.0
+        self._clock: int | None = None
+
+    def cpu_time(self) -> float:
+        """
+        CPU time used by this thread so far.
+        """
+        if self._clock is None:
+            return 0.0
+        try:
+            return time.clock_gettime(self._clock)
+        except OSError:
+            return 0.0 # (the thread didn't survive a fork)
+
+    def activate(self, mode: str, usage: float):
+        with self._lock:
+            self._mode = mode
+            self._peak = usage
+        self._active.set()
+
+    def deactivate(self) -> float:
+        """
+        Stop sampling and return the peak usage sampled since activation.
+        """
+        self._active.clear()
+        with self._lock:
+            return self._peak
+
+    def run(self):
+        self._clock = time.pthread_getcpuclockid(threading.get_ident())
+        while True:
+            self._active.wait()
+            with self._lock:
+                if self._active.is_set():
+                    self._peak = max(self._peak, _get_curr_usage(self._mode))
+            time.sleep(_SAMPLE_INTERVAL)
+
+
+_sampler: _MemorySampler | None = None
+
+
+def _sampler_cpu_time() -> float:
+    # CPU time used by the memory sampler, which is measurement overhead, not
+    # the agent's work
+    return _sampler.cpu_time() if _sampler is not None else 0.0
+
+
+def _get_sampler() -> _MemorySampler:
+    global _sampler
+    if _sampler is None or not _sampler.is_alive():
+        _sampler = _MemorySampler()
+        _sampler.start()
+    return _sampler
+
+
 class MemoryWatcher:
     """
     Context manager for clearing memory before and measuring memory usage
     after using a specific section of code.
 
     * works by parsing procfs; only available on linux.
+    * usage is sampled by a background thread during the section, so the peak
+      usage within it is known, even if memory is freed before it ends. The
+      kernel's peak counter is used too, where available, to catch peaks too
+      short to be sampled (and peaks reached between sections)
     * unless the limit is set to 0, throws an exception upon exiting the
       context if the memory limit has been breached
+    * optionally, the limit is also imposed on the address space of the
+      process (`RLIMIT_AS`), so that allocations fail as soon as the limit is
+      breached, rather than the whole section running first
     """
 
-    def __init__(self, space_limit, tolerance=1.0):
+    def __init__(self, space_limit, tolerance=1.0, mode="vm", rlimit=False):
+        """
+        Create a new memory watcher with space limit `space_limit`, in MB
+        (0 for unlimited space), measured as per `mode` (see
+        `SPACE_ACCOUNTING_MODES`). If `rlimit` is set, the address space of
+        the process is limited to its size at `set_space_line` plus the
+        space limit.
+        """
         self._limit = space_limit
         self._tolerance = tolerance
+        self._mode = mode
+        self._rlimit = rlimit and bool(space_limit)
+        self._rlimit_set = False
         self._curr_usage = -1
         self._peak_usage = -1
+        self._call_peak_usage = -1
+        self._kernel_peak = None
 
     def curr(self):
         return self._curr_usage
@@ -80,10 +620,28 @@ class MemoryWatcher:
     def peak(self):
         return self._peak_usage
 
+    def call_peak(self):
+        return self._call_peak_usage
+
     def enabled(self):
         return _SPACE_ENABLED
 
     def __enter__(self):
+        if _SPACE_ENABLED:
+            if self._rlimit and not self._rlimit_set:
+                _set_address_space_limit(self._limit * self._tolerance)
+                self._rlimit_set = True
+            curr_usage, kernel_peak = _get_usage(self._mode)
+            if kernel_peak is not None and self._kernel_peak is not None \
+                    and kernel_peak > self._kernel_peak:
+                # a new peak was reached between sections (e.g. while
+                # pondering or serialising the last reply)
+                self._peak_usage = max(self._peak_usage,
+                    kernel_peak - _DEFAULT_MEM_USAGE)
+            if self._mode == "rss" and _reset_peak_rss():
+                kernel_peak = curr_usage
+            self._kernel_peak = kernel_peak
+            _get_sampler().activate(self._mode, curr_usage)
         return self  # unused
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -92,51 +650,67 @@ class MemoryWatcher:
         stats and ensuring that peak usage is not exceeding limits
         """
         if _SPACE_ENABLED:
-            self._curr_usage, self._peak_usage = _get_space_usage()
+            sampled_peak = _get_sampler().deactivate() \
+                if _sampler is not None else 0.0
+            curr_usage, kernel_peak = _get_usage(self._mode)
+            call_peak = max(sampled_peak, curr_usage)
+            if kernel_peak is not None and (self._kernel_peak is None
+                    or kernel_peak > self._kernel_peak):
+                # the process' peak was reached within this section
+                call_peak = max(call_peak, kernel_peak)
+            self._kernel_peak = kernel_peak
 
             # adjust measurements to reflect usage of agents and referee, not
             # the Python interpreter itself
-            self._curr_usage -= _DEFAULT_MEM_USAGE
-            self._peak_usage -= _DEFAULT_MEM_USAGE
+            self._curr_usage = curr_usage - _DEFAULT_MEM_USAGE
+            self._call_peak_usage = call_peak - _DEFAULT_MEM_USAGE
+            self._peak_usage = max(self._peak_usage, self._call_peak_usage)
 
             # if we are limited, let's hope we are not out of space!
             if self._limit is not None and self._limit > 0:
+                if self._rlimit_set and isinstance(exc_val, MemoryError):
+                    raise ResourceLimitException(
+                        f"exceeded space limit (allocation failed at "
+                        f"address space limit)"
+                    ) from exc_val
                 if self._peak_usage > self._limit * self._tolerance:
                     raise ResourceLimitException(
                         f"exceeded space limit (peak={self._peak_usage:.1f}MB)"
                     )
 
 
-def _get_space_usage():
-    """
-    Find the current and peak Virtual Memory usage of the current process,
-    in MB
-    """
-    # on linux, we can find the memory usage of our program we seek
-    # inside /proc/self/status (specifically, fields VmSize and VmPeak)
-    with Path("/proc/self/status").open() as proc_status:
-        for line in proc_status:
-            if "VmSize:" in line:
-                curr_usage = int(line.split()[1]) / 1024  # kB -> MB
-            elif "VmPeak:" in line:
-                peak_usage = int(line.split()[1]) / 1024  # kB -> MB
-    return curr_usage, peak_usage # type: ignore
+def _set_address_space_limit(space_limit: float):
+    # Limit the address space to its size at the baseline plus the limit (in
+    # MB). Only the soft limit is set, so it can be changed for the next game.
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = int((_DEFAULT_VM_SIZE + space_limit) * 2**20)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
 
 
 _DEFAULT_MEM_USAGE = 0
+_DEFAULT_VM_SIZE = 0
 
 _SPACE_ENABLED = False
 
 
-def set_space_line():
+def set_space_line(mode="vm"):
     """
     by default, the python interpreter uses a significant amount of space
     measure this first to later subtract from all measurements
     """
-    global _SPACE_ENABLED, _DEFAULT_MEM_USAGE
+    global _SPACE_ENABLED, _DEFAULT_MEM_USAGE, _DEFAULT_VM_SIZE
 
     try:
-        _DEFAULT_MEM_USAGE, _ = _get_space_usage()
+        # any address space limit from a previous game would count towards
+        # the baseline, so lift it first
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (hard, hard))
+        # as would the sampler thread's stack, if started later
+        _get_sampler()
+        _DEFAULT_MEM_USAGE, _ = _get_usage(mode)
+        _DEFAULT_VM_SIZE, _ = _get_usage("vm")
         _SPACE_ENABLED = True
     except:
         # this also gives us a chance to detect if our space-measuring method
@@ -1,25 +1,71 @@
 # COMP30024 Artificial Intelligence, Semester 1 2024
 # Project Part B: Game Playing Agent
 
+import random
+import signal
 import sys
+import threading
+import time
 from contextlib import contextmanager
 from importlib import import_module
 from importlib.util import find_spec
 from traceback import format_exc
 from typing import Any
 
-from .resources import CountdownTimer, MemoryWatcher, set_space_line
-from .io import AsyncProcessStatus, m_pickle, m_unpickle,\
-    _ACK, _REPLY_OK, _REPLY_EXC
+from .resources import CountdownTimer, CpuDeadline, CpuMeter, GcPolicy, \
+    MemoryWatcher, accounting_clock, set_space_line
+from .io import AsyncProcessStatus, InterchangeException, ReplyWriter, \
+    m_unpickle, m_frame_length, m_unframe, \
+    _ACK, _RESET, _PONDER, _IDLE, _REPLY_OK, _REPLY_EXC, _FRAME_HEADER
 
 _STDOUT_OVERRIDE_MESSAGE = "stdout usage is not allowed in agent (use stderr)"
 _STDIN_OVERRIDE_MESSAGE = "stdin usage is not allowed in agent"
 
 
-# Wrapper subprocess entry point
-def main():
-    in_stream = sys.stdin
-    out_stream = sys.stdout
+class PonderSignal:
+    """
+    Passed to an agent's `ponder(signal, **referee)` method, which is run on a
+    background thread during the opponent's turn. The agent should poll
+    `is_set()` and return soon after it becomes True: either because the
+    referee has sent the next message (usually `update`), or because the
+    pondering CPU time cap (if any) has been reached.
+    """
+
+    def __init__(self, cap: float | None):
+        self._event = threading.Event()
+        self._cap = cap
+        self._start = 0.0
+        self._elapsed = 0.0
+        self.exception: Exception | None = None
+        self.stacktrace_str = ""
+
+    def is_set(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._cap is not None:
+            return time.thread_time() - self._start > self._cap
+        return False
+
+    def _run(self, ponder, **kwargs):
+        # Thread body: CPU time is measured with the thread's own clock
+        self._start = time.thread_time()
+        try:
+            ponder(self, **kwargs)
+        except Exception as e:
+            self.exception = e
+            self.stacktrace_str = format_exc()
+        finally:
+            self._elapsed = time.thread_time() - self._start
+
+
+# Wrapper subprocess entry point (the payload is normally passed on the command
+# line, see also `forkserver.py`)
+def main(payload: str | None = None):
+    # Binary streams for data interchange with the parent process (detached
+    # from their text wrappers, which are replaced below and would otherwise
+    # close them when garbage collected)
+    in_stream = sys.stdin.detach()
+    out_stream = sys.stdout.detach()
 
     # Redirect stdout to stderr (debugging purposes). This allows for seamless
     # use of print() in the subprocess without interruping data interchange
@@ -49,6 +95,10 @@ def main():
         def readlines(self, *args, **kwargs):
             raise RuntimeError(_STDIN_OVERRIDE_MESSAGE)
 
+        def close(self):
+            # Called by multiprocessing in the children of an agent
+            pass
+
     sys.__stdin__ = _StdinOverride()
     sys.stdin = _StdinOverride()
 
@@ -56,34 +106,42 @@ def main():
     def _s_unpickle(s: str) -> Any:
         return m_unpickle(bytes(s, "ascii"))
 
-    def _s_pickle(o: Any) -> str:
-        return m_pickle(o).decode("ascii")
-    
-    def _is_pickleable(o: Any) -> bool:
-        try:
-            m_pickle(o)
-            return True
-        except Exception:
-            return False
-
     # Command line arguments are the class/constructor arguments
     cls_module, cls_name, \
         time_limit, space_limit, \
-        res_limit_tolerance, \
+        res_limit_tolerance, time_accounting, \
+        space_accounting, space_rlimit, gc_policy, seed, \
         cons_args, cons_kwargs \
-        = _s_unpickle(sys.argv[1])
+        = _s_unpickle(payload if payload is not None else sys.argv[1])
 
     # Create some context managers for resource tracking
-    timer = CountdownTimer(time_limit, res_limit_tolerance)
-    space = MemoryWatcher(space_limit, res_limit_tolerance)
+    collector = GcPolicy(gc_policy)
+    timer = CountdownTimer(time_limit, res_limit_tolerance,
+        clock=accounting_clock(time_accounting),
+        deadline=CpuDeadline(time_accounting), gc_policy=collector)
+    space = MemoryWatcher(space_limit, res_limit_tolerance,
+        mode=space_accounting, rlimit=space_rlimit)
+    cpu = CpuMeter()
 
-    def _get_status():
+    def _get_status(time_serialise: float):
         return AsyncProcessStatus(
             time_delta=timer.delta(),
             time_used=timer.total(),
             space_known=space.enabled(),
             space_curr=space.curr(),
             space_peak=space.peak(),
+            space_call_peak=space.call_peak(),
+            time_serialise=time_serialise,
+            time_ponder=time_ponder,
+            time_recv=time_recv,
+            time_gc=timer.gc_time(),
+            time_gc_auto=collector.pause_time(),
+            gc_collections=collector.collections(),
+            time_compute=time_compute,
+            time_reply=time.monotonic(),
+            time_cpu_thread=cpu.thread(),
+            time_cpu_threads=cpu.other_threads(),
+            time_cpu_children=cpu.children(),
         )
 
     def _referee():
@@ -99,16 +157,66 @@ def main():
         }
 
     # Comms functions
+    time_recv = 0.0
+    time_compute = 0.0
+
     def _recv() -> Any:
-        line = in_stream.readline()
-        if not line: # EOF, process should exit (see __aexit__ above)
+        nonlocal time_recv
+        header = in_stream.read(_FRAME_HEADER.size)
+        if len(header) < _FRAME_HEADER.size:
+            # EOF, process should exit (see __aexit__ above)
             exit(0)
-        return _s_unpickle(line)
+        message = m_unframe(in_stream.read(m_frame_length(header)))
+        time_recv = time.monotonic()
+        return message
+
+    @contextmanager
+    def _wall_clock():
+        # Wall clock time of a call, excluding garbage collection by the
+        # timer (which must be entered within this context)
+        nonlocal time_compute
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            time_compute = time.monotonic() - start_time - timer.gc_time()
+
+    @contextmanager
+    def _timed():
+        # A timed call. Garbage is collected and then the space and CPU
+        # measurements are set up (and later torn down) outside the timer,
+        # so that only the call itself counts against the agent's time.
+        timer.collect()
+        with space, cpu, timer:
+            yield
+
+    writer = ReplyWriter(out_stream)
 
     def _reply(*args: Any):
-        # Reply is a tuple of (status, arg0, arg1, ...)
-        out_stream.write(_s_pickle((_get_status(), *args)))
-        out_stream.flush()
+        nonlocal time_ponder
+        # Reply is (arg0, arg1, ...) followed by the status. The body is
+        # serialised once, off the agent's clock, and that time is reported
+        # separately in the status.
+        start_time = time.perf_counter()
+        writer.begin()
+        try:
+            writer.dump(args)
+        except InterchangeException:
+            match args:
+                case (_REPLY_EXC, e, stacktrace_str):
+                    writer.dump((
+                        _REPLY_EXC,
+                        RuntimeError(f"{e.__class__.__name__}: {e}"),
+                        stacktrace_str
+                    ))
+                case _:
+                    writer.dump((_REPLY_OK, "<unpickleable>"))
+        writer.dump(_get_status(time.perf_counter() - start_time))
+        writer.end()
+        time_ponder = 0.0
+
+    class _ExceptionRelayed(Exception):
+        pass
 
     @contextmanager
     def _relay_exceptions():
@@ -117,35 +225,125 @@ def main():
         except Exception as e:
             stacktrace_str = "\n".join(format_exc().splitlines()[5:])
             _reply(_REPLY_EXC, e, stacktrace_str)
+            raise _ExceptionRelayed from e
 
     # If numpy exists on system, ensure it's imported so that it is included
     # in baseline memory usage calculations
     if find_spec("numpy") is not None and cls_name != "MockClient":
         import numpy
 
-    # Construct class instance
-    with _relay_exceptions(), timer, space:
-        set_space_line()
-        Cls = getattr(import_module(cls_module), cls_name)
-        instance = Cls(*cons_args, **{**cons_kwargs, **_referee()})
-    _reply(_REPLY_OK, _ACK)
+    instance = None
+
+    # Pondering state (see `PonderSignal`). The pondering thread runs from a
+    # ponder notification until the next message arrives. Its CPU time is
+    # either counted against the time limit, or (if a cap is given) capped
+    # and not counted; either way it is reported in the next status.
+    ponder_thread: threading.Thread | None = None
+    ponder_signal: PonderSignal | None = None
+    time_ponder = 0.0
+
+    def _start_pondering(cap: float | None):
+        nonlocal ponder_thread, ponder_signal
+        ponder = getattr(instance, "ponder", None)
+        if ponder is None:
+            return
+        ponder_signal = PonderSignal(cap)
+        ponder_thread = threading.Thread(
+            target=ponder_signal._run, args=(ponder,), kwargs=_referee(),
+            daemon=True)
+        ponder_thread.start()
+
+    def _stop_pondering() -> PonderSignal | None:
+        nonlocal ponder_thread, ponder_signal, time_ponder
+        if ponder_thread is None or ponder_signal is None:
+            return None
+        ponder_signal._event.set()
+        ponder_thread.join()
+        if ponder_signal._cap is None:
+            timer.charge(ponder_signal._elapsed)
+        time_ponder += ponder_signal._elapsed
+        stopped, ponder_thread, ponder_signal = ponder_signal, None, None
+        return stopped
+
+    def _construct():
+        # Construct class instance (if this fails, the exception is relayed
+        # and the process waits for EOF or a reset from the parent process)
+        nonlocal instance
+        if seed is not None:
+            # Seed the agent's random number generators for a reproducible
+            # game (see `seed` in `AgentProxyPlayer`)
+            random.seed(seed)
+            if "numpy" in sys.modules:
+                sys.modules["numpy"].random.seed(seed % 2 ** 32)
+        try:
+            set_space_line(space_accounting)
+            with _relay_exceptions(), _wall_clock(), _timed():
+                Cls = getattr(import_module(cls_module), cls_name)
+                instance = Cls(*cons_args, **{**cons_kwargs, **_referee()})
+            collector.constructed()
+            _reply(_REPLY_OK, _ACK)
+        except _ExceptionRelayed:
+            pass
+
+    _construct()
 
     # Main client subprocess loop
     while True:
         message = _recv()
         name, args, kwargs = message
+
+        # Any message ends pondering. An exception raised while pondering is
+        # relayed in place of the reply to this message.
+        stopped = _stop_pondering()
+        if stopped is not None and stopped.exception is not None \
+                and name not in (_RESET, _PONDER, _IDLE):
+            _reply(_REPLY_EXC, stopped.exception, stopped.stacktrace_str)
+            continue
+
+        if name == _PONDER:
+            # Notification only (no reply)
+            _start_pondering(*args)
+            continue
+
+        if name == _IDLE:
+            # Notification only (no reply): the game is over, so just stop
+            # pondering (and wait, e.g. in an agent process pool)
+            continue
+
+        if name == _RESET:
+            # Start a new game in this (warm) process: discard the previous
+            # instance and its garbage off the clock, then construct a new
+            # instance with fresh resource trackers.
+            time_limit, space_limit, res_limit_tolerance, time_accounting, \
+                space_accounting, space_rlimit, gc_policy, seed, \
+                cons_args, cons_kwargs = args
+            instance = None
+            collector.close()
+            collector = GcPolicy(gc_policy)
+            timer = CountdownTimer(time_limit, res_limit_tolerance,
+                clock=accounting_clock(time_accounting),
+                deadline=CpuDeadline(time_accounting), gc_policy=collector)
+            space = MemoryWatcher(space_limit, res_limit_tolerance,
+                mode=space_accounting, rlimit=space_rlimit)
+            _construct()
+            continue
         
         # Call method
-        result = None
-        with _relay_exceptions(), timer, space:
-            result = getattr(instance, name)(*args, **{**kwargs, **_referee()})
-            if not _is_pickleable(result):
-                result = "<unpickleable>"
+        try:
+            with _relay_exceptions(), _wall_clock(), _timed():
+                result = getattr(instance, name)(
+                    *args, **{**kwargs, **_referee()})
+        except _ExceptionRelayed:
+            continue
         
         _reply(_REPLY_OK, result)
 
 # Only run if directly invoked
 if __name__ == "__main__" and sys.argv[0].endswith(__file__):
+    # End on an interrupt even if started by a process ignoring them (e.g. a
+    # match worker, see `referee.match.GameProcessExecutor`), as the ignored
+    # disposition is inherited
+    signal.signal(signal.SIGINT, signal.default_int_handler)
     try:
         main()
     except KeyboardInterrupt:
@@ -0,0 +1,610 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Microbenchmarks for the engine hot paths used by the referee and agents:
+# move generation and state transitions in the agents' helpers modules, and
+# the referee `Board` methods called every turn. Each benchmark is timed over
+# a checked-in corpus of opening, midgame and endgame positions (see
+# `bench_corpus.json`, regenerated with the `corpus` command) and reported in
+# operations per second, as the mean and standard deviation over several
+# repeats. Results can be saved as a JSON baseline and compared against in
+# later runs.
+#
+# The `game` command instead measures the referee's own overhead: full games
+# are run through `run_game` between scripted players that reply instantly
+# (replaying the corpus game), either in-process or through `AgentProxyPlayer`
+# subprocesses, and the wall-clock time is broken down per stage.
+#
+# Run `python -m referee.bench --help` for usage, e.g.
+#
+#   python -m referee.bench engine --save baseline.json
+#   python -m referee.bench engine --compare baseline.json
+#   python -m referee.bench game --mode proxy --games 5
+
+import argparse
+import asyncio
+import json
+import random
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, fields
+from importlib import import_module
+from pathlib import Path
+from statistics import mean, stdev
+from time import perf_counter
+from types import ModuleType
+from typing import AsyncGenerator, Callable
+
+from .log import LogStream, LogColor, LogLevel
+from .game import Board, Coord, Player, PlayerColor, Action, PlaceAction, \
+    GameUpdate, PlayerError, UnhandledError
+from .game.pieces import piece_fingerprint
+from .engines import BoardEngine, Move, move_str, parse_move, \
+    DEFAULT_HELPERS_MODULE
+from .run import run_game, game_commentator, game_event_logger, \
+    output_board_updates
+from .agent import AgentProxyPlayer, enable_forkserver
+from .options import PlayerLoc
+
+CORPUS_PATH = Path(__file__).parent / "bench_corpus.json"
+PHASES = ("opening", "midgame", "endgame")
+
+
+@dataclass
+class Position:
+    """
+    A corpus position, prepared in every representation a benchmark needs.
+    """
+    moves: list[Move]
+    board: Board
+    state: dict[Coord, PlayerColor]
+    color: PlayerColor
+    legal: list[PlaceAction]
+
+
+@dataclass(frozen=True)
+class BenchResult:
+    name: str
+    phase: str
+    ops_per_sec: list[float]
+
+    @property
+    def mean(self) -> float:
+        return mean(self.ops_per_sec)
+
+    @property
+    def stdev(self) -> float:
+        return stdev(self.ops_per_sec) if len(self.ops_per_sec) > 1 else 0.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.phase}]"
+
+
+def generate_corpus(
+    seed: int = 0,
+    games: int = 8
+) -> dict[str, list[list[str]]]:
+    """
+    Generate a corpus from random games (one position per phase per game).
+    The opening position is taken a few plies in, the midgame position at
+    around 40% of the game, and the endgame position a few plies before the
+    game ends. The first game is also kept in full (under "game") as a script
+    for the referee benchmarks.
+    """
+    rng = random.Random(seed)
+    corpus: dict[str, list[list[str]]] = {phase: [] for phase in PHASES}
+    corpus["game"] = []
+    for _ in range(games):
+        engine = BoardEngine()
+        moves: list[Move] = []
+        while not engine.game_over:
+            move = rng.choice(sorted(engine.legal_moves(), key=sorted))
+            engine.push(move)
+            moves.append(move)
+
+        picks = {
+            "opening": rng.randint(4, 8),
+            "midgame": int(len(moves) * 0.4),
+            "endgame": len(moves) - rng.randint(2, 4),
+        }
+        for phase, ply in picks.items():
+            corpus[phase].append([move_str(move) for move in moves[:ply]])
+        if not corpus["game"]:
+            corpus["game"].append([move_str(move) for move in moves])
+    return corpus
+
+
+def load_corpus(path: Path = CORPUS_PATH) -> dict[str, list[Position]]:
+    """
+    Load the corpus positions, replaying each one on a referee board.
+    """
+    with open(path) as f:
+        corpus = json.load(f)
+
+    positions: dict[str, list[Position]] = {}
+    for phase in PHASES:
+        positions[phase] = []
+        for move_strs in corpus[phase]:
+            moves = [parse_move(s) for s in move_strs]
+            engine = BoardEngine().replay(moves)
+            positions[phase].append(Position(
+                moves=moves,
+                board=engine.board,
+                state=engine.occupancy(),
+                color=engine.turn_color,
+                legal=[
+                    PlaceAction(*move)
+                    for move in sorted(engine.legal_moves(), key=sorted)
+                ],
+            ))
+    return positions
+
+
+# Each benchmark maps a list of positions to a list of zero-argument calls,
+# each of which is a single operation.
+Operations = list[Callable[[], object]]
+
+
+def _bench_get_possible_moves(ps: list[Position], h: ModuleType) -> Operations:
+    return [
+        lambda p=p: h.get_possible_moves(p.state, p.color)
+        for p in ps
+    ]
+
+
+def _bench_get_next_state(ps: list[Position], h: ModuleType) -> Operations:
+    return [
+        lambda p=p, a=a: h.get_next_state(p.state, a, p.color)
+        for p in ps for a in p.legal[:8]
+    ]
+
+
+def _bench_apply_action(ps: list[Position], h: ModuleType) -> Operations:
+    def apply_undo(board: Board, action: PlaceAction):
+        board.apply_action(action)
+        board.undo_action()
+
+    return [
+        lambda p=p, a=a: apply_undo(p.board, a)
+        for p in ps for a in p.legal[:8]
+    ]
+
+
+def _bench_game_over(ps: list[Position], h: ModuleType) -> Operations:
+    return [lambda p=p: p.board.game_over for p in ps]
+
+
+def _bench_piece_fingerprint(ps: list[Position], h: ModuleType) -> Operations:
+    return [
+        lambda a=a: piece_fingerprint(list(a.coords))
+        for p in ps for a in p.legal[:8]
+    ]
+
+
+def _bench_rollout_step(ps: list[Position], h: ModuleType) -> Operations:
+    # One step of the Monte Carlo agents' rollout loop: generate moves for the
+    # player to move, then play one of them.
+    def step(p: Position):
+        moves = h.get_possible_moves(p.state, p.color)
+        if moves:
+            h.get_next_state(p.state, moves[0], p.color)
+
+    return [lambda p=p: step(p) for p in ps]
+
+
+BENCHMARKS: dict[str, Callable[[list[Position], ModuleType], Operations]] = {
+    "get_possible_moves": _bench_get_possible_moves,
+    "get_next_state": _bench_get_next_state,
+    "Board.apply_action+undo": _bench_apply_action,
+    "Board.game_over": _bench_game_over,
+    "piece_fingerprint": _bench_piece_fingerprint,
+    "rollout_step": _bench_rollout_step,
+}
+
+
+def time_operations(
+    ops: Operations,
+    repeats: int = 5,
+    min_time: float = 0.2
+) -> list[float]:
+    """
+    Time a list of operations, cycling through them until at least `min_time`
+    seconds have passed. Returns the ops/sec of each repeat.
+    """
+    # Warm up (e.g. memoisation, first-call imports) off the clock.
+    for op in ops:
+        op()
+
+    rates = []
+    for _ in range(repeats):
+        n = 0
+        start_time = perf_counter()
+        while True:
+            for op in ops:
+                op()
+            n += len(ops)
+            elapsed = perf_counter() - start_time
+            if elapsed >= min_time:
+                break
+        rates.append(n / elapsed)
+    return rates
+
+
+def run_benchmarks(
+    names: list[str],
+    positions: dict[str, list[Position]],
+    helpers: ModuleType,
+    repeats: int = 5,
+    min_time: float = 0.2,
+) -> list[BenchResult]:
+    results = []
+    for name in names:
+        for phase in PHASES:
+            ops = BENCHMARKS[name](positions[phase], helpers)
+            if not ops:
+                continue
+            results.append(BenchResult(
+                name, phase, time_operations(ops, repeats, min_time)
+            ))
+    return results
+
+
+def load_script(path: Path = CORPUS_PATH) -> list[PlaceAction]:
+    """
+    Load the corpus script game (a complete game, see `generate_corpus`).
+    """
+    with open(path) as f:
+        return [PlaceAction(*parse_move(s)) for s in json.load(f)["game"][0]]
+
+
+class ScriptedAgent:
+    """
+    An agent that replays the corpus script game, replying instantly. Both
+    colours follow the same script, so the game plays out identically every
+    time. Loadable by the referee as `referee.bench:ScriptedAgent`.
+    """
+
+    def __init__(self, color: PlayerColor, **referee: dict):
+        self._script = load_script()
+        self._turn = 0
+
+    def action(self, **referee: dict) -> Action:
+        return self._script[self._turn]
+
+    def update(self, color: PlayerColor, action: Action, **referee: dict):
+        self._turn += 1
+
+
+SCRIPTED_AGENT_LOC = PlayerLoc("referee.bench", "ScriptedAgent")
+
+
+class ScriptedPlayer(Player):
+    """
+    In-process `Player` wrapping a `ScriptedAgent` (no subprocess, no IPC).
+    """
+
+    def __init__(self, color: PlayerColor):
+        super().__init__(color)
+        self._agent = ScriptedAgent(color)
+
+    async def action(self) -> Action:
+        return self._agent.action()
+
+    async def update(self, color: PlayerColor, action: Action):
+        self._agent.update(color, action)
+
+
+@dataclass
+class StageTimings:
+    """
+    Wall-clock seconds spent in each stage of a game, as seen by the referee.
+    """
+    spawn: float = 0.0
+    action: float = 0.0
+    update: float = 0.0
+    handlers: float = 0.0
+    teardown: float = 0.0
+    apply_action: float = 0.0
+    game_over: float = 0.0
+    other: float = 0.0
+    wall: float = field(default=0.0, metadata={"total": True})
+    turns: int = field(default=0, metadata={"total": True})
+
+    def __iadd__(self, other: 'StageTimings') -> 'StageTimings':
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+        return self
+
+    def stages(self) -> dict[str, float]:
+        return {
+            f.name: getattr(self, f.name)
+            for f in fields(self) if not f.metadata.get("total")
+        }
+
+
+class StageClock:
+    """
+    Accumulates wall-clock time per stage into a `StageTimings`. Overlapping
+    calls in the same stage (e.g. concurrent updates to both players) are
+    only counted once.
+    """
+
+    def __init__(self, timings: StageTimings):
+        self._timings = timings
+        self._active: dict[str, int] = {}
+        self._start: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        if self._active.get(name, 0) == 0:
+            self._start[name] = perf_counter()
+        self._active[name] = self._active.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            self._active[name] -= 1
+            if self._active[name] == 0:
+                setattr(self._timings, name, getattr(self._timings, name)
+                    + perf_counter() - self._start[name])
+
+
+class TimedPlayer(Player):
+    """
+    Transparent `Player` wrapper accumulating the wall-clock time spent in
+    each of the wrapped player's methods.
+    """
+
+    def __init__(self, player: Player, clock: StageClock):
+        super().__init__(player.color)
+        self._player = player
+        self._clock = clock
+
+    async def action(self) -> Action:
+        async with self._clock.stage("action"):
+            return await self._player.action()
+
+    async def update(self, color: PlayerColor, action: Action):
+        async with self._clock.stage("update"):
+            await self._player.update(color, action)
+
+    async def update_and_action(
+        self,
+        color: PlayerColor,
+        action: Action
+    ) -> Action:
+        # Counted as an update, as it overlaps with the other player's update.
+        async with self._clock.stage("update"):
+            return await self._player.update_and_action(color, action)
+
+    async def __aenter__(self) -> 'TimedPlayer':
+        async with self._clock.stage("spawn"):
+            await self._player.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        async with self._clock.stage("teardown"):
+            await self._player.__aexit__(exc_type, exc_val, exc_tb)
+
+
+async def _raise_on_error() -> AsyncGenerator:
+    # A scripted game should never end in an error; if it does, the timings
+    # are meaningless.
+    while True:
+        update: GameUpdate = yield
+        match update:
+            case PlayerError(message) | UnhandledError(message):
+                raise RuntimeError(f"scripted game failed: {message}")
+
+
+async def _timed_handler(
+    handler: AsyncGenerator,
+    clock: StageClock
+) -> AsyncGenerator:
+    await handler.asend(None)
+    while True:
+        update = yield
+        async with clock.stage("handlers"):
+            await handler.asend(update)
+
+
+def _board_timings(script: list[PlaceAction]) -> tuple[float, float, int]:
+    """
+    Replay the script on a board (as the referee's game loop does), timing
+    `apply_action` and `game_over`. Returns both totals and the turn count.
+    """
+    board = Board()
+    apply_time, game_over_time = 0.0, 0.0
+    for action in script:
+        start_time = perf_counter()
+        board.apply_action(action)
+        apply_time += perf_counter() - start_time
+
+        start_time = perf_counter()
+        game_over = board.game_over
+        game_over_time += perf_counter() - start_time
+        if game_over:
+            break
+    return apply_time, game_over_time, board.turn_count
+
+
+async def bench_game(
+    proxy: bool,
+    log: LogStream,
+    pipeline: bool = False,
+    forkserver: bool = False,
+) -> StageTimings:
+    """
+    Run one scripted game through `run_game`, with the referee's usual event
+    handlers logging to `log`, and return the per-stage timings.
+    """
+    timings = StageTimings()
+    clock = StageClock(timings)
+    players: list[Player] = []
+    for color in PlayerColor:
+        player: Player
+        if proxy:
+            player = AgentProxyPlayer(
+                f"scripted {color}", color,
+                SCRIPTED_AGENT_LOC,
+                time_limit=0,
+                space_limit=0,
+                forkserver=forkserver,
+            )
+        else:
+            player = ScriptedPlayer(color)
+        players.append(TimedPlayer(player, clock))
+
+    handlers: list[AsyncGenerator | None] = [
+        _timed_handler(handler, clock) for handler in [
+            game_event_logger(log),
+            game_commentator(log),
+            output_board_updates(log),
+        ]
+    ] + [_raise_on_error()]
+
+    start_time = perf_counter()
+    await run_game(players, handlers, pipeline=pipeline)
+    timings.wall = perf_counter() - start_time
+
+    timings.apply_action, timings.game_over, timings.turns = \
+        _board_timings(load_script())
+    timings.other = timings.wall - sum(timings.stages().values())
+    return timings
+
+
+def _format_timings(mode: str, games: int, timings: StageTimings) -> list[str]:
+    lines = [
+        f"{mode}: {games} games, {timings.turns} turns in "
+        f"{timings.wall:.3f}s ({timings.turns / timings.wall:.1f} turns/s)"
+    ]
+    for stage, seconds in timings.stages().items():
+        lines.append(
+            f"  {stage:<14} {seconds:9.4f}s  "
+            f"{1000 * seconds / timings.turns:8.3f}ms/turn  "
+            f"{100 * seconds / timings.wall:5.1f}%"
+        )
+    return lines
+
+
+def _format_result(result: BenchResult, baseline: dict | None) -> str:
+    rel_stdev = 100 * result.stdev / result.mean if result.mean > 0 else 0
+    line = f"{result.key:<36} {result.mean:>12.1f} ops/s "\
+           f"± {rel_stdev:4.1f}%"
+    if baseline is not None and result.key in baseline:
+        base = baseline[result.key]["mean"]
+        line += f"  ({100 * (result.mean - base) / base:+6.1f}% vs baseline)"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m referee.bench",
+        description="Benchmarks for the referee and Tetress engines.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    engine = commands.add_parser(
+        "engine", help="time engine hot paths over the position corpus.")
+    engine.add_argument(
+        "-b", "--bench", action="append", choices=list(BENCHMARKS),
+        help="benchmark to run (repeatable; default: all).")
+    engine.add_argument(
+        "--helpers", default=DEFAULT_HELPERS_MODULE,
+        help="helpers module to benchmark (default: %(default)s).")
+    engine.add_argument(
+        "--corpus", type=Path, default=CORPUS_PATH,
+        help="position corpus (default: the checked-in corpus).")
+    engine.add_argument(
+        "-r", "--repeats", type=int, default=5,
+        help="number of timed repeats (default: %(default)s).")
+    engine.add_argument(
+        "-t", "--min-time", type=float, default=0.2,
+        help="minimum seconds per repeat (default: %(default)s).")
+    engine.add_argument(
+        "--save", type=Path, default=None,
+        help="write results to a JSON baseline file.")
+    engine.add_argument(
+        "--compare", type=Path, default=None,
+        help="compare results against a JSON baseline file.")
+
+    game = commands.add_parser(
+        "game", help="measure referee overhead with instant scripted players.")
+    game.add_argument(
+        "-m", "--mode", choices=["inprocess", "proxy", "both"],
+        default="both",
+        help="run players in-process or via AgentProxyPlayer subprocesses "
+             "(default: %(default)s).")
+    game.add_argument(
+        "-g", "--games", type=int, default=3,
+        help="number of games per mode (default: %(default)s).")
+    game.add_argument(
+        "-P", "--pipeline", action="store_true",
+        help="pipeline each update with the next action request.")
+    game.add_argument(
+        "-F", "--forkserver", action="store_true",
+        help="fork proxy agents from a preloaded template process.")
+
+    corpus = commands.add_parser(
+        "corpus", help="regenerate the position corpus.")
+    corpus.add_argument("-s", "--seed", type=int, default=0)
+    corpus.add_argument("-g", "--games", type=int, default=8)
+    corpus.add_argument("-o", "--output", type=Path, default=CORPUS_PATH)
+
+    args = parser.parse_args()
+
+    LogStream.set_global_setting("level", LogLevel.INFO)
+    log = LogStream("bench", LogColor.CYAN)
+
+    match args.command:
+        case "engine":
+            helpers = import_module(args.helpers)
+            baseline = None
+            if args.compare is not None:
+                with open(args.compare) as f:
+                    baseline = json.load(f)
+
+            results = run_benchmarks(
+                args.bench or list(BENCHMARKS),
+                load_corpus(args.corpus),
+                helpers,
+                repeats=args.repeats,
+                min_time=args.min_time,
+            )
+            for result in results:
+                log.info(_format_result(result, baseline))
+
+            if args.save is not None:
+                with open(args.save, "w") as f:
+                    json.dump({
+                        result.key: {
+                            "mean": result.mean,
+                            "stdev": result.stdev,
+                            "ops_per_sec": result.ops_per_sec,
+                        } for result in results
+                    }, f, indent=2)
+                log.info(f"saved results to '{args.save}'")
+
+        case "game":
+            # Handlers format every message as usual, but output is discarded.
+            sink = LogStream("game", handlers=[lambda _: None])
+            modes = ["inprocess", "proxy"] if args.mode == "both" \
+                else [args.mode]
+            if args.forkserver and "proxy" in modes:
+                enable_forkserver([SCRIPTED_AGENT_LOC.pkg])
+            for mode in modes:
+                total = StageTimings()
+                for _ in range(args.games):
+                    total += asyncio.run(
+                        bench_game(mode == "proxy", sink, args.pipeline,
+                                   args.forkserver))
+                for line in _format_timings(mode, args.games, total):
+                    log.info(line)
+
+        case "corpus":
+            with open(args.output, "w") as f:
+                json.dump(generate_corpus(args.seed, args.games), f, indent=1)
+            log.info(f"wrote corpus to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tournament checkpoints: the state of a match or gauntlet (see `match.py`,
+# `gauntlet.py`), saved to a JSON file whenever a game starts or finishes so
+# that an interrupted tournament (e.g. a closed terminal, or a crashed
+# machine) can be resumed by running the same command again, e.g.
+#
+#   python -m referee.match A B --games 200 --checkpoint ab.json
+#
+# The file holds the tournament's configuration (which must match on
+# resuming), its seed, the results of finished games in the order they
+# finished, and the pairings of games that were underway. On resuming,
+# finished games are counted without being replayed, and games that were
+# underway are played again from the start with the same pairing and seed
+# (their partial results were never counted). Games are recorded in a results
+# database under a key unique to the tournament and game, so that replaying a
+# game replaces any record of it rather than adding another.
+#
+# Files are replaced atomically (written to a temporary file, synced, then
+# renamed over the old file), so a checkpoint is never left half written.
+
+import json
+import os
+import random
+import uuid
+from pathlib import Path
+from typing import Any
+
+_SEED_BITS = 32
+
+
+class CheckpointError(Exception):
+    """
+    The checkpoint file can't be used to resume this tournament.
+    """
+
+
+class Checkpoint:
+    """
+    Saved state of a tournament (see above). Games are identified by their
+    index within the tournament.
+    """
+
+    def __init__(self,
+        path: str | Path,
+        config: dict[str, Any],
+        seed: int | None = None,
+    ):
+        """
+        Load the checkpoint at `path` if it exists (checking that it was saved
+        for a tournament with the same `config`), or else start a new one,
+        with the given tournament seed (or a random one).
+        """
+        self.path = Path(path)
+        self.config = config
+        self.finished: list[dict[str, Any]] = []
+        self.underway: dict[int, Any] = {}
+
+        if self.path.exists():
+            with open(self.path) as f:
+                state = json.load(f)
+            if state["config"] != config:
+                raise CheckpointError(
+                    f"'{self.path}' is a checkpoint of a different "
+                    f"tournament ({state['config']})")
+            if seed is not None and seed != state["seed"]:
+                raise CheckpointError(
+                    f"'{self.path}' is a checkpoint of a tournament with "
+                    f"seed {state['seed']}")
+            self.id: str = state["id"]
+            self.seed: int = state["seed"]
+            self.finished = state["finished"]
+            self.underway = {
+                int(index): pairing
+                for index, pairing in state["underway"].items()
+            }
+            self.resumed = True
+        else:
+            self.id = uuid.uuid4().hex
+            self.seed = seed if seed is not None \
+                else random.getrandbits(_SEED_BITS)
+            self.resumed = False
+            self.save()
+
+    @property
+    def next_index(self) -> int:
+        """
+        Index of the first game not yet started.
+        """
+        indices = [result["index"] for result in self.finished] \
+            + list(self.underway)
+        return max(indices) + 1 if indices else 0
+
+    def key(self, index: int) -> str:
+        """
+        Key of a game in a results database (see `GameRecord`).
+        """
+        return f"{self.id}:{index}"
+
+    def start(self, index: int, pairing: Any):
+        """
+        Record that a game has started, with the given pairing.
+        """
+        self.underway[index] = pairing
+        self.save()
+
+    def finish(self, result: dict[str, Any]):
+        """
+        Record the result of a game (a dict with the game's "index").
+        """
+        self.underway.pop(result["index"], None)
+        self.finished.append(result)
+        self.save()
+
+    def save(self):
+        state = {
+            "id": self.id,
+            "config": self.config,
+            "seed": self.seed,
+            "finished": self.finished,
+            "underway": self.underway,
+        }
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        # Sync the directory so that the rename itself is durable
+        dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def game_seed(seed: int, index: int) -> int:
+    """
+    Seed of a game in a tournament with the given seed.
+    """
+    return random.Random(f"{seed}:{index}").getrandbits(_SEED_BITS)
@@ -0,0 +1,288 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Common interface over the different Tetress move generators in this
+# repository, so that referee tooling (e.g. the differential fuzzer) can drive
+# any of them interchangeably. An engine holds a single position which is
+# advanced with `push` and rewound with `pop`. Moves are represented as
+# frozensets of coordinates, which is the only representation that every
+# engine shares.
+#
+# Engines are selected with a "spec" string (see `load_engine`):
+#
+#   board                         the referee's own `Board` class
+#   helpers[:<module>]            a helpers module (get_possible_moves and
+#                                 get_next_state), by default
+#                                 `monte_carlo_agent.helpers`
+#   <module>:<class>              any other class implementing `Engine`
+
+from abc import ABC, abstractmethod
+from importlib import import_module
+from typing import Iterable
+
+from .game import Board, Coord, PlayerColor, PlaceAction, BOARD_N, MAX_TURNS
+from .game.board import CellState
+from .game.pieces import PieceType, create_piece
+from .game.exceptions import IllegalActionException
+
+Move = frozenset[Coord]
+
+DEFAULT_HELPERS_MODULE = "monte_carlo_agent.helpers"
+
+
+class Engine(ABC):
+    """
+    An abstract Tetress engine holding a single position. Engines start from
+    the empty board with RED to play.
+    """
+
+    @abstractmethod
+    def legal_moves(self) -> set[Move]:
+        """
+        Return all legal moves for the player to move.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def push(self, move: Move):
+        """
+        Play a (legal) move for the player to move.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def pop(self):
+        """
+        Undo the last move played.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def occupancy(self) -> dict[Coord, PlayerColor]:
+        """
+        Return the occupied cells of the board and the colour occupying them.
+        """
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def turn_count(self) -> int:
+        """
+        The number of moves played so far.
+        """
+        raise NotImplementedError
+
+    @property
+    def turn_color(self) -> PlayerColor:
+        """
+        The player to move.
+        """
+        return PlayerColor.RED if self.turn_count % 2 == 0 \
+            else PlayerColor.BLUE
+
+    @property
+    def game_over(self) -> bool:
+        """
+        True iff the game is over (turn limit reached or no legal moves).
+        """
+        return self.turn_count >= MAX_TURNS or len(self.legal_moves()) == 0
+
+    @property
+    def winner_color(self) -> PlayerColor | None:
+        """
+        The winning player (colour), or None if the game is drawn or ongoing.
+        """
+        if self.turn_count >= MAX_TURNS:
+            balance = sum(int(color) for color in self.occupancy().values())
+            if balance == 0:
+                return None
+            return PlayerColor.RED if balance > 0 else PlayerColor.BLUE
+
+        if len(self.legal_moves()) == 0:
+            return self.turn_color.opponent
+
+        return None
+
+    def replay(self, moves: Iterable[Move]) -> 'Engine':
+        """
+        Push a sequence of moves, returning the engine for convenience.
+        """
+        for move in moves:
+            self.push(move)
+        return self
+
+
+_ALL_PLACEMENTS: list[Move] = []
+
+
+def all_placements() -> list[Move]:
+    """
+    Return every placement of every piece type on the (empty) board. The list
+    is computed once and shared.
+    """
+    if not _ALL_PLACEMENTS:
+        _ALL_PLACEMENTS.extend(
+            frozenset(create_piece(piece_type, Coord(r, c)).coords)
+            for piece_type in PieceType
+            for r in range(BOARD_N)
+            for c in range(BOARD_N)
+        )
+    return _ALL_PLACEMENTS
+
+
+def free_placements(occupied: Iterable[Coord]) -> set[Move]:
+    """
+    Return every piece placement that covers only empty cells, regardless of
+    adjacency. This is the legal move set for the first two turns of a game.
+    """
+    occupied = set(occupied)
+    return {
+        coords for coords in all_placements() if occupied.isdisjoint(coords)
+    }
+
+
+class BoardEngine(Engine):
+    """
+    Engine backed by the referee's `Board`. This is the reference
+    implementation: move generation tries every placement over empty cells and
+    keeps those that the board's own action validation accepts.
+    """
+
+    def __init__(self):
+        self._board = Board()
+
+    @property
+    def board(self) -> Board:
+        return self._board
+
+    def legal_moves(self) -> set[Move]:
+        board = self._board
+        moves = set()
+        for coords in free_placements(board._occupied_coords()):
+            try:
+                board._parse_place_action(PlaceAction(*coords))
+            except IllegalActionException:
+                continue
+            moves.add(coords)
+        return moves
+
+    def push(self, move: Move):
+        self._board.apply_action(PlaceAction(*move))
+
+    def pop(self):
+        self._board.undo_action()
+
+    def occupancy(self) -> dict[Coord, PlayerColor]:
+        return {
+            coord: self._board[coord].player  # type: ignore
+            for coord in self._board._occupied_coords()
+        }
+
+    @property
+    def turn_count(self) -> int:
+        return self._board.turn_count
+
+    @property
+    def turn_color(self) -> PlayerColor:
+        return self._board.turn_color
+
+    @property
+    def game_over(self) -> bool:
+        return self._board.game_over
+
+    @property
+    def winner_color(self) -> PlayerColor | None:
+        return self._board.winner_color
+
+    @classmethod
+    def from_occupancy(
+        cls,
+        occupancy: dict[Coord, PlayerColor],
+        turn_color: PlayerColor = PlayerColor.RED,
+    ) -> 'BoardEngine':
+        """
+        Create an engine from an arbitrary board occupancy. Note that such a
+        position has no move history, so the first-turn adjacency exemption
+        applies to its first two moves.
+        """
+        engine = cls()
+        engine._board = Board(
+            {coord: CellState(color) for coord, color in occupancy.items()},
+            turn_color
+        )
+        return engine
+
+
+class HelpersEngine(Engine):
+    """
+    Engine backed by an agent `helpers` module, i.e. its `get_possible_moves`
+    DFS and `get_next_state` functions over a `dict[Coord, PlayerColor]`.
+
+    The helpers only generate moves adjacent to the mover's own pieces (agents
+    hard-code their opening moves), so for the first two turns of a game this
+    engine falls back to `free_placements`.
+    """
+
+    def __init__(self, module: str = DEFAULT_HELPERS_MODULE):
+        self._helpers = import_module(module)
+        self._stack: list[dict[Coord, PlayerColor]] = [{}]
+
+    def legal_moves(self) -> set[Move]:
+        if self.turn_count < 2:
+            return free_placements(self._stack[-1].keys())
+        return {
+            frozenset(action.coords) for action in
+            self._helpers.get_possible_moves(self._stack[-1], self.turn_color)
+        }
+
+    def push(self, move: Move):
+        self._stack.append(self._helpers.get_next_state(
+            self._stack[-1], PlaceAction(*move), self.turn_color))
+
+    def pop(self):
+        if len(self._stack) == 1:
+            raise IndexError("No actions to undo.")
+        self._stack.pop()
+
+    def occupancy(self) -> dict[Coord, PlayerColor]:
+        return dict(self._stack[-1])
+
+    @property
+    def turn_count(self) -> int:
+        return len(self._stack) - 1
+
+
+def load_engine(spec: str) -> Engine:
+    """
+    Create an engine from a spec string (see the top of this module).
+    """
+    if spec == "board":
+        return BoardEngine()
+
+    kind, _, arg = spec.partition(":")
+    if kind == "helpers":
+        return HelpersEngine(arg or DEFAULT_HELPERS_MODULE)
+
+    if not arg:
+        raise ValueError(f"invalid engine spec: '{spec}'")
+    engine = getattr(import_module(kind), arg)()
+    if not isinstance(engine, Engine):
+        raise TypeError(f"'{spec}' is not an Engine")
+    return engine
+
+
+def move_str(move: Move) -> str:
+    """
+    Format a move as a space-separated list of sorted "r-c" coordinates.
+    """
+    return " ".join(str(coord) for coord in sorted(move))
+
+
+def parse_move(s: str) -> Move:
+    """
+    Parse a move formatted by `move_str` (commas are also accepted).
+    """
+    return frozenset(
+        Coord(*map(int, token.split("-")))
+        for token in s.replace(",", " ").split()
+    )
@@ -0,0 +1,307 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Differential fuzz harness for Tetress move generators. Random games are
+# played move-by-move on a "subject" engine and an "oracle" engine (by default
+# an agent helpers module against the referee `Board`), and at every ply the
+# two engines must agree on:
+#
+#   * the set of legal moves for the player to move,
+#   * the board occupancy after the move (i.e. line clears),
+#   * whether the game is over, and if so, the winner.
+#
+# Games are distributed over a process pool. Any failing game is shrunk to a
+# minimal move sequence that still reproduces the same kind of discrepancy.
+# Run `python -m referee.fuzz --help` for usage.
+
+import argparse
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from time import time
+
+from .log import LogStream, LogColor, LogLevel
+from .engines import Engine, Move, load_engine, move_str, DEFAULT_HELPERS_MODULE
+
+
+@dataclass(frozen=True)
+class Discrepancy:
+    """
+    A disagreement between the subject and oracle engines, reproducible by
+    replaying `moves` from the empty board.
+    """
+    kind: str
+    detail: str
+    moves: tuple[Move, ...]
+
+    def __str__(self) -> str:
+        moves = "\n".join(
+            f"  {i:3d}: {move_str(move)}" for i, move in enumerate(self.moves, 1)
+        )
+        return f"{self.kind} after {len(self.moves)} moves: {self.detail}\n"\
+               f"{moves}"
+
+
+@dataclass
+class GameReport:
+    """
+    Outcome of fuzzing a single game.
+    """
+    seed: int
+    plies: int
+    failure: Discrepancy | None = None
+    shrunk_from: int | None = None
+
+
+@dataclass
+class FuzzSummary:
+    games: int = 0
+    plies: int = 0
+    failures: list[GameReport] = field(default_factory=list)
+
+
+def _sample(moves: set[Move], limit: int = 3) -> str:
+    return ", ".join(
+        f"[{move_str(move)}]" for move in sorted(moves, key=sorted)[:limit]
+    ) + (" ..." if len(moves) > limit else "")
+
+
+def _compare(
+    subject: Engine,
+    oracle: Engine,
+    moves: tuple[Move, ...]
+) -> tuple[Discrepancy | None, set[Move]]:
+    """
+    Compare the current position of both engines, returning the first
+    discrepancy found (if any) and the oracle's legal moves.
+    """
+    oracle_moves = oracle.legal_moves()
+    subject_moves = subject.legal_moves()
+    if subject_moves != oracle_moves:
+        missing = oracle_moves - subject_moves
+        extra = subject_moves - oracle_moves
+        return Discrepancy(
+            "move-set",
+            f"{len(missing)} missing {_sample(missing)}; "
+            f"{len(extra)} extra {_sample(extra)}",
+            moves
+        ), oracle_moves
+
+    if subject.occupancy() != oracle.occupancy():
+        return Discrepancy(
+            "occupancy",
+            "board contents differ (line clear mismatch)",
+            moves
+        ), oracle_moves
+
+    if subject.game_over != oracle.game_over:
+        return Discrepancy(
+            "terminal",
+            f"subject game_over={subject.game_over}, "
+            f"oracle game_over={oracle.game_over}",
+            moves
+        ), oracle_moves
+
+    if oracle.game_over and subject.winner_color != oracle.winner_color:
+        return Discrepancy(
+            "winner",
+            f"subject winner={subject.winner_color}, "
+            f"oracle winner={oracle.winner_color}",
+            moves
+        ), oracle_moves
+
+    return None, oracle_moves
+
+
+def check_sequence(
+    subject_spec: str,
+    oracle_spec: str,
+    moves: tuple[Move, ...]
+) -> Discrepancy | None:
+    """
+    Replay a move sequence on fresh engines, checking every ply. Returns the
+    first discrepancy, or None if the engines agree throughout. A sequence
+    containing a move the oracle considers illegal also returns None (it is
+    not a valid reproduction).
+    """
+    subject, oracle = load_engine(subject_spec), load_engine(oracle_spec)
+    for i in range(len(moves) + 1):
+        failure, legal = _compare(subject, oracle, moves[:i])
+        if failure is not None:
+            return failure
+        if i == len(moves):
+            return None
+        if moves[i] not in legal or oracle.game_over:
+            return None
+        subject.push(moves[i])
+        oracle.push(moves[i])
+
+
+def shrink(
+    subject_spec: str,
+    oracle_spec: str,
+    failure: Discrepancy
+) -> Discrepancy:
+    """
+    Greedily remove chunks of moves (halving the chunk size each pass) while
+    the sequence still reproduces a discrepancy of the same kind.
+    """
+    best = failure
+    chunk = max(1, len(best.moves) // 2)
+    while chunk >= 1:
+        i = 0
+        while i < len(best.moves):
+            candidate = best.moves[:i] + best.moves[i + chunk:]
+            result = check_sequence(subject_spec, oracle_spec, candidate)
+            if result is not None and result.kind == failure.kind:
+                best = result
+            else:
+                i += chunk
+        chunk //= 2
+    return best
+
+
+def fuzz_game(
+    subject_spec: str,
+    oracle_spec: str,
+    seed: int,
+    max_plies: int | None = None,
+    shrink_failures: bool = True
+) -> GameReport:
+    """
+    Play one random game (moves drawn uniformly from the oracle's legal
+    moves), comparing the engines at every ply.
+    """
+    rng = random.Random(seed)
+    subject, oracle = load_engine(subject_spec), load_engine(oracle_spec)
+    moves: tuple[Move, ...] = ()
+
+    while True:
+        failure, legal = _compare(subject, oracle, moves)
+        if failure is not None:
+            report = GameReport(seed, len(moves), failure)
+            if shrink_failures:
+                report.failure = shrink(subject_spec, oracle_spec, failure)
+                report.shrunk_from = len(failure.moves)
+            return report
+
+        if oracle.game_over or \
+                (max_plies is not None and len(moves) >= max_plies):
+            return GameReport(seed, len(moves))
+
+        # Sort before sampling so that games are reproducible from the seed.
+        move = rng.choice(sorted(legal, key=sorted))
+        subject.push(move)
+        oracle.push(move)
+        moves += (move,)
+
+
+def run_fuzz(
+    subject_spec: str,
+    oracle_spec: str,
+    games: int,
+    jobs: int,
+    seed: int,
+    max_plies: int | None = None,
+    stop_on_failure: bool = False,
+    log: LogStream | None = None,
+) -> FuzzSummary:
+    """
+    Fuzz `games` games over a pool of `jobs` worker processes. Game `i` uses
+    seed `seed + i`, so any reported game can be replayed on its own.
+    """
+    summary = FuzzSummary()
+    start_time = time()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(fuzz_game,
+                subject_spec, oracle_spec, seed + i, max_plies)
+            for i in range(games)
+        ]
+        for future in as_completed(futures):
+            report = future.result()
+            summary.games += 1
+            summary.plies += report.plies
+
+            if log is not None:
+                elapsed = time() - start_time
+                log.debug(
+                    f"game seed={report.seed}: {report.plies} plies "
+                    f"({summary.plies / elapsed:.1f} plies/s overall)")
+
+            if report.failure is not None:
+                summary.failures.append(report)
+                if log is not None:
+                    log.error(
+                        f"game seed={report.seed} failed (shrunk from "
+                        f"{report.shrunk_from} to "
+                        f"{len(report.failure.moves)} moves):")
+                    log.error(str(report.failure))
+                if stop_on_failure:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m referee.fuzz",
+        description="Differential fuzzing of a Tetress engine against the "
+                    "referee board.",
+    )
+    parser.add_argument(
+        "-e", "--engine", default=f"helpers:{DEFAULT_HELPERS_MODULE}",
+        help="engine spec under test (default: %(default)s).")
+    parser.add_argument(
+        "-o", "--oracle", default="board",
+        help="engine spec used as the oracle (default: %(default)s).")
+    parser.add_argument(
+        "-g", "--games", type=int, default=100,
+        help="number of random games to play (default: %(default)s).")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="number of worker processes (default: number of CPUs).")
+    parser.add_argument(
+        "-s", "--seed", type=int, default=0,
+        help="seed of the first game; game i uses seed+i "
+             "(default: %(default)s).")
+    parser.add_argument(
+        "-p", "--max-plies", type=int, default=None,
+        help="truncate games after this many plies.")
+    parser.add_argument(
+        "-x", "--stop-on-failure", action="store_true",
+        help="stop after the first failing game.")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true",
+        help="log progress after every game.")
+    args = parser.parse_args()
+
+    LogStream.set_global_setting("level",
+        LogLevel.DEBUG if args.verbose else LogLevel.INFO)
+    log = LogStream("fuzz", LogColor.CYAN)
+
+    start_time = time()
+    summary = run_fuzz(
+        args.engine, args.oracle,
+        games=args.games,
+        jobs=args.jobs,
+        seed=args.seed,
+        max_plies=args.max_plies,
+        stop_on_failure=args.stop_on_failure,
+        log=log,
+    )
+    elapsed = time() - start_time
+
+    log.info(
+        f"{summary.games} games, {summary.plies} plies in {elapsed:.1f}s "
+        f"({summary.plies / max(elapsed, 1e-9):.1f} plies/s)")
+    if summary.failures:
+        log.critical(f"{len(summary.failures)} failing games")
+        exit(1)
+    log.info(f"no discrepancies between '{args.engine}' and '{args.oracle}'")
+
+
+if __name__ == "__main__":
+    main()
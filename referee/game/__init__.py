@@ -11,6 +11,7 @@ from .player import Player
 from .board import Board, PlayerColor
 from .actions import Action, PlaceAction
 from .exceptions import PlayerException, IllegalActionException
+from .mirror import BoardMirror
 
 
 # Here we define the ADT for all possible game updates. This is a useful
@@ -61,15 +62,47 @@ GameUpdate = PlayerInitialising \
            | UnhandledError \
            | GameEnd
 
+async def _gather_players(*aws):
+    # Await player calls concurrently. Unlike a plain gather, all calls are
+    # allowed to finish before the first exception (in argument order) is
+    # raised, so no call is left running in the background.
+    results = await gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+async def _update_and_ponder(
+    player: Player,
+    color: PlayerColor,
+    action: Action
+):
+    # Update the player that just moved, then let it think during the
+    # opponent's turn.
+    await player.update(color, action)
+    await player.ponder()
+
 # Entry-point for running a game...
 async def game(
     p1: Player,
     p2: Player,
+    pipeline: bool = False,
+    mirror: BoardMirror | None = None,
 ) -> AsyncGenerator[GameUpdate, None]:
     """
     Run an asynchronous game sequence, yielding updates to the consumer as the
     game progresses. The consumer is responsible for handling these updates
     appropriately (e.g. logging them).
+
+    After each turn both players are updated concurrently. If `pipeline` is
+    set, the next player's update is combined with its next action request
+    (see `Player.update_and_action`), so that its action is already underway
+    by the time the next turn begins. The next turn's `TurnBegin` is then
+    yielded before that request is sent (i.e. before the players' updates
+    have completed), so it still precedes the action's computation.
+
+    If a `mirror` is given, the board state is published to it at the start
+    of the game and after every action, before the players are updated.
     """
     players: dict[PlayerColor, Player] = {
         player.color: player for player in [p1, p2]
@@ -78,7 +111,10 @@ async def game(
     assert PlayerColor.BLUE in players
 
     board: Board = Board()
+    if mirror is not None:
+        mirror.publish(board)
     winner_color: PlayerColor | None = None
+    next_action: Action | None = None
 
     yield GameBegin(board)
     try:
@@ -97,12 +133,18 @@ async def game(
                     
                     # Get the current player's requested action.
                     turn_id = board.turn_count + 1
-                    yield TurnBegin(turn_id, player)
-                    action: Action = await player.action()
+                    if next_action is None:
+                        yield TurnBegin(turn_id, player)
+                        action: Action = await player.action()
+                    else:
+                        # (Turn began with the pipelined request, see below)
+                        action, next_action = next_action, None
                     yield TurnEnd(turn_id, player, action)
 
                     # Update the board state accordingly.
                     board.apply_action(action)
+                    if mirror is not None:
+                        mirror.publish(board)
                     yield BoardUpdate(board)
 
                     # Check if game is over.
@@ -111,8 +153,19 @@ async def game(
                         break
 
                     # Update both players.
-                    await p1.update(turn_color, action)
-                    await p2.update(turn_color, action)
+                    next_player: Player = players[board._turn_color]
+                    if pipeline:
+                        yield TurnBegin(board.turn_count + 1, next_player)
+                        _, next_action = await _gather_players(
+                            _update_and_ponder(player, turn_color, action),
+                            next_player.update_and_action(
+                                turn_color, action),
+                        )
+                    else:
+                        await _gather_players(
+                            _update_and_ponder(player, turn_color, action),
+                            next_player.update(turn_color, action),
+                        )
 
     except (PlayerException) as e:
         error_msg: str = e.args[0]
@@ -0,0 +1,212 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Shared-memory mirror of the referee's board. The referee publishes the
+# authoritative game state after every action into a small shared memory
+# block, which agents (in their own processes) can map read-only instead of
+# recomputing the state from `update()` calls. The block name is passed to
+# agents' constructors as `referee["board_mirror"]`, e.g.
+#
+#   from referee.game.mirror import BoardMirrorView
+#
+#   view = BoardMirrorView(referee["board_mirror"])
+#   state = view.read()     # -> MirrorSnapshot
+#   state.occupancy()       # -> dict[Coord, PlayerColor]
+#
+# Block layout (little-endian, see `_LAYOUT`):
+#
+#   seq                 u64   sequence number (odd while being written)
+#   turn_count          u32   number of actions played so far
+#   turn_color          u8    player to move (0 = RED, 1 = BLUE)
+#   legal_move_count    u32   number of legal actions for the player to move
+#   red, blue           16B   occupancy bitmasks; bit r * BOARD_N + c
+#
+# Writes are guarded by a sequence lock: the writer makes `seq` odd, writes
+# the state, then makes it even again. Readers retry until they read the same
+# even `seq` before and after copying the state, so they never see a partial
+# update and never block the writer. Between attempts readers yield the CPU
+# (so a preempted writer can finish), and give up after `_READ_ATTEMPTS` (e.g.
+# if the writer died part way through an update).
+
+import struct
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from .board import Board
+from .constants import BOARD_N
+from .coord import Coord, Direction
+from .player import PlayerColor
+from .pieces import PieceType, create_piece
+
+_SEQ = struct.Struct("<Q")
+_LAYOUT = struct.Struct("<QIB3xI4x16s16s")
+_MASK_BYTES = 16
+_READ_ATTEMPTS = 10_000
+
+# Blocks created by this process (an agent may run in the referee process)
+_OWNED: set[str] = set()
+
+
+def _bit(coord: Coord) -> int:
+    return 1 << (coord.r * BOARD_N + coord.c)
+
+
+def _mask(coords) -> int:
+    mask = 0
+    for coord in coords:
+        mask |= _bit(coord)
+    return mask
+
+
+_PLACEMENTS: list[tuple[int, int]] = []
+
+
+def _placements() -> list[tuple[int, int]]:
+    # Every placement of every piece type as (piece mask, neighbour mask),
+    # where the neighbour mask covers the cells adjacent to the piece.
+    if not _PLACEMENTS:
+        for piece_type in PieceType:
+            for r in range(BOARD_N):
+                for c in range(BOARD_N):
+                    coords = create_piece(piece_type, Coord(r, c)).coords
+                    piece = _mask(coords)
+                    neighbours = _mask(
+                        coord + direction
+                        for coord in coords for direction in Direction
+                    ) & ~piece
+                    _PLACEMENTS.append((piece, neighbours))
+    return _PLACEMENTS
+
+
+def count_legal_moves(red: int, blue: int, turn_color: PlayerColor,
+                      turn_count: int) -> int:
+    """
+    Count the legal actions for the player to move, given the occupancy masks
+    (the first two actions of a game need no neighbouring piece).
+    """
+    occupied = red | blue
+    own = red if turn_color == PlayerColor.RED else blue
+    if turn_count < 2:
+        return sum(1 for piece, _ in _placements() if not piece & occupied)
+    return sum(1 for piece, neighbours in _placements()
+        if not piece & occupied and neighbours & own)
+
+
+@dataclass(frozen=True, slots=True)
+class MirrorSnapshot:
+    """
+    A consistent copy of the mirrored game state.
+    """
+    seq: int
+    turn_count: int
+    turn_color: PlayerColor
+    legal_move_count: int
+    red: int
+    blue: int
+
+    def occupancy(self) -> dict[Coord, PlayerColor]:
+        """
+        The occupied cells of the board and the colour occupying them.
+        """
+        cells = {}
+        for i in range(BOARD_N * BOARD_N):
+            if self.red >> i & 1:
+                cells[Coord(*divmod(i, BOARD_N))] = PlayerColor.RED
+            elif self.blue >> i & 1:
+                cells[Coord(*divmod(i, BOARD_N))] = PlayerColor.BLUE
+        return cells
+
+
+class BoardMirror:
+    """
+    Referee side of the mirror: owns the shared memory block and publishes
+    board states to it. Note that this class is implemented as a context
+    manager which frees the block on exit.
+    """
+
+    def __init__(self):
+        self._shm = SharedMemory(create=True, size=_LAYOUT.size)
+        _OWNED.add(self._shm.name)
+        self._seq = 0
+        self.publish(Board())
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def publish(self, board: Board):
+        """
+        Write the state of `board` to the mirror.
+        """
+        red = _mask(coord for coord in board._occupied_coords()
+            if board[coord].player == PlayerColor.RED)
+        blue = _mask(coord for coord in board._occupied_coords()
+            if board[coord].player == PlayerColor.BLUE)
+        legal = count_legal_moves(
+            red, blue, board.turn_color, board.turn_count)
+
+        buf = self._shm.buf
+        self._seq += 1
+        _SEQ.pack_into(buf, 0, self._seq)
+        _LAYOUT.pack_into(buf, 0, self._seq,
+            board.turn_count, board.turn_color.value, legal,
+            red.to_bytes(_MASK_BYTES, "little"),
+            blue.to_bytes(_MASK_BYTES, "little"))
+        self._seq += 1
+        _SEQ.pack_into(buf, 0, self._seq)
+
+    def close(self):
+        _OWNED.discard(self._shm.name)
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> 'BoardMirror':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class BoardMirrorView:
+    """
+    Agent side of the mirror: a read-only mapping of the shared memory block.
+    """
+
+    def __init__(self, name: str):
+        self._shm = SharedMemory(name=name)
+        # Attaching to a block registers it with this process' resource
+        # tracker (there is no `track=False` before Python 3.13), which would
+        # then unlink it from under the referee when this process exits.
+        if name not in _OWNED:
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._buf = self._shm.buf.toreadonly()
+
+    def read(self) -> MirrorSnapshot:
+        """
+        Return a consistent snapshot of the mirrored state. Raises
+        TimeoutError if none can be read (see above).
+        """
+        for _ in range(_READ_ATTEMPTS):
+            seq, = _SEQ.unpack_from(self._buf, 0)
+            if not seq & 1:
+                data = bytes(self._buf)
+                if _SEQ.unpack_from(self._buf, 0)[0] == seq:
+                    break
+            time.sleep(0)
+        else:
+            raise TimeoutError(
+                f"board mirror update still in progress after "
+                f"{_READ_ATTEMPTS} attempts")
+
+        _, turn_count, turn_color, legal, red, blue = _LAYOUT.unpack(data)
+        return MirrorSnapshot(
+            seq, turn_count, PlayerColor(turn_color), legal,
+            int.from_bytes(red, "little"),
+            int.from_bytes(blue, "little"),
+        )
+
+    def close(self):
+        self._buf.release()
+        self._shm.close()
@@ -76,6 +76,27 @@ class Player(ABC):
         """
         raise NotImplementedError
 
+    async def update_and_action(
+        self, 
+        color: PlayerColor, 
+        action: Action
+    ) -> Action:
+        """
+        Notify the player that an action has been played, then get its next
+        action. Subclasses may override this to combine both calls (e.g. into
+        a single round trip to an agent process).
+        """
+        await self.update(color, action)
+        return await self.action()
+
+    async def ponder(self):
+        """
+        Notify the player that its opponent is now choosing an action, so it
+        may think in the background until its next update. By default this
+        does nothing.
+        """
+        pass
+
     async def __aenter__(self) -> 'Player':
         """
         Context manager: Any resource allocation should be done here.
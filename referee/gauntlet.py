@@ -0,0 +1,445 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Gauntlet: ranks a set of agents by playing games between them, in parallel
+# over a process pool (each game is played as by `python -m referee.match`),
+# and rating them as games finish. Two schedules are supported:
+#
+#   round-robin  every agent plays every other agent `--rounds` times as each
+#                colour, in a fixed order
+#   swiss        games are paired one at a time, as workers free up, choosing
+#                the most informative pairing given the current ratings (see
+#                below), until `--games` games have been played
+#
+# Ratings are maximum a posteriori Bradley-Terry (Elo) ratings over all
+# results so far, with draws counting as half a win, and with a prior of
+# `PRIOR_DRAWS` virtual draws against a 0-rated opponent for every agent (as
+# in BayesElo), which keeps ratings finite for unbeaten or winless agents.
+# They're refitted after every game, starting from the previous fit.
+#
+# A pairing is informative when its result is uncertain (the expected score
+# is near 1/2) and the ratings of its agents are uncertain, so swiss
+# scheduling picks the pair maximising p (1 - p) (var_i + var_j), where p is
+# the expected score of one agent against the other and var_i is the variance
+# of agent i's rating (counting games underway as if they'd been played).
+# As in a Swiss tournament, pairs are only repeated once every pair has met,
+# so the pair is chosen from those that have played the fewest games.
+# Games are played as by the match runner (see `game_executor`), in worker
+# processes or (with --event-loop) all in one event loop.
+# Run `python -m referee.gauntlet --help` for usage, e.g.
+#
+#   python -m referee.gauntlet random_agent minimax_agent monte_carlo_agent \
+#       monte_carlo_strong_agent --swiss --games 200 --jobs 4
+
+import argparse
+import math
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from itertools import permutations
+from time import perf_counter
+
+from .log import LogStream, LogColor, LogLevel
+from .game import PlayerColor
+from .match import GameResult, agent_cores, game_executor, play_game
+from .results import ResultsStore
+from .checkpoint import Checkpoint, CheckpointError, game_seed
+from .options import PlayerLoc, parse_package_spec
+
+PRIOR_DRAWS = 2.0
+
+_ELO = 400 / math.log(10) # Elo points per unit of natural log-strength
+_FIT_ITERATIONS = 100
+_FIT_TOLERANCE = 1e-6
+
+
+@dataclass
+class Rating:
+    """
+    An agent's rating (Elo, with the mean rating at 0) and its standard
+    error, with its record over the gauntlet.
+    """
+    agent: PlayerLoc
+    elo: float
+    error: float
+    games: int
+    score: float
+
+
+class Ratings:
+    """
+    Bradley-Terry ratings of a set of agents from pairwise results (see
+    above), updated incrementally as results come in.
+    """
+
+    def __init__(self,
+        agents: list[PlayerLoc],
+        prior_draws: float = PRIOR_DRAWS,
+    ):
+        self.agents = agents
+        self._prior = prior_draws
+        n = len(agents)
+        self._games = [[0.0] * n for _ in range(n)]
+        self._points = [[0.0] * n for _ in range(n)]
+        self._strength = [1.0] * n
+
+    def add(self, i: int, j: int, score: float):
+        """
+        Add a game between agents i and j, in which i scored `score` (1, 1/2
+        or 0), and refit the ratings.
+        """
+        self._games[i][j] += 1
+        self._games[j][i] += 1
+        self._points[i][j] += score
+        self._points[j][i] += 1 - score
+        self._fit()
+
+    def _fit(self):
+        # Minorisation-maximisation (Hunter, 2004), with the prior as games
+        # against a virtual opponent of strength 1
+        n = len(self.agents)
+        gamma = self._strength
+        for _ in range(_FIT_ITERATIONS):
+            change = 0.0
+            for i in range(n):
+                points = sum(self._points[i]) + self._prior / 2
+                denominator = self._prior / (gamma[i] + 1) + sum(
+                    self._games[i][j] / (gamma[i] + gamma[j])
+                    for j in range(n) if j != i)
+                updated = points / denominator
+                change = max(change, abs(math.log(updated / gamma[i])))
+                gamma[i] = updated
+            if change < _FIT_TOLERANCE:
+                break
+
+    def expected(self, i: int, j: int) -> float:
+        """
+        Expected score of agent i against agent j.
+        """
+        return self._strength[i] / (self._strength[i] + self._strength[j])
+
+    def variance(self, i: int, extra: list[float] | None = None) -> float:
+        """
+        Variance of agent i's rating (in natural log-strength units), from
+        the Fisher information of its games (plus `extra[j]` games against
+        each agent j).
+        """
+        info = self._prior / 4 + sum(
+            (self._games[i][j] + (extra[j] if extra else 0))
+                * self.expected(i, j) * self.expected(j, i)
+            for j in range(len(self.agents)) if j != i)
+        return 1 / info
+
+    def ratings(self) -> list[Rating]:
+        """
+        Current ratings of all agents, best first.
+        """
+        logs = [math.log(g) for g in self._strength]
+        mean = sum(logs) / len(logs)
+        ratings = [
+            Rating(
+                agent,
+                elo=(logs[i] - mean) * _ELO,
+                error=math.sqrt(self.variance(i)) * _ELO,
+                games=int(sum(self._games[i])),
+                score=sum(self._points[i]) / sum(self._games[i])
+                    if sum(self._games[i]) else 0.0,
+            )
+            for i, agent in enumerate(self.agents)
+        ]
+        return sorted(ratings, key=lambda rating: -rating.elo)
+
+
+def round_robin(agents: int, rounds: int) -> list[tuple[int, int]]:
+    """
+    Round-robin schedule of (red, blue) agent indices: every agent plays
+    every other `rounds` times as each colour.
+    """
+    return [pair for _ in range(rounds)
+        for pair in permutations(range(agents), 2)]
+
+
+def swiss_pairing(
+    ratings: Ratings,
+    underway: list[tuple[int, int]],
+    colors: dict[tuple[int, int], int],
+) -> tuple[int, int]:
+    """
+    The most informative next pairing (see above) of those that have
+    played the fewest games, as (red, blue) agent indices, given the games
+    `underway` and the number of times each agent has played RED against
+    each other agent so far (`colors`).
+    """
+    n = len(ratings.agents)
+    extra = [[0.0] * n for _ in range(n)]
+    for i, j in underway:
+        extra[i][j] += 1
+        extra[j][i] += 1
+    variances = [ratings.variance(i, extra[i]) for i in range(n)]
+
+    def information(pair: tuple[int, int]) -> float:
+        i, j = pair
+        p = ratings.expected(i, j)
+        return p * (1 - p) * (variances[i] + variances[j])
+
+    def played(pair: tuple[int, int]) -> float:
+        i, j = pair
+        return ratings._games[i][j] + extra[i][j]
+
+    pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    fewest = min(map(played, pairs))
+    i, j = max((pair for pair in pairs if played(pair) == fewest),
+        key=information)
+    # Alternate colours within each pairing
+    if colors.get((i, j), 0) > colors.get((j, i), 0):
+        i, j = j, i
+    return i, j
+
+
+def run_gauntlet(
+    agents: list[PlayerLoc],
+    schedule: list[tuple[int, int]] | None,
+    games: int,
+    jobs: int | None,
+    time_limit: float,
+    space_limit: float,
+    forkserver: bool = False,
+    log: LogStream | None = None,
+    store: ResultsStore | None = None,
+    seed: int | None = None,
+    checkpoint: Checkpoint | None = None,
+    event_loop: bool = False,
+    max_processes: int | None = None,
+    cores: list[frozenset[int]] | None = None,
+) -> Ratings:
+    """
+    Play a gauntlet between `agents`, `jobs` games at once (as in
+    `run_match`), following `schedule` (a list of (red, blue) agent
+    indices) if given, and otherwise choosing `games` swiss pairings,
+    logging each result as it comes in (and recording it in `store`, if
+    given). Games are seeded and checkpointed as in `run_match`.
+    """
+    ratings = Ratings(agents)
+    total = len(schedule) if schedule is not None else games
+    colors: dict[tuple[int, int], int] = {}
+
+    def _count(result: GameResult, red: int, blue: int):
+        if result.error is None:
+            ratings.add(red, blue,
+                1.0 if result.winner == PlayerColor.RED else
+                0.0 if result.winner == PlayerColor.BLUE else 0.5)
+
+    # Games that were underway when the checkpoint was saved are played again
+    # (with the same pairings) before any new games
+    replay: list[tuple[int, tuple[int, int]]] = []
+    next_index = 0
+    if checkpoint is not None:
+        index_of = {str(agent): i for i, agent in enumerate(agents)}
+        for state in checkpoint.finished:
+            red, blue = index_of[state["red"]], index_of[state["blue"]]
+            colors[red, blue] = colors.get((red, blue), 0) + 1
+            _count(GameResult.from_dict(state), red, blue)
+        for index, (red, blue) in sorted(checkpoint.underway.items()):
+            colors[red, blue] = colors.get((red, blue), 0) + 1
+            replay.append((index, (red, blue)))
+        next_index = checkpoint.next_index
+        if checkpoint.resumed and log is not None:
+            log.info(f"resuming from '{checkpoint.path}': "
+                     f"{len(checkpoint.finished)} games finished, "
+                     f"{len(replay)} to replay")
+
+    pending: dict[Future, tuple[int, int]] = {}
+    executor, in_flight = game_executor(jobs, event_loop, max_processes,
+        forkserver, [agent.pkg for agent in agents], cores)
+    with executor:
+        try:
+            # Games are submitted as workers free up, so that swiss pairings
+            # are chosen with the latest ratings
+            while True:
+                while len(pending) < in_flight \
+                        and (replay or next_index < total):
+                    if replay:
+                        index, (red, blue) = replay.pop(0)
+                    else:
+                        index, next_index = next_index, next_index + 1
+                        if schedule is not None:
+                            red, blue = schedule[index]
+                        else:
+                            red, blue = swiss_pairing(
+                                ratings, list(pending.values()), colors)
+                        colors[red, blue] = colors.get((red, blue), 0) + 1
+                    if checkpoint is not None:
+                        checkpoint.start(index, [red, blue])
+                    future = executor.submit(play_game, index,
+                        agents[red], agents[blue],
+                        time_limit, space_limit, forkserver,
+                        seed=game_seed(seed, index)
+                            if seed is not None else None,
+                        key=checkpoint.key(index) if checkpoint else None)
+                    pending[future] = (red, blue)
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    red, blue = pending.pop(future)
+                    result: GameResult = future.result()
+                    # Record the game before checkpointing it, so that a game
+                    # is never counted without being recorded
+                    if store is not None and result.record is not None:
+                        store.add(result.record)
+                    if checkpoint is not None:
+                        checkpoint.finish(result.to_dict())
+                    _count(result, red, blue)
+                    if log is not None:
+                        log.info(str(result))
+                        if result.player_error is not None:
+                            log.info(f"  {result.player_error}")
+                        if result.error is not None:
+                            log.error(f"  {result.error}")
+        except KeyboardInterrupt:
+            # Abandon the games underway rather than waiting for them
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    return ratings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m referee.gauntlet",
+        description="Rank a set of agents by playing games between them, in "
+                    "parallel, with round-robin or swiss pairings.",
+    )
+    parser.add_argument(
+        "agents", metavar="AGENT", nargs="+", type=parse_package_spec,
+        help="package specification of an agent (see python -m referee -h).")
+    schedule_group = parser.add_mutually_exclusive_group()
+    schedule_group.add_argument(
+        "-r", "--rounds", type=int, default=None,
+        help="number of round-robin rounds: every agent plays every other "
+             "this many times as each colour (default: 1).")
+    schedule_group.add_argument(
+        "-S", "--swiss", action="store_true",
+        help="choose the most informative pairing for each game instead, "
+             "given the ratings so far.")
+    parser.add_argument(
+        "-g", "--games", type=int, default=None,
+        help="number of games to play with --swiss (default: 4 per pair "
+             "of agents).")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="number of games to play at once (default: number of CPUs). "
+             "Each game runs two agent processes.")
+    parser.add_argument(
+        "-L", "--event-loop", action="store_true",
+        help="play games at once in one event loop in this process, rather "
+             "than in a worker process each, sharing warm agent processes "
+             "between games.")
+    parser.add_argument(
+        "--agent-processes", type=int, default=None, metavar="N",
+        help="with --event-loop, the most agent processes alive at once "
+             "(at least 2, default: two per game). Fewer games are played "
+             "at once if need be.")
+    parser.add_argument(
+        "--pin", action="store_true",
+        help="pin each agent process to a physical core of its own, playing "
+             "at most half as many games at once as there are cores, so "
+             "that agents don't compete for CPUs.")
+    parser.add_argument(
+        "-t", "--time", type=float, default=0,
+        help="limit on CPU time (float, seconds) for each agent per game "
+             "(default: no limit).")
+    parser.add_argument(
+        "-s", "--space", type=float, default=0,
+        help="limit on memory space (float, MB) for each agent (default: "
+             "no limit).")
+    parser.add_argument(
+        "-F", "--forkserver", action="store_true",
+        help="fork agent processes from a template process with the agent "
+             "packages preloaded (one per worker).")
+    parser.add_argument(
+        "--db", metavar="FILE", default=None,
+        help="record each game in this results database (see "
+             "python -m referee.results).")
+    parser.add_argument(
+        "--seed", type=int, default=None,
+        help="seed the agents in each game with a seed derived from this "
+             "(default: a random seed with --checkpoint, otherwise agents "
+             "are not seeded).")
+    parser.add_argument(
+        "--checkpoint", metavar="FILE", default=None,
+        help="save the state of the gauntlet to this file as games start "
+             "and finish, and resume from it if it exists (the other "
+             "arguments must be the same, except --games, --jobs and "
+             "--forkserver).")
+    args = parser.parse_args()
+
+    if len(set(args.agents)) != len(args.agents) or len(args.agents) < 2:
+        parser.error("expected at least two distinct agents")
+    if args.agent_processes is not None and args.agent_processes < 2:
+        parser.error("--agent-processes must be at least 2")
+    if args.games is not None and not args.swiss:
+        parser.error("--games only applies with --swiss")
+    n = len(args.agents)
+    schedule = None if args.swiss else round_robin(n, args.rounds or 1)
+    games = args.games if args.games is not None else 2 * n * (n - 1)
+
+    LogStream.set_global_setting("level", LogLevel.INFO)
+    log = LogStream("gauntlet", LogColor.CYAN)
+
+    checkpoint: Checkpoint | None = None
+    seed = args.seed
+    if args.checkpoint is not None:
+        config = {
+            "kind": "gauntlet",
+            "agents": [str(agent) for agent in args.agents],
+            "rounds": None if args.swiss else args.rounds or 1,
+            "time": args.time,
+            "space": args.space,
+        }
+        try:
+            checkpoint = Checkpoint(args.checkpoint, config, seed)
+        except CheckpointError as e:
+            parser.error(str(e))
+        seed = checkpoint.seed
+
+    start_time = perf_counter()
+    store = ResultsStore(args.db) if args.db is not None else None
+    try:
+        ratings = run_gauntlet(
+            args.agents,
+            schedule=schedule,
+            games=games,
+            jobs=args.jobs,
+            time_limit=args.time,
+            space_limit=args.space,
+            forkserver=args.forkserver,
+            log=log,
+            store=store,
+            seed=seed,
+            checkpoint=checkpoint,
+            event_loop=args.event_loop,
+            max_processes=args.agent_processes,
+            cores=agent_cores(log) if args.pin else None,
+        )
+    except KeyboardInterrupt:
+        log.info("KeyboardInterrupt: bye!")
+        if checkpoint is not None:
+            log.info(f"(run the same command again to resume from "
+                     f"'{checkpoint.path}')")
+        exit(130)
+    finally:
+        if store is not None:
+            store.close()
+    elapsed = perf_counter() - start_time
+
+    log.info(f"{len(schedule) if schedule else games} games in "
+             f"{elapsed:.1f}s")
+    log.info(f"{'rank':>4}  {'agent':<32} {'elo':>6} {'+/-':>5} "
+             f"{'games':>5} {'score':>6}")
+    for rank, rating in enumerate(ratings.ratings(), 1):
+        log.info(f"{rank:>4}  {str(rating.agent):<32} {rating.elo:>+6.0f} "
+                 f"{1.96 * rating.error:>5.0f} {rating.games:>5} "
+                 f"{rating.score:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,17 +10,19 @@
 # the inner workings of this module. The only relevant parts are in the `game`
 # module, as described in the project specification.
 
-import os
 import asyncio
+from time import perf_counter
 from argparse import Namespace
 from pathlib import Path
 from traceback import format_tb
 
-from .game import Player, PlayerColor
+from .game import Player, PlayerColor, BoardMirror
 from .log import LogStream, LogColor, LogLevel
 from .run import game_user_wait, run_game, \
     game_commentator, game_event_logger, game_delay, output_board_updates
-from .agent import AgentProxyPlayer
+from .agent import AgentProxyPlayer, AgentProcessPool, InProcessPlayer, \
+    RemoteSocketPlayer, enable_forkserver
+from .results import GameRecord, ResultsStore, game_recorder
 from .options import get_options, PlayerLoc
 
 
@@ -82,6 +84,23 @@ def main(options: Namespace|None=None):
                 output_level=False,
             )
 
+    # Agent processes are forked from a template process with the agent
+    # packages preloaded if requested
+    if options.forkserver and not options.inprocess:
+        enable_forkserver(
+            vars(options)[f"player{p_num}_loc"].pkg for p_num in (1, 2))
+
+    # Agent processes are kept warm between games if playing more than one
+    pool = AgentProcessPool(rl) \
+        if options.repeat > 1 and not options.inprocess else None
+
+    # The board is mirrored to shared memory for agents if requested
+    mirror = BoardMirror() if options.mirror else None
+    mirror_name = mirror.name if mirror is not None else None
+
+    # Games are recorded in a results database if requested
+    store = ResultsStore(options.db) if options.db is not None else None
+
     try:
         agents: dict[Player, dict] = {}
         for p_num, player_color in enumerate(PlayerColor, 1):
@@ -90,22 +109,75 @@ def main(options: Namespace|None=None):
             player_name = f"player {p_num} [{':'.join(player_loc)}]"
 
             rl.info(f"wrapping {player_name} as {player_color}...")
-            p: Player = AgentProxyPlayer(
-                player_name,
-                player_color,
-                player_loc,
-                time_limit=options.time,
-                space_limit=options.space,
-                log=LogStream(f"player{p_num}", LogColor[str(player_color)])
-            )
+            player_log = LogStream(f"player{p_num}", LogColor[str(player_color)])
+            address = vars(options)[f"host{p_num}"]
+            p: Player
+            if options.inprocess and address is None:
+                p = InProcessPlayer(
+                    player_name,
+                    player_color,
+                    player_loc,
+                    time_limit=options.time,
+                    space_limit=options.space,
+                    log=player_log,
+                    board_mirror=mirror_name,
+                )
+            else:
+                proxy_kwargs = dict(
+                    time_limit=options.time,
+                    space_limit=options.space,
+                    log=player_log,
+                    pool=pool,
+                    ponder=options.ponder,
+                    ponder_cap=options.ponder_cap,
+                    board_mirror=mirror_name,
+                    time_accounting=options.time_accounting,
+                    space_accounting=options.space_accounting,
+                    space_rlimit=options.space_rlimit,
+                    gc_policy=options.gc_policy,
+                )
+                if address is not None:
+                    p = RemoteSocketPlayer(player_name, player_color,
+                        player_loc, address, **proxy_kwargs)
+                else:
+                    p = AgentProxyPlayer(player_name, player_color,
+                        player_loc, forkserver=options.forkserver,
+                        **proxy_kwargs)
             agents[p] = {
                 "name": player_name,
                 "loc": player_loc,
+                "params": {
+                    "time_limit": options.time,
+                    "space_limit": options.space,
+                    "inprocess": isinstance(p, InProcessPlayer),
+                    "host": "{}:{}".format(*address) if address else None,
+                    "time_accounting": options.time_accounting,
+                    "space_accounting": options.space_accounting,
+                    "gc_policy": options.gc_policy,
+                },
             }
 
-        # Play the game!
-        async def _run(options: Namespace) -> Player | None:
+        # Play the game(s)!
+        async def _run(options: Namespace):
+            try:
+                for _ in range(options.repeat):
+                    await _run_one(options)
+            finally:
+                if pool is not None:
+                    await pool.close()
+                if mirror is not None:
+                    mirror.close()
+                if store is not None:
+                    store.close()
+
+        async def _run_one(options: Namespace):
+            red, blue = agents.values()
+            record = GameRecord(
+                str(red["loc"]), str(blue["loc"]),
+                red["params"], blue["params"],
+            )
             event_handlers = [
+                game_recorder(record) if store is not None else None,
                 game_event_logger(gl) if gl is not None else None,
                 game_commentator(rl),
                 output_board_updates(rl, 
@@ -116,18 +188,26 @@ def main(options: Namespace|None=None):
                 game_user_wait(rl) if options.wait < 0 else None,
             ]
 
-            return await run_game(
+            start_time = perf_counter()
+            result = await run_game(
                 players=[p for p in agents.keys()],
                 event_handlers=event_handlers,
+                pipeline=options.pipeline,
+                mirror=mirror,
             )
-        
-        result = asyncio.get_event_loop().run_until_complete(_run(options))
 
-        # Print the final result under all circumstances
-        if result is None:
-            rl.critical("result: draw")
-        else:
-            rl.critical(f"result: {agents[result]['name']}")
+            if store is not None:
+                record.winner = result.color if result is not None else None
+                record.seconds = perf_counter() - start_time
+                store.add(record)
+
+            # Print the final result under all circumstances
+            if result is None:
+                rl.critical("result: draw")
+            else:
+                rl.critical(f"result: {agents[result]['name']}")
+        
+        asyncio.get_event_loop().run_until_complete(_run(options))
 
         exit(0)
 
@@ -136,7 +216,19 @@ def main(options: Namespace|None=None):
         rl.info("KeyboardInterrupt: bye!")
 
         rl.critical("result: <interrupt>")
-        os.kill(os.getpid(), 9)
+        # Don't wait for the game to wind down; agent processes exit when
+        # their input is closed with this process
+        if mirror is not None:
+            mirror.close()
+        if store is not None:
+            store.close()
+        exit(130)
+
+    except ConnectionError as e:
+        # e.g. an agent host (see --host1/--host2) could not be reached
+        rl.critical(f"connection error: {str(e)}")
+        rl.critical(f"result: <error>")
+        exit(1)
 
     except Exception as e:
         rl.critical(f"unhandled exception: {str(e)}")
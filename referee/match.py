@@ -0,0 +1,820 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Match runner: plays a series of games between two agents, in parallel over a
+# process pool, replacing shell loops like
+#
+#   repeat 50 python3 -m referee -v 0 A B >> results.txt
+#
+# Agents swap colours every game (A plays RED in even-numbered games). Each
+# game is run through `run_game` between `AgentProxyPlayer`s, exactly as
+# `python -m referee` would run it, so resource limits apply per agent per
+# game. Results are streamed as games finish, one line per game, followed by a
+# summary. Run `python -m referee.match --help` for usage, e.g.
+#
+#   python -m referee.match monte_carlo_strong_agent monte_carlo_agent \
+#       --games 50 --jobs 4 -t 180 -s 250
+#
+# Instead of a fixed number of games, a match can be run as a sequential
+# probability ratio test (SPRT) of H0: "A is elo0 stronger than B" against
+# H1: "A is elo1 stronger than B" (Elo differences, elo0 < elo1), with false
+# positive rate alpha and false negative rate beta. Games are played until the
+# log-likelihood ratio of the results leaves the bounds
+#
+#   [log(beta / (1 - alpha)), log((1 - beta) / alpha)]
+#
+# (or --games is reached, with no decision), e.g. to check that A is at least
+# 50 Elo stronger than B:
+#
+#   python -m referee.match monte_carlo_strong_agent monte_carlo_agent \
+#       --sprt 0 50 --games 1000 --jobs 4
+#
+# The log-likelihood ratio is the usual generalised SPRT approximation over
+# win/draw/loss results, which uses the observed variance of the game scores.
+#
+# With --event-loop, games are played at once in one event loop in the
+# runner's own process (see `GameLoopExecutor`) instead of in a worker process
+# each, sharing a budget of warm agent processes (--agent-processes).
+#
+# Agents that play to a wall-clock budget are weakened by sharing CPUs with
+# other games' agents. With --pin, each agent process is pinned to a physical
+# core of its own (see `referee.agent.affinity`), so at most half as many
+# games as there are cores are played at once. Whether pinned or not, the
+# contention each agent saw is recorded per game (its preemptions and CPU
+# share, see `play_game_async`) and summarised at the end.
+
+import argparse
+import asyncio
+import math
+import os
+import signal
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, \
+    ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, AsyncGenerator
+
+from .log import LogStream, LogColor, LogLevel
+from .game import GameEnd, GameUpdate, PlayerColor, PlayerError, TurnBegin, \
+    TurnEnd, UnhandledError
+from .run import run_game
+from .results import GameRecord, ResultsStore, game_recorder
+from .checkpoint import Checkpoint, CheckpointError, game_seed
+from .agent import AgentProcessPool, AgentProxyPlayer, enable_forkserver, \
+    physical_cores
+from .options import PackageSpecAction, PlayerLoc, parse_package_spec
+
+
+@dataclass
+class GameResult:
+    """
+    Outcome of one game of a match. `winner` is the colour of the winning
+    player, or None for a draw (or an unhandled error, see `error`).
+    `contention` holds the contention metrics of the game (see
+    `play_game_async`).
+    """
+    index: int
+    red: PlayerLoc
+    blue: PlayerLoc
+    winner: PlayerColor | None = None
+    turns: int = 0
+    seconds: float = 0.0
+    player_error: str | None = None
+    error: str | None = None
+    contention: dict[str, Any] = field(default_factory=dict)
+    record: GameRecord | None = None
+
+    @property
+    def winner_loc(self) -> PlayerLoc | None:
+        if self.winner is None:
+            return None
+        return self.red if self.winner == PlayerColor.RED else self.blue
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        The result as a JSON-compatible dict (without the game record).
+        """
+        return {
+            "index": self.index,
+            "red": str(self.red),
+            "blue": str(self.blue),
+            "winner": self.winner.name if self.winner is not None else None,
+            "turns": self.turns,
+            "seconds": self.seconds,
+            "player_error": self.player_error,
+            "error": self.error,
+            "contention": self.contention,
+        }
+
+    @staticmethod
+    def from_dict(state: dict[str, Any]) -> 'GameResult':
+        return GameResult(
+            state["index"],
+            parse_package_spec(state["red"]),
+            parse_package_spec(state["blue"]),
+            winner=PlayerColor[state["winner"]]
+                if state["winner"] is not None else None,
+            turns=state["turns"],
+            seconds=state["seconds"],
+            player_error=state["player_error"],
+            error=state["error"],
+            contention=state.get("contention", {}),
+        )
+
+    def __str__(self) -> str:
+        outcome = "<error>" if self.error is not None else \
+            "draw" if self.winner is None else \
+            f"{self.winner} [{self.winner_loc}]"
+        return f"game {self.index}: {self.red} (RED) vs {self.blue} (BLUE) "\
+               f"result: {outcome} after {self.turns} turns "\
+               f"({self.seconds:.1f}s)"
+
+
+@dataclass
+class MatchSummary:
+    """
+    Win/draw/loss record of agent A against agent B.
+    """
+    a: PlayerLoc
+    b: PlayerLoc
+    games: int = 0
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    errors: int = 0
+    wins_by_color: Counter[PlayerColor] = field(default_factory=Counter)
+    losses_by_color: Counter[PlayerColor] = field(default_factory=Counter)
+    llr: float | None = None
+    decision: str | None = None
+    cpu_shares: list[float] = field(default_factory=list)
+    preemptions: list[int] = field(default_factory=list)
+
+    def add(self, result: GameResult):
+        self.games += 1
+        for color in PlayerColor:
+            metrics = result.contention.get(color.name, {})
+            if "cpu_share" in metrics:
+                self.cpu_shares.append(metrics["cpu_share"])
+            if "preemptions" in metrics:
+                self.preemptions.append(metrics["preemptions"])
+        a_color = PlayerColor.RED if result.index % 2 == 0 \
+            else PlayerColor.BLUE
+        if result.error is not None:
+            self.errors += 1
+        elif result.winner is None:
+            self.draws += 1
+        elif result.winner == a_color:
+            self.wins += 1
+            self.wins_by_color[a_color] += 1
+        else:
+            self.losses += 1
+            self.losses_by_color[a_color] += 1
+
+    @property
+    def score(self) -> float:
+        """
+        Score of A (wins count 1, draws 1/2), as a fraction of decided games.
+        """
+        played = self.wins + self.draws + self.losses
+        return (self.wins + self.draws / 2) / played if played else 0.0
+
+    @property
+    def elo(self) -> float:
+        """
+        Elo difference of A over B implied by the score.
+        """
+        if self.score <= 0 or self.score >= 1:
+            return math.copysign(math.inf, self.score - 0.5)
+        return -400 * math.log10(1 / self.score - 1)
+
+
+def _expected_score(elo: float) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+@dataclass
+class Sprt:
+    """
+    Sequential probability ratio test of H0: "A is `elo0` Elo stronger than
+    B" against H1: "A is `elo1` Elo stronger than B" (see above).
+    """
+    elo0: float
+    elo1: float
+    alpha: float = 0.05
+    beta: float = 0.05
+
+    @property
+    def lower(self) -> float:
+        return math.log(self.beta / (1 - self.alpha))
+
+    @property
+    def upper(self) -> float:
+        return math.log((1 - self.beta) / self.alpha)
+
+    def llr(self, summary: MatchSummary) -> float:
+        """
+        Log-likelihood ratio of H1 to H0 given A's results so far.
+        """
+        results = [float(summary.wins), float(summary.draws),
+            float(summary.losses)]
+        if results.count(0) == 2:
+            # No variance yet (e.g. only draws so far): count an extra half
+            # win and half loss rather than decide on it
+            results[0] += 0.5
+            results[2] += 0.5
+        n = sum(results)
+        if n == 0:
+            return 0.0
+        mean = (results[0] + results[1] / 2) / n
+        variance = sum(count * (score - mean) ** 2
+            for count, score in zip(results, (1, 0.5, 0))) / n
+        if variance == 0:
+            return 0.0
+        s0 = _expected_score(self.elo0)
+        s1 = _expected_score(self.elo1)
+        return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+    def decision(self, summary: MatchSummary) -> str | None:
+        """
+        "H0" or "H1" if the test has accepted that hypothesis, else None.
+        """
+        llr = self.llr(summary)
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+
+async def _game_recorder(result: GameResult) -> AsyncGenerator:
+    # Event handler (see `run_game`) recording the course of a game
+    while True:
+        update: GameUpdate = yield
+        match update:
+            case TurnEnd(turn_id, _, _):
+                result.turns = turn_id
+            case PlayerError(message):
+                result.player_error = message
+            case UnhandledError(message):
+                result.error = message
+
+
+async def _contention_recorder(
+    result: GameResult,
+    players: list[AgentProxyPlayer],
+) -> AsyncGenerator:
+    # Event handler (see `run_game`) counting the preemptions of each agent
+    # process over the course of a game (from the first turn, once both
+    # processes have started). Each is sampled after its own turns too, as
+    # it may have exited by the end of the game.
+    start: dict[PlayerColor, int | None] = {}
+
+    def sample(p: AgentProxyPlayer):
+        before, after = start.get(p.color), p.preemptions
+        if before is not None and after is not None:
+            result.contention.setdefault(p.color.name, {})["preemptions"] = \
+                after - before
+
+    while True:
+        update: GameUpdate = yield
+        match update:
+            case TurnBegin(1, _):
+                start = {p.color: p.preemptions for p in players}
+            case TurnEnd(_, player, _):
+                sample(players[player.color.value])
+            case GameEnd(_):
+                for p in players:
+                    sample(p)
+
+
+async def play_game_async(
+    index: int,
+    red: PlayerLoc,
+    blue: PlayerLoc,
+    time_limit: float,
+    space_limit: float,
+    forkserver: bool = False,
+    seed: int | None = None,
+    key: str | None = None,
+    cpus: tuple[frozenset[int], frozenset[int]] | None = None,
+    pool: AgentProcessPool | None = None,
+) -> GameResult:
+    """
+    Play one game between two agents in the running event loop, taking agent
+    processes from `pool` if given (see `play_game` for the other arguments).
+
+    The contention each agent saw is recorded in the result: the CPUs it was
+    pinned to (if any), its preemptions (involuntary context switches) over
+    the game, and its CPU share (CPU time over wall-clock time spent in its
+    calls, which is 1 for an uncontended single-threaded agent), along with
+    the system load average at the end of the game.
+    """
+    result = GameResult(index, red, blue)
+    params = {"time_limit": time_limit, "space_limit": space_limit}
+    record = GameRecord(str(red), str(blue), params, params,
+        seed=seed, key=key)
+    players = [
+        AgentProxyPlayer(
+            f"player {num} [{loc}]", color, loc,
+            time_limit=time_limit,
+            space_limit=space_limit,
+            subproc_output=False,
+            pool=pool,
+            forkserver=forkserver,
+            seed=seed + num - 1 if seed is not None else None,
+            cpus=cpus[num - 1] if cpus is not None else None,
+        )
+        for num, (color, loc) in enumerate(zip(PlayerColor, (red, blue)), 1)
+    ]
+
+    start_time = perf_counter()
+    try:
+        winner = await run_game(players, [
+            _game_recorder(result),
+            game_recorder(record),
+            _contention_recorder(result, players),
+        ])
+        result.winner = winner.color if winner is not None else None
+    except Exception as e:
+        result.error = result.error or f"{e.__class__.__name__}: {e}"
+    result.seconds = perf_counter() - start_time
+
+    for color in PlayerColor:
+        metrics = result.contention.setdefault(color.name, {})
+        if cpus is not None:
+            metrics["cpus"] = sorted(cpus[color.value])
+        moves = [move for move in record.moves if move.color == color]
+        wall = sum(move.compute for move in moves)
+        if wall > 0:
+            metrics["cpu_share"] = \
+                sum(move.time_delta for move in moves) / wall
+    result.contention["load"] = os.getloadavg()[0]
+    record.contention = result.contention
+
+    if result.error is None:
+        record.winner = result.winner
+        record.seconds = result.seconds
+        result.record = record
+    return result
+
+
+def play_game(
+    index: int,
+    red: PlayerLoc,
+    blue: PlayerLoc,
+    time_limit: float,
+    space_limit: float,
+    forkserver: bool = False,
+    seed: int | None = None,
+    key: str | None = None,
+    cpus: tuple[frozenset[int], frozenset[int]] | None = None,
+) -> GameResult:
+    """
+    Play one game between two agents (run in a worker process). If `seed` is
+    given, the agents' random number generators are seeded with `seed` (RED)
+    and `seed + 1` (BLUE). `key` identifies the game in a results database.
+    If `cpus` is given, the agents' processes are pinned to the respective
+    sets of CPUs.
+    """
+    if forkserver:
+        enable_forkserver([red.pkg, blue.pkg])
+    return asyncio.run(play_game_async(index, red, blue,
+        time_limit, space_limit, forkserver, seed, key, cpus))
+
+
+class GameLoopExecutor(Executor):
+    """
+    Executor playing games (`play_game_async`) at once in one event loop, on
+    a background thread, rather than one per worker process as with a
+    `ProcessPoolExecutor`. Agent processes are shared by all games through an
+    `AgentProcessPool`, limited to `max_processes` at once, so the referee
+    side of a tournament costs a single process, and agent processes are
+    reused from game to game.
+    """
+
+    def __init__(self, max_processes: int):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="games", daemon=True)
+        self._thread.start()
+        self._pool = AgentProcessPool(max_processes=max_processes)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        """
+        Play a game: `fn` is `play_game` (or `play_game_async`), and the
+        arguments are as for `play_game`.
+        """
+        assert fn in (play_game, play_game_async)
+        return asyncio.run_coroutine_threadsafe(
+            play_game_async(*args, **kwargs, pool=self._pool), self._loop)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        async def _shutdown():
+            # Abandon any games still underway (e.g. on an interrupt)
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._pool.close()
+
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._loop.close()
+
+
+class GameProcessExecutor(ProcessPoolExecutor):
+    """
+    Process pool playing games (`play_game`), one per worker process. Workers
+    ignore interrupts, which are left to the runner (a worker interrupted
+    while the pool is talking to it can deadlock the pool), and shutting
+    down without waiting terminates any workers still playing.
+    """
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers=max_workers,
+            initializer=signal.signal,
+            initargs=(signal.SIGINT, signal.SIG_IGN))
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        workers = list((self._processes or {}).values())
+        super().shutdown(wait, cancel_futures=cancel_futures)
+        if not wait:
+            for worker in workers:
+                worker.terminate()
+
+
+class PinnedExecutor(Executor):
+    """
+    Executor wrapper passing each game a pair of dedicated sets of CPUs for
+    its agents (see `play_game`). No more games may be submitted at once than
+    there are pairs.
+    """
+
+    def __init__(self,
+        executor: Executor,
+        pairs: list[tuple[frozenset[int], frozenset[int]]],
+    ):
+        self._executor = executor
+        self._free = list(pairs)
+        self._held: dict[Future, tuple[frozenset[int], frozenset[int]]] = {}
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        # (Pairs are reclaimed here rather than in a done callback, which
+        # may run after the caller has seen the game finish.)
+        for future in [f for f in self._held if f.done()]:
+            self._free.append(self._held.pop(future))
+        cpus = self._free.pop(0)
+        future = self._executor.submit(fn, *args, cpus=cpus, **kwargs)
+        self._held[future] = cpus
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._executor.shutdown(wait, cancel_futures=cancel_futures)
+
+
+def agent_cores(log: LogStream | None = None) -> list[frozenset[int]] | None:
+    """
+    The physical cores available to pin agents to (see `game_executor`), or
+    None (with a warning) if there are too few to pin the agents of a game.
+    """
+    cores = physical_cores()
+    if len(cores) < 2:
+        if log is not None:
+            log.warning(f"not pinning agents: {len(cores)} physical core(s) "
+                        f"available, and each game needs 2")
+        return None
+    if log is not None:
+        log.info(f"pinning agents to {len(cores)} physical cores (at most "
+                 f"{len(cores) // 2} games at once)")
+    return cores
+
+
+def game_executor(
+    jobs: int | None,
+    event_loop: bool = False,
+    max_processes: int | None = None,
+    forkserver: bool = False,
+    packages: list[str] = [],
+    cores: list[frozenset[int]] | None = None,
+) -> tuple[Executor, int]:
+    """
+    Executor for playing up to `jobs` games at once (by default, one per
+    CPU), and the number of games to keep submitted to it. Games are played
+    in worker processes, or in one event loop if `event_loop` is set, with at
+    most `max_processes` agent processes at once (by default, two per game).
+
+    If `cores` (physical cores, see `agent_cores`) are given, each agent is
+    pinned to a core of its own while it plays, and at most half as many
+    games as cores are played at once. This process (and so its worker
+    processes) is moved to the cores left over, if there are any.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    pairs = []
+    if cores is not None:
+        assert len(cores) >= 2
+        jobs = min(jobs, len(cores) // 2)
+        pairs = [(cores[2 * i], cores[2 * i + 1]) for i in range(jobs)]
+        spare = frozenset().union(*cores[2 * jobs:])
+        if spare:
+            os.sched_setaffinity(0, spare)
+
+    executor: Executor
+    if not event_loop:
+        executor = GameProcessExecutor(jobs)
+        # One game queued ahead (unless pinning, as each game submitted
+        # holds its cores), so that workers don't wait for the next
+        in_flight = jobs + 1 if not pairs else jobs
+    else:
+        if max_processes is None:
+            max_processes = 2 * jobs
+        if forkserver:
+            enable_forkserver(packages)
+        executor = GameLoopExecutor(max_processes)
+        in_flight = min(jobs, max_processes // 2)
+    if pairs:
+        executor = PinnedExecutor(executor, pairs)
+    return executor, in_flight
+
+
+def run_match(
+    a: PlayerLoc,
+    b: PlayerLoc,
+    games: int,
+    jobs: int | None,
+    time_limit: float,
+    space_limit: float,
+    forkserver: bool = False,
+    log: LogStream | None = None,
+    store: ResultsStore | None = None,
+    sprt: Sprt | None = None,
+    seed: int | None = None,
+    checkpoint: Checkpoint | None = None,
+    event_loop: bool = False,
+    max_processes: int | None = None,
+    cores: list[frozenset[int]] | None = None,
+) -> MatchSummary:
+    """
+    Play `games` games between agents A and B, `jobs` at once (in worker
+    processes, or in one event loop, see `game_executor`), alternating
+    colours (A is RED in even-numbered games), and logging each result as it
+    comes in (and recording it in `store`, if given; games ending in an
+    unhandled error are not recorded).
+
+    If `sprt` is given, no more games are started once the test reaches a
+    decision (games already underway are played out and counted). The
+    decision is recorded in the summary.
+
+    If `seed` is given, each game is seeded with a seed derived from it (see
+    `play_game`). If a `checkpoint` is given, the match is resumed from it
+    (see `referee.checkpoint`), and it is updated as games start and finish.
+    """
+    summary = MatchSummary(a, b)
+
+    def _count(result: GameResult):
+        summary.add(result)
+        if sprt is not None and summary.decision is None:
+            summary.llr = sprt.llr(summary)
+            summary.decision = sprt.decision(summary)
+
+    # Games that were underway when the checkpoint was saved are played again
+    # before any new games (finished games are just counted)
+    replay: list[int] = []
+    next_index = 0
+    if checkpoint is not None:
+        for state in checkpoint.finished:
+            _count(GameResult.from_dict(state))
+        replay = sorted(checkpoint.underway)
+        next_index = checkpoint.next_index
+        if checkpoint.resumed and log is not None:
+            log.info(f"resuming from '{checkpoint.path}': "
+                     f"{len(checkpoint.finished)} games finished, "
+                     f"{len(replay)} to replay")
+
+    executor, in_flight = game_executor(jobs, event_loop, max_processes,
+        forkserver, [a.pkg, b.pkg], cores)
+    with executor:
+        try:
+            # Games are submitted as workers free up, so that a match can stop
+            # early without a backlog of queued games
+            pending: set[Future] = set()
+            while True:
+                while len(pending) < in_flight and summary.decision is None \
+                        and (replay or next_index < games):
+                    if replay:
+                        index = replay.pop(0)
+                    else:
+                        index, next_index = next_index, next_index + 1
+                    red, blue = (a, b) if index % 2 == 0 else (b, a)
+                    if checkpoint is not None:
+                        checkpoint.start(index, [str(red), str(blue)])
+                    pending.add(executor.submit(play_game, index, red, blue,
+                        time_limit, space_limit, forkserver,
+                        seed=game_seed(seed, index)
+                            if seed is not None else None,
+                        key=checkpoint.key(index) if checkpoint else None))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    # Record the game before checkpointing it, so that a game
+                    # is never counted without being recorded
+                    if store is not None and result.record is not None:
+                        store.add(result.record)
+                    if checkpoint is not None:
+                        checkpoint.finish(result.to_dict())
+                    _count(result)
+                    if log is not None:
+                        log.info(str(result))
+                        if result.player_error is not None:
+                            log.info(f"  {result.player_error}")
+                        if result.error is not None:
+                            log.error(f"  {result.error}")
+                        if summary.llr is not None and sprt is not None:
+                            log.info(f"  LLR {summary.llr:.3f} "
+                                     f"[{sprt.lower:.3f}, {sprt.upper:.3f}]"
+                                     + (f" -> accept {summary.decision}"
+                                        if summary.decision else ""))
+        except KeyboardInterrupt:
+            # Abandon the games underway rather than waiting for them
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m referee.match",
+        description="Play a series of games between two agents, in "
+                    "parallel, alternating colours.",
+    )
+    parser.add_argument(
+        "a", metavar="A", action=PackageSpecAction,
+        help="package specification of agent A (see python -m referee -h).")
+    parser.add_argument(
+        "b", metavar="B", action=PackageSpecAction,
+        help="package specification of agent B.")
+    parser.add_argument(
+        "-g", "--games", type=int, default=None,
+        help="number of games to play, or the most to play with --sprt "
+             "(default: 10, or 1000 with --sprt).")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="number of games to play at once (default: number of CPUs). "
+             "Each game runs two agent processes.")
+    parser.add_argument(
+        "-L", "--event-loop", action="store_true",
+        help="play games at once in one event loop in this process, rather "
+             "than in a worker process each, sharing warm agent processes "
+             "between games.")
+    parser.add_argument(
+        "--agent-processes", type=int, default=None, metavar="N",
+        help="with --event-loop, the most agent processes alive at once "
+             "(at least 2, default: two per game). Fewer games are played "
+             "at once if need be.")
+    parser.add_argument(
+        "--pin", action="store_true",
+        help="pin each agent process to a physical core of its own, playing "
+             "at most half as many games at once as there are cores, so "
+             "that agents don't compete for CPUs.")
+    parser.add_argument(
+        "-t", "--time", type=float, default=0,
+        help="limit on CPU time (float, seconds) for each agent per game "
+             "(default: no limit).")
+    parser.add_argument(
+        "-s", "--space", type=float, default=0,
+        help="limit on memory space (float, MB) for each agent (default: "
+             "no limit).")
+    parser.add_argument(
+        "-F", "--forkserver", action="store_true",
+        help="fork agent processes from a template process with the agent "
+             "packages preloaded (one per worker).")
+    parser.add_argument(
+        "--db", metavar="FILE", default=None,
+        help="record each game in this results database (see "
+             "python -m referee.results).")
+    parser.add_argument(
+        "--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"),
+        default=None,
+        help="play until a sequential probability ratio test decides "
+             "between H0: A is ELO0 stronger than B, and H1: A is ELO1 "
+             "stronger than B (Elo, ELO0 < ELO1).")
+    parser.add_argument(
+        "--alpha", type=float, default=0.05,
+        help="SPRT false positive rate (accepting H1 when H0 holds, "
+             "default: %(default)s).")
+    parser.add_argument(
+        "--beta", type=float, default=0.05,
+        help="SPRT false negative rate (accepting H0 when H1 holds, "
+             "default: %(default)s).")
+    parser.add_argument(
+        "--seed", type=int, default=None,
+        help="seed the agents in each game with a seed derived from this "
+             "(default: a random seed with --checkpoint, otherwise agents "
+             "are not seeded).")
+    parser.add_argument(
+        "--checkpoint", metavar="FILE", default=None,
+        help="save the state of the match to this file as games start and "
+             "finish, and resume from it if it exists (the other arguments "
+             "must be the same, except --games, --jobs and --forkserver).")
+    args = parser.parse_args()
+
+    sprt: Sprt | None = None
+    if args.sprt is not None:
+        if args.sprt[0] >= args.sprt[1]:
+            parser.error("--sprt: ELO0 must be less than ELO1")
+        if not (0 < args.alpha < 1 and 0 < args.beta < 1):
+            parser.error("--alpha and --beta must be between 0 and 1")
+        sprt = Sprt(*args.sprt, alpha=args.alpha, beta=args.beta)
+    if args.agent_processes is not None and args.agent_processes < 2:
+        parser.error("--agent-processes must be at least 2")
+    if args.games is None:
+        args.games = 10 if sprt is None else 1000
+
+    LogStream.set_global_setting("level", LogLevel.INFO)
+    log = LogStream("match", LogColor.CYAN)
+
+    checkpoint: Checkpoint | None = None
+    seed = args.seed
+    if args.checkpoint is not None:
+        config = {
+            "kind": "match",
+            "a": str(args.a),
+            "b": str(args.b),
+            "time": args.time,
+            "space": args.space,
+            "sprt": [sprt.elo0, sprt.elo1, sprt.alpha, sprt.beta]
+                if sprt is not None else None,
+        }
+        try:
+            checkpoint = Checkpoint(args.checkpoint, config, seed)
+        except CheckpointError as e:
+            parser.error(str(e))
+        seed = checkpoint.seed
+
+    start_time = perf_counter()
+    store = ResultsStore(args.db) if args.db is not None else None
+    try:
+        summary = run_match(
+            args.a, args.b,
+            games=args.games,
+            jobs=args.jobs,
+            time_limit=args.time,
+            space_limit=args.space,
+            forkserver=args.forkserver,
+            log=log,
+            store=store,
+            sprt=sprt,
+            seed=seed,
+            checkpoint=checkpoint,
+            event_loop=args.event_loop,
+            max_processes=args.agent_processes,
+            cores=agent_cores(log) if args.pin else None,
+        )
+    except KeyboardInterrupt:
+        log.info("KeyboardInterrupt: bye!")
+        if checkpoint is not None:
+            log.info(f"(run the same command again to resume from "
+                     f"'{checkpoint.path}')")
+        exit(130)
+    finally:
+        if store is not None:
+            store.close()
+    elapsed = perf_counter() - start_time
+
+    log.info(f"{summary.games} games in {elapsed:.1f}s")
+    log.info(f"A = {summary.a}, B = {summary.b}")
+    log.info(f"A wins {summary.wins}, draws {summary.draws}, "
+             f"losses {summary.losses}"
+             + (f", errors {summary.errors}" if summary.errors else "")
+             + f" (score {summary.score:.3f})")
+    for color in PlayerColor:
+        log.info(f"  as {color}: {summary.wins_by_color[color]} wins, "
+                 f"{summary.losses_by_color[color]} losses")
+    if summary.cpu_shares:
+        shares, preemptions = summary.cpu_shares, summary.preemptions
+        log.info(f"contention: agent CPU share mean "
+                 f"{sum(shares) / len(shares):.3f} (min {min(shares):.3f})"
+                 + (f", preemptions per agent per game mean "
+                    f"{sum(preemptions) / len(preemptions):.1f} "
+                    f"(max {max(preemptions)})" if preemptions else ""))
+    if sprt is not None:
+        log.info(f"SPRT elo0 {sprt.elo0:g}, elo1 {sprt.elo1:g}, "
+                 f"alpha {sprt.alpha:g}, beta {sprt.beta:g}: "
+                 f"LLR {summary.llr or 0:.3f} "
+                 f"[{sprt.lower:.3f}, {sprt.upper:.3f}]")
+        if summary.decision is None:
+            log.info("  no decision (game limit reached)")
+        else:
+            elo = sprt.elo0 if summary.decision == "H0" else sprt.elo1
+            log.info(f"  accepted {summary.decision}: A is {elo:g} Elo "
+                     f"stronger than B")
+        log.info(f"  Elo difference (A - B): {summary.elo:+.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -133,6 +133,132 @@ def get_options():
         help="limit on CPU time (float, seconds) for each agent.",
     )
 
+    optionals.add_argument(
+        "--time-accounting",
+        choices=["process", "tree", "wall-cores"],
+        default="tree",
+        help="how agents are charged for time (default: tree). 'process' is "
+        "the CPU time of the agent process, 'tree' also includes the CPU time "
+        "of any child processes it starts (the agent is cut off as soon as "
+        "that runs out, even while it waits on its children), and "
+        "'wall-cores' is wall-clock time multiplied by the number of cores "
+        "available to the agent.",
+    )
+
+    optionals.add_argument(
+        "--space-accounting",
+        choices=["vm", "rss", "uss"],
+        default="rss",
+        help="how agents are charged for space (default: rss). 'vm' is the "
+        "virtual memory size of the agent process, 'rss' its resident set "
+        "size, and 'uss' the resident memory not shared with other "
+        "processes. Usage is sampled throughout each call.",
+    )
+
+    optionals.add_argument(
+        "--space-rlimit",
+        action="store_true",
+        help="also limit the address space of agent processes (RLIMIT_AS), "
+        "so that allocations beyond the space limit fail immediately.",
+    )
+
+    optionals.add_argument(
+        "--gc-policy",
+        choices=["full", "generational", "freeze", "deferred"],
+        default="full",
+        help="how garbage is collected in agent processes (default: full). "
+        "'full' collects everything before each call, 'generational' only "
+        "the young generations, 'freeze' is as for 'full' but excludes "
+        "objects created by the agent's constructor from collection, and "
+        "'deferred' disables collection until the end of the game. "
+        "Collections before calls are never counted against agents.",
+    )
+
+    for num in range(1, NUM_PLAYERS + 1):
+        optionals.add_argument(
+            f"--host{num}",
+            metavar="host:port",
+            type=_address,
+            default=None,
+            help=f"run player {num}'s agent on the agent host at this address "
+            "(see `python -m referee.agent.host`) rather than locally.",
+        )
+
+    optionals.add_argument(
+        "-r",
+        "--repeat",
+        metavar="games",
+        type=int,
+        default=1,
+        help="number of games to play in a row (default: 1). Agent processes "
+        "are kept warm and reset between games, so startup costs are only "
+        "paid once; one result line is printed per game.",
+    )
+
+    optionals.add_argument(
+        "-M",
+        "--mirror",
+        action="store_true",
+        help="publish the board state to a shared memory block after every "
+        "action, which agents can map read-only (the block name is passed to "
+        "agents' constructors as referee['board_mirror']).",
+    )
+
+    optionals.add_argument(
+        "--ponder",
+        action="store_true",
+        help="let agents with a ponder() method think during their "
+        "opponent's turn. Pondering CPU time counts towards the agent's time "
+        "limit, unless --ponder-cap is given.",
+    )
+
+    optionals.add_argument(
+        "--ponder-cap",
+        metavar="seconds",
+        type=float,
+        default=None,
+        help="stop pondering after this much CPU time per opponent turn, "
+        "and don't count pondering time towards the agent's time limit.",
+    )
+
+    optionals.add_argument(
+        "-i",
+        "--inprocess",
+        action="store_true",
+        help="run agents directly in the referee process (on worker threads) "
+        "rather than in sandboxed subprocesses. Time limits still apply to "
+        "each agent's thread CPU time, but space limits are not enforced. "
+        "Only use this for trusted agents.",
+    )
+
+    optionals.add_argument(
+        "-F",
+        "--forkserver",
+        action="store_true",
+        help="start agents by forking a template process which has the "
+        "referee, numpy and the agent packages preloaded, rather than "
+        "starting a new interpreter for each agent.",
+    )
+
+    optionals.add_argument(
+        "-P",
+        "--pipeline",
+        action="store_true",
+        help="send each update to the next player together with its next "
+        "action request (one round trip per turn instead of two). Each turn "
+        "then begins before the previous turn's updates have completed.",
+    )
+
+    optionals.add_argument(
+        "--db",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="record each game (agents, limits, winner, and per-move time "
+        "and memory) in the SQLite results database %(metavar)s; summarise "
+        "it with python -m referee.results %(metavar)s.",
+    )
+
     verbosity_group = optionals.add_mutually_exclusive_group()
     verbosity_group.add_argument(
         "-d",
@@ -245,6 +371,34 @@ class PlayerLoc:
         yield self.cls
         
 
+def _address(value: str) -> tuple[str, int]:
+    host, sep, port = value.rpartition(":")
+    if not sep or not port.isdigit():
+        raise argparse.ArgumentTypeError(
+            f"expected an address 'host:port', got '{value}'")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+def parse_package_spec(pkg_spec: str) -> PlayerLoc:
+    """
+    Parse an agent package specification 'pkg[:cls]' (or a path to the
+    package) into a PlayerLoc (see the positional arguments of the referee).
+    """
+    # detect alternative class:
+    if ":" in pkg_spec:
+        pkg, cls = pkg_spec.split(":", maxsplit=1)
+    else:
+        pkg = pkg_spec
+        cls = "Agent"
+
+    # try to convert path to module name
+    mod = pkg.strip("/\\").replace("/", ".").replace("\\", ".")
+    if mod.endswith(".py"):  # NOTE: Assumes submodule is not named `py`.
+        mod = mod[:-3]
+
+    return PlayerLoc(mod, cls)
+
+
 class PackageSpecAction(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         if not isinstance(values, str):
@@ -252,19 +406,5 @@ class PackageSpecAction(argparse.Action):
                 self, "expected a string, got %r" % (values,)
             )
 
-        pkg_spec = values
-
-        # detect alternative class:
-        if ":" in pkg_spec:
-            pkg, cls = pkg_spec.split(":", maxsplit=1)
-        else:
-            pkg = pkg_spec
-            cls = "Agent"
-
-        # try to convert path to module name
-        mod = pkg.strip("/\\").replace("/", ".").replace("\\", ".")
-        if mod.endswith(".py"):  # NOTE: Assumes submodule is not named `py`.
-            mod = mod[:-3]
-
         # save the result in the arguments namespace as a PlayerLoc
-        setattr(namespace, self.dest, PlayerLoc(mod, cls))
+        setattr(namespace, self.dest, parse_package_spec(values))
@@ -0,0 +1,172 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Perft ("performance test") for Tetress move generators. From a starting
+# position (given as a list of moves from the empty board), count the number
+# of leaf nodes of the game tree at depth d using any engine (see
+# `referee.engines`). Leaf counts are a reproducible correctness number for an
+# engine (two correct engines must report identical counts), and the time
+# taken gives a throughput number. Run `python -m referee.perft --help` for
+# usage, e.g.
+#
+#   python -m referee.perft -e board -d 2 -m "3-3 3-4 4-3 4-4; 2-3 2-4 2-5 2-6"
+
+import argparse
+from collections import Counter
+from dataclasses import dataclass, field
+from time import perf_counter
+
+from .log import LogStream, LogColor, LogLevel
+from .game import MAX_TURNS
+from .game.pieces import Piece, PieceType
+from .engines import Engine, Move, load_engine, move_str, parse_move, \
+    DEFAULT_HELPERS_MODULE
+
+
+@dataclass
+class PerftResult:
+    """
+    Result of a perft run to a fixed depth.
+    """
+    depth: int
+    leaves: int = 0
+    nodes: int = 0
+    seconds: float = 0.0
+    by_piece_type: Counter[PieceType] = field(default_factory=Counter)
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+
+_piece_types: dict[Move, PieceType] = {}
+
+
+def piece_type(move: Move) -> PieceType:
+    """
+    Return the piece type of a move (memoised; there are only a few thousand
+    distinct placements on the board).
+    """
+    if move not in _piece_types:
+        _piece_types[move] = Piece(list(move)).type
+    return _piece_types[move]
+
+
+def _legal_moves(engine: Engine) -> set[Move]:
+    # The turn limit is the one terminal condition not reflected in the move
+    # generators themselves.
+    if engine.turn_count >= MAX_TURNS:
+        return set()
+    return engine.legal_moves()
+
+
+def perft(engine: Engine, depth: int, result: PerftResult):
+    """
+    Accumulate leaf/node counts for the subtree of the engine's current
+    position into `result`. Moves at the last ply are counted without being
+    played ("bulk counting"); interior nodes are visited with push/pop.
+    """
+    if depth == 0:
+        result.leaves += 1
+        return
+
+    moves = _legal_moves(engine)
+    result.nodes += 1
+    if depth == 1:
+        result.leaves += len(moves)
+        result.nodes += len(moves)
+        result.by_piece_type.update(map(piece_type, moves))
+        return
+
+    for move in moves:
+        engine.push(move)
+        perft(engine, depth - 1, result)
+        engine.pop()
+
+
+def run_perft(engine: Engine, depth: int) -> PerftResult:
+    """
+    Run perft to the given depth from the engine's current position.
+    """
+    result = PerftResult(depth)
+    start_time = perf_counter()
+    perft(engine, depth, result)
+    result.seconds = perf_counter() - start_time
+    return result
+
+
+def divide(engine: Engine, depth: int) -> dict[Move, int]:
+    """
+    Return the leaf count at `depth` under each root move (depth >= 1). This
+    is the usual way to pinpoint where two engines' counts diverge.
+    """
+    counts = {}
+    for move in sorted(_legal_moves(engine), key=sorted):
+        engine.push(move)
+        result = PerftResult(depth - 1)
+        perft(engine, depth - 1, result)
+        engine.pop()
+        counts[move] = result.leaves
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m referee.perft",
+        description="Count game tree leaf nodes to a fixed depth using a "
+                    "chosen Tetress engine.",
+    )
+    parser.add_argument(
+        "-e", "--engine", default=f"helpers:{DEFAULT_HELPERS_MODULE}",
+        help="engine spec to use (default: %(default)s).")
+    parser.add_argument(
+        "-d", "--depth", type=int, default=1,
+        help="search depth in plies (default: %(default)s).")
+    position = parser.add_mutually_exclusive_group()
+    position.add_argument(
+        "-m", "--moves", default="",
+        help="starting position as a list of moves separated by ';', each "
+             "move a list of 'r-c' coordinates (e.g. '3-3 3-4 4-3 4-4').")
+    position.add_argument(
+        "-f", "--moves-file", default=None,
+        help="read the starting position from a file, one move per line.")
+    parser.add_argument(
+        "--divide", action="store_true",
+        help="also print the leaf count under each root move.")
+    args = parser.parse_args()
+    if args.depth < 1:
+        parser.error(f"depth must be at least 1, got {args.depth}")
+
+    LogStream.set_global_setting("level", LogLevel.INFO)
+    log = LogStream("perft", LogColor.CYAN)
+
+    if args.moves_file is not None:
+        with open(args.moves_file) as f:
+            lines = [line.strip() for line in f]
+    else:
+        lines = args.moves.split(";")
+    moves = [parse_move(line) for line in lines if line.strip()]
+
+    engine = load_engine(args.engine).replay(moves)
+    log.info(f"engine '{args.engine}', {len(moves)} moves played, "
+             f"{engine.turn_color} to move")
+
+    for depth in range(1, args.depth + 1):
+        result = run_perft(engine, depth)
+        log.info(
+            f"depth {depth}: {result.leaves:>12} leaves  "
+            f"{result.nodes:>12} nodes  {result.seconds:8.3f}s  "
+            f"{result.nodes_per_second:>12.0f} nodes/s")
+
+    log.info("leaves by piece type (last ply):")
+    for piece in PieceType:
+        log.info(f"  {piece.value:<4} {result.by_piece_type[piece]:>12}")
+
+    if args.divide:
+        log.info(f"divide (depth {args.depth}):")
+        for move, count in divide(engine, args.depth).items():
+            log.info(f"  {move_str(move)}: {count}")
+
+
+if __name__ == "__main__":
+    main()
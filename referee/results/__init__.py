@@ -0,0 +1,290 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Results store: records games (the agents and their parameters, colours,
+# winner, turn count, and the time and memory reported by the agent process
+# for every move) in an SQLite database, and aggregates them into win rates
+# with confidence intervals and move latency percentiles per agent. Games are
+# recorded by `python -m referee --db FILE` and `python -m referee.match
+# --db FILE`, and summarised with `python -m referee.results FILE`.
+#
+# Tables:
+#
+#   games  one row per game: red, blue (agent specs), red_params, blue_params
+#          (JSON), seed, winner ('RED', 'BLUE' or NULL for a draw), turns,
+#          seconds (wall clock), error (player error message, if any),
+#          started (unix time), key (unique key of a game within a
+#          tournament, if any; see `referee.checkpoint`), contention (JSON,
+#          contention metrics of the game, if measured; see
+#          `referee.match.play_game_async`)
+#   moves  one row per action: game_id, turn, color, agent, time_delta (CPU
+#          seconds charged for the move), time_used (CPU seconds so far),
+#          compute (wall-clock seconds in the agent), space_curr, space_peak
+#          (MB, -1 if unknown)
+
+import json
+import math
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import time
+from typing import Any, AsyncGenerator
+
+from ..game import GameUpdate, PlayerColor, PlayerError, TurnEnd
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    red TEXT NOT NULL,
+    blue TEXT NOT NULL,
+    red_params TEXT NOT NULL,
+    blue_params TEXT NOT NULL,
+    seed INTEGER,
+    winner TEXT,
+    turns INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    error TEXT,
+    key TEXT UNIQUE,
+    contention TEXT
+);
+CREATE TABLE IF NOT EXISTS moves (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    turn INTEGER NOT NULL,
+    color TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    time_delta REAL NOT NULL,
+    time_used REAL NOT NULL,
+    compute REAL NOT NULL,
+    space_curr REAL NOT NULL,
+    space_peak REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS moves_agent ON moves (agent);
+CREATE INDEX IF NOT EXISTS games_red ON games (red);
+CREATE INDEX IF NOT EXISTS games_blue ON games (blue);
+"""
+
+
+@dataclass
+class MoveRecord:
+    """
+    Resources used by an agent for one move (see `AsyncProcessStatus`).
+    """
+    turn: int
+    color: PlayerColor
+    time_delta: float
+    time_used: float
+    compute: float
+    space_curr: float
+    space_peak: float
+
+
+@dataclass
+class GameRecord:
+    """
+    Record of one game, as stored in the `games` and `moves` tables.
+    """
+    red: str
+    blue: str
+    red_params: dict[str, Any] = field(default_factory=dict)
+    blue_params: dict[str, Any] = field(default_factory=dict)
+    seed: int | None = None
+    winner: PlayerColor | None = None
+    turns: int = 0
+    seconds: float = 0.0
+    error: str | None = None
+    started: float = field(default_factory=time)
+    key: str | None = None
+    contention: dict[str, Any] | None = None
+    moves: list[MoveRecord] = field(default_factory=list)
+
+
+async def game_recorder(record: GameRecord) -> AsyncGenerator:
+    """
+    Event handler (see `run_game`) filling in a game record as the game
+    progresses. Per-move resources are taken from the status of players that
+    report one (i.e. `AgentProxyPlayer`s). The winner and duration are up to
+    the caller.
+    """
+    while True:
+        update: GameUpdate = yield
+        match update:
+            case TurnEnd(turn_id, player, _):
+                record.turns = turn_id
+                status = getattr(player, "status", None)
+                if status is not None:
+                    record.moves.append(MoveRecord(
+                        turn=turn_id,
+                        color=player.color,
+                        time_delta=status.time_delta,
+                        time_used=status.time_used,
+                        compute=status.time_compute,
+                        space_curr=status.space_curr
+                            if status.space_known else -1,
+                        space_peak=status.space_peak
+                            if status.space_known else -1,
+                    ))
+            case PlayerError(message):
+                record.error = message
+
+
+@dataclass
+class WinRate:
+    """
+    An agent's record over all its recorded games, with a Wilson score
+    interval on its score (wins count 1, draws 1/2).
+    """
+    agent: str
+    games: int
+    wins: int
+    draws: int
+    losses: int
+    low: float
+    high: float
+
+    @property
+    def score(self) -> float:
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.0
+
+
+@dataclass
+class MoveLatency:
+    """
+    Percentiles (see `LATENCY_PERCENTILES`) of an agent's per-move CPU time
+    and wall-clock time, in seconds, and its peak memory use.
+    """
+    agent: str
+    moves: int
+    cpu: dict[int, float]
+    wall: dict[int, float]
+    space_peak: float
+
+
+def wilson_interval(
+    score: float,
+    n: int,
+    z: float = 1.96
+) -> tuple[float, float]:
+    """
+    Wilson score interval for a binomial proportion (95% by default).
+    """
+    if n == 0:
+        return 0.0, 1.0
+    denominator = 1 + z * z / n
+    centre = (score + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(
+        score * (1 - score) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """
+    The p'th percentile of `values` (nearest rank).
+    """
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class ResultsStore:
+    """
+    SQLite store of game records. Note that this class is implemented as a
+    context manager which closes the database on exit.
+    """
+
+    def __init__(self, path: str | Path):
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def add(self, record: GameRecord) -> int:
+        """
+        Store a game record, returning its game id. A record with the same
+        key as a stored game (e.g. a replayed game) replaces it.
+        """
+        with self._db:
+            if record.key is not None:
+                self._db.execute(
+                    "DELETE FROM moves WHERE game_id IN "
+                    "(SELECT id FROM games WHERE key = ?)", (record.key,))
+                self._db.execute(
+                    "DELETE FROM games WHERE key = ?", (record.key,))
+            cursor = self._db.execute(
+                "INSERT INTO games (started, red, blue, red_params, "
+                "blue_params, seed, winner, turns, seconds, error, key, "
+                "contention) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                    record.started, record.red, record.blue,
+                    json.dumps(record.red_params),
+                    json.dumps(record.blue_params),
+                    record.seed,
+                    record.winner.name if record.winner is not None else None,
+                    record.turns, record.seconds, record.error, record.key,
+                    json.dumps(record.contention)
+                        if record.contention is not None else None,
+                ))
+            game_id = cursor.lastrowid
+            assert game_id is not None
+            self._db.executemany(
+                "INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [(
+                    game_id, move.turn, move.color.name,
+                    record.red if move.color == PlayerColor.RED
+                        else record.blue,
+                    move.time_delta, move.time_used, move.compute,
+                    move.space_curr, move.space_peak,
+                ) for move in record.moves])
+        return game_id
+
+    def win_rates(self) -> list[WinRate]:
+        """
+        Win rate of each agent over all its games (against any opponent).
+        """
+        rows = self._db.execute("""
+            SELECT agent,
+                COUNT(*),
+                COALESCE(SUM(winner = color), 0),
+                COALESCE(SUM(winner IS NULL), 0),
+                COALESCE(SUM(winner != color), 0)
+            FROM (
+                SELECT red AS agent, 'RED' AS color, winner FROM games
+                UNION ALL
+                SELECT blue AS agent, 'BLUE' AS color, winner FROM games
+            )
+            GROUP BY agent ORDER BY agent
+        """).fetchall()
+        rates = []
+        for agent, games, wins, draws, losses in rows:
+            low, high = wilson_interval((wins + draws / 2) / games, games)
+            rates.append(WinRate(agent, games, wins, draws, losses, low, high))
+        return rates
+
+    def move_latencies(self) -> list[MoveLatency]:
+        """
+        Move latency percentiles of each agent over all its recorded moves.
+        """
+        moves: dict[str, list[tuple[float, float, float]]] = {}
+        for agent, cpu, wall, space in self._db.execute(
+                "SELECT agent, time_delta, compute, space_peak FROM moves"):
+            moves.setdefault(agent, []).append((cpu, wall, space))
+        return [
+            MoveLatency(
+                agent, len(samples),
+                cpu={p: percentile([s[0] for s in samples], p)
+                    for p in LATENCY_PERCENTILES},
+                wall={p: percentile([s[1] for s in samples], p)
+                    for p in LATENCY_PERCENTILES},
+                space_peak=max(s[2] for s in samples),
+            )
+            for agent, samples in sorted(moves.items())
+        ]
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
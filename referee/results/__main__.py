@@ -0,0 +1,44 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Summarise the games recorded in a results database (see `__init__.py`):
+#
+#   python -m referee.results results.db
+
+import argparse
+
+from ..log import LogStream, LogColor, LogLevel
+from . import LATENCY_PERCENTILES, ResultsStore
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m referee.results",
+        description="Summarise the games recorded in a results database.",
+    )
+    parser.add_argument(
+        "db", help="results database (see --db in python -m referee).")
+    args = parser.parse_args()
+
+    LogStream.set_global_setting("level", LogLevel.INFO)
+    log = LogStream("results", LogColor.CYAN)
+
+    with ResultsStore(args.db) as store:
+        log.info("win rates (score with 95% Wilson interval):")
+        for rate in store.win_rates():
+            log.info(
+                f"  {rate.agent:<32} {rate.games:>5} games  "
+                f"{rate.wins:>4}W {rate.draws:>4}D {rate.losses:>4}L  "
+                f"score {rate.score:.3f} [{rate.low:.3f}, {rate.high:.3f}]")
+
+        log.info("move latency (CPU / wall clock, seconds):")
+        for latency in store.move_latencies():
+            log.info(
+                f"  {latency.agent:<32} {latency.moves:>6} moves  " +
+                "  ".join(f"p{p} {latency.cpu[p]:.3f}/{latency.wall[p]:.3f}"
+                    for p in LATENCY_PERCENTILES) +
+                f"  peak space {latency.space_peak:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
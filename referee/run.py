@@ -13,18 +13,22 @@ from time import time
 from typing import AsyncGenerator
 
 from .log import LogStream
-from .game import Player, game, \
+from .agent.io import LATENCY_STAGES, latency_histogram
+from .game import Player, BoardMirror, game, \
     GameUpdate, PlayerInitialising, GameBegin, TurnBegin, TurnEnd, \
     BoardUpdate, PlayerError, GameEnd, UnhandledError
 
 
 async def run_game(
     players: list[Player], 
-    event_handlers: list[AsyncGenerator|None]=[]
+    event_handlers: list[AsyncGenerator|None]=[],
+    pipeline: bool=False,
+    mirror: BoardMirror|None=None,
 ) -> Player|None:
     """
     Run a game, yielding event handler generators over the game updates.
-    Return the winning player (interface) or 'None' if draw.
+    Return the winning player (interface) or 'None' if draw. See `game` for
+    the `pipeline` and `mirror` options.
     """
     async def _update_handlers(
         handlers: list[AsyncGenerator|None], 
@@ -38,7 +42,7 @@ async def run_game(
                 handlers.remove(handler)
 
     await _update_handlers(event_handlers, None)
-    async for update in game(*players):
+    async for update in game(*players, pipeline=pipeline, mirror=mirror):
         await _update_handlers(event_handlers, update)
         match update:
             case GameEnd(winner):
@@ -88,6 +92,11 @@ async def game_event_logger(
       <actor>    is either "referee" or the player colour.
       <event>    is the event name.
       <param_k>  k'th event argument (if applicable).
+
+    At the end of the game, the latency breakdown of calls to each agent
+    process (see `CallLatency`) is logged as one "call_latency" event per
+    stage, with the call count, mean and max (ms), and a histogram of call
+    counts over `LATENCY_BUCKETS`.
     """
     start_time = time()
     def _log(*params: str):
@@ -100,10 +109,26 @@ async def game_event_logger(
     def log_player(player: Player, *params: str):
         _log(str(player), *params)
 
+    def log_latencies(player: Player):
+        latencies = getattr(player, "call_latencies", None)
+        if not latencies:
+            return
+        for stage in LATENCY_STAGES:
+            values = [getattr(latency, stage) for latency in latencies]
+            log_player(player, "call_latency", stage,
+                f"n:{len(values)}",
+                f"mean:{1000 * sum(values) / len(values):.3f}",
+                f"max:{1000 * max(values):.3f}",
+                "hist:" + ",".join(
+                    map(str, latency_histogram(latencies, stage))))
+
+    players: list[Player] = []
+
     while True:
         update: GameUpdate = yield
         match update:
             case PlayerInitialising(player):
+                players.append(player)
                 log_player(player, "initialising")
             case GameBegin(_):
                 log_referee("game_begin")
@@ -114,6 +139,8 @@ async def game_event_logger(
             case BoardUpdate(_):
                 log_referee("board_update")
             case GameEnd(win_player_id):
+                for player in players:
+                    log_latencies(player)
                 log_referee("game_end", f"winner:{win_player_id}")
             case PlayerError(message):
                 log_referee("player_error", message)
@@ -0,0 +1,100 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tests of tournament checkpoints (`referee.checkpoint`), and of resuming an
+# interrupted match from one.
+
+import json
+
+import pytest
+
+from referee.checkpoint import Checkpoint, CheckpointError, game_seed
+from referee.match import run_match
+from referee.options import parse_package_spec
+from referee.results import ResultsStore
+
+_CONFIG = {"kind": "match", "a": "random_agent", "b": "random_agent"}
+_AGENT = parse_package_spec("random_agent")
+
+
+def test_new_and_resumed(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    checkpoint = Checkpoint(path, _CONFIG, seed=42)
+    assert not checkpoint.resumed and checkpoint.next_index == 0
+    checkpoint.start(0, ["a", "b"])
+    checkpoint.start(1, ["b", "a"])
+    checkpoint.finish({"index": 1})
+
+    resumed = Checkpoint(path, _CONFIG)
+    assert resumed.resumed
+    assert (resumed.id, resumed.seed) == (checkpoint.id, 42)
+    assert resumed.finished == [{"index": 1}]
+    assert resumed.underway == {0: ["a", "b"]}
+    assert resumed.next_index == 2
+    assert resumed.key(0) == checkpoint.key(0) != resumed.key(1)
+
+
+def test_mismatch(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    Checkpoint(path, _CONFIG, seed=42)
+    with pytest.raises(CheckpointError):
+        Checkpoint(path, {**_CONFIG, "b": "other_agent"})
+    with pytest.raises(CheckpointError):
+        Checkpoint(path, _CONFIG, seed=43)
+    Checkpoint(path, _CONFIG, seed=42)
+
+
+def test_atomic_save(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    checkpoint = Checkpoint(path, _CONFIG)
+    checkpoint.start(0, ["a", "b"])
+    saved = path.read_text()
+    # A save failing part way through leaves the last checkpoint intact
+    with pytest.raises(TypeError):
+        checkpoint.start(1, object())
+    assert path.read_text() == saved
+    assert json.loads(saved)["underway"] == {"0": ["a", "b"]}
+
+
+class _InterruptingLog:
+    # Log stream interrupting the match after `games` results are logged
+    def __init__(self, games: int):
+        self._games = games
+
+    def info(self, message: str):
+        if message.startswith("game "):
+            self._games -= 1
+            if self._games == 0:
+                raise KeyboardInterrupt
+
+    def error(self, message: str):
+        pass
+
+
+def test_resume_match(tmp_path):
+    games, path = 4, tmp_path / "checkpoint.json"
+    with ResultsStore(tmp_path / "results.db") as store:
+        def _run(log=None):
+            checkpoint = Checkpoint(path, _CONFIG)
+            return checkpoint, run_match(_AGENT, _AGENT, games, jobs=1,
+                time_limit=0, space_limit=0, log=log, store=store,
+                seed=checkpoint.seed, checkpoint=checkpoint)
+
+        with pytest.raises(KeyboardInterrupt):
+            _run(_InterruptingLog(2))
+        checkpoint = Checkpoint(path, _CONFIG)
+        assert len(checkpoint.finished) == 2
+        # (One game queued ahead was underway, and is played again)
+        assert list(checkpoint.underway) == [2]
+        assert checkpoint.next_index == 3
+
+        checkpoint, summary = _run()
+        assert summary.games == games
+        assert sorted(result["index"] for result in checkpoint.finished) \
+            == list(range(games))
+        assert not checkpoint.underway
+
+        rows = store._db.execute("SELECT key, seed FROM games").fetchall()
+        assert sorted(rows) == sorted(
+            (checkpoint.key(index), game_seed(checkpoint.seed, index))
+            for index in range(games))
@@ -0,0 +1,55 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tests of the game sequence (`referee.game.game`).
+
+import asyncio
+import random
+
+import pytest
+
+from referee.game import Action, Player, PlayerColor, TurnBegin, \
+    TurnEnd, game
+from random_agent.program import Agent
+
+
+class _LocalPlayer(Player):
+    # Runs a random agent in this process, logging its action requests
+    def __init__(self, color: PlayerColor, events: list):
+        super().__init__(color)
+        self._agent = Agent(color)
+        self._events = events
+
+    async def action(self) -> Action:
+        self._events.append(("action", self.color))
+        return self._agent.action()
+
+    async def update(self, color: PlayerColor, action: Action):
+        self._agent.update(color, action)
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_turn_begins_before_action(pipeline):
+    random.seed(0)
+    events: list = []
+
+    async def _play():
+        players = [_LocalPlayer(color, events) for color in PlayerColor]
+        async for update in game(*players, pipeline=pipeline):
+            match update:
+                case TurnBegin(turn_id, player):
+                    events.append(("begin", player.color, turn_id))
+                case TurnEnd(turn_id, player, _):
+                    events.append(("end", player.color, turn_id))
+
+    asyncio.run(_play())
+    turns = [event for event in events if event[0] == "end"]
+    assert len(turns) > 2
+    # Each turn begins once, then its action is requested, then it ends
+    expected = [
+        step
+        for _, color, turn_id in turns
+        for step in [("begin", color, turn_id), ("action", color),
+            ("end", color, turn_id)]
+    ]
+    assert events == expected
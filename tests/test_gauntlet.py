@@ -0,0 +1,54 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tests of gauntlet ratings and scheduling (`referee.gauntlet`).
+
+from itertools import combinations
+
+import pytest
+
+from referee.gauntlet import Ratings, round_robin, swiss_pairing
+from referee.options import parse_package_spec
+
+_AGENTS = [parse_package_spec(f"agent_{i}") for i in range(5)]
+
+
+def _score(i: int, j: int) -> float:
+    # Lower-numbered agents always beat higher-numbered ones
+    return 1.0 if i < j else 0.0
+
+
+def test_dominant_agent_rated_top():
+    ratings = Ratings(_AGENTS)
+    for i, j in round_robin(len(_AGENTS), 2):
+        ratings.add(i, j, _score(i, j))
+
+    ranked = ratings.ratings()
+    assert [rating.agent for rating in ranked] == _AGENTS
+    top = ranked[0]
+    assert top.score == 1.0 and top.games == 16
+    assert top.elo > ranked[1].elo + top.error
+    assert sum(rating.elo for rating in ranked) == pytest.approx(0, abs=1e-6)
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_swiss_no_repeats(jobs):
+    ratings = Ratings(_AGENTS)
+    colors: dict[tuple[int, int], int] = {}
+    underway: list[tuple[int, int]] = []
+    pairs = len(list(combinations(range(len(_AGENTS)), 2)))
+    played: list[frozenset[int]] = []
+    while len(played) < 2 * pairs:
+        # Keep `jobs` games underway, finishing the oldest first
+        while len(underway) < jobs and len(played) < 2 * pairs:
+            i, j = swiss_pairing(ratings, underway, colors)
+            colors[i, j] = colors.get((i, j), 0) + 1
+            underway.append((i, j))
+            played.append(frozenset((i, j)))
+        i, j = underway.pop(0)
+        ratings.add(i, j, _score(i, j))
+
+    # Every pair meets once before any meets again (then colours swap)
+    assert len(set(played[:pairs])) == pairs
+    assert len(set(played[pairs:])) == pairs
+    assert len(colors) == 2 * pairs and set(colors.values()) == {1}
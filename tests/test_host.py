@@ -0,0 +1,127 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tests of agent hosts (`referee.agent.host`), each started on an ephemeral
+# port on localhost.
+
+import asyncio
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+
+from referee.agent import RemoteSocketPlayer
+from referee.agent.client import RemoteProcessClassClient
+from referee.agent.host import AgentHost, _is_loopback
+from referee.agent.remote import HostedProcess, TOKEN_ENV, \
+    _FRAME_HEADER, _REFEREE_ROLE, _authenticate, _control_frame, \
+    create_hosted_process
+from referee.game import PlayerColor
+from referee.options import parse_package_spec
+from referee.run import run_game
+
+_TOKEN = b"test-token"
+_AGENT = parse_package_spec("random_agent")
+
+
+@pytest.fixture(autouse=True)
+def _token_env(monkeypatch):
+    # Referees read the token from the environment
+    monkeypatch.setenv(TOKEN_ENV, _TOKEN.decode())
+
+
+@asynccontextmanager
+async def _host(token: bytes = _TOKEN):
+    host = AgentHost("127.0.0.1", 0, token)
+    server = await host.start()
+    async with server:
+        yield host
+
+
+def _client(address: tuple[str, int]) -> RemoteProcessClassClient:
+    return RemoteProcessClassClient(_AGENT.pkg, _AGENT.cls,
+        time_limit=10, space_limit=100, res_limit_tolerance=1.0,
+        recv_timeout=30, subproc_output=False, host=address,
+        color=PlayerColor.RED)
+
+
+def test_handshake():
+    async def _test():
+        async with _host() as host:
+            reader, writer = await asyncio.open_connection(*host.address)
+            await _authenticate(reader, writer, _TOKEN, _REFEREE_ROLE)
+            writer.close()
+    asyncio.run(_test())
+
+
+def test_wrong_token():
+    async def _test():
+        async with _host() as host:
+            with pytest.raises(ConnectionError):
+                await create_hosted_process(
+                    host.address, b"", False, token=b"wrong-token")
+        # A host with the wrong token is rejected by the referee too
+        async with _host(b"wrong-token") as host:
+            with pytest.raises(ConnectionError):
+                await create_hosted_process(host.address, b"", False)
+    asyncio.run(_test())
+
+
+def test_non_loopback_bind_needs_token(monkeypatch):
+    assert _is_loopback("127.0.0.1") and _is_loopback("::1")
+    assert _is_loopback("localhost")
+    assert not _is_loopback("0.0.0.0") and not _is_loopback("")
+    assert not _is_loopback("example.com")
+
+    monkeypatch.delenv(TOKEN_ENV)
+    proc = subprocess.run(
+        [sys.executable, "-m", "referee.agent.host", "--bind", "0.0.0.0"],
+        capture_output=True, text=True, timeout=30)
+    assert proc.returncode == 2
+    assert "token" in proc.stderr
+
+
+def test_control_frames():
+    async def _test():
+        async with _host() as host:
+            client = _client(host.address)
+            # _SPAWN, then _PID (and the constructor's ack)
+            async with client:
+                proc = client._proc
+                assert isinstance(proc, HostedProcess) and proc.pid > 0
+                assert proc.returncode is None
+            # _EXIT once the agent has exited
+            assert await proc.wait() == 0
+    asyncio.run(_test())
+
+
+def test_bad_requests_close_connection():
+    async def _test():
+        async with _host() as host:
+            for frame in (
+                _control_frame(("not a spawn request",)),
+                _FRAME_HEADER.pack(1 << 31 | 3) + b"bad", # (not a pickle)
+            ):
+                reader, writer = await asyncio.open_connection(*host.address)
+                await _authenticate(reader, writer, _TOKEN, _REFEREE_ROLE)
+                writer.write(frame)
+                await writer.drain()
+                # The host hangs up (rather than leaking the connection)
+                assert await asyncio.wait_for(reader.read(), 10) == b""
+                writer.close()
+    asyncio.run(_test())
+
+
+def test_remote_game():
+    async def _test():
+        async with _host() as host:
+            players = [
+                RemoteSocketPlayer(f"player {num}", color, _AGENT,
+                    host.address, time_limit=60, space_limit=250,
+                    subproc_output=False)
+                for num, color in enumerate(PlayerColor, 1)
+            ]
+            return await run_game(players)
+    winner = asyncio.run(_test())
+    assert winner is None or winner.color in PlayerColor
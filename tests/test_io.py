@@ -0,0 +1,157 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tests of the framing of messages between the referee and agent subprocesses
+# (`referee.agent.io`), and of its use in `referee.agent.subprocess`.
+
+import io
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from referee.agent.io import AsyncProcessStatus, InterchangeException, \
+    ReplyWriter, m_frame, m_frame_length, m_pickle, m_unframe, \
+    m_unframe_reply, _ACK, _FRAME_HEADER, _REPLY_EXC, _REPLY_OK, \
+    _SUBPROC_MODULE
+
+_STATUS = AsyncProcessStatus(0.1, 0.2, True, 1.0, 2.0)
+_LARGE = bytes(range(256)) * (1 << 16) # 16MiB
+
+
+def _unframe(frame: bytes) -> bytes:
+    # Check a frame's header against its length, returning its payload
+    header, payload = frame[:_FRAME_HEADER.size], frame[_FRAME_HEADER.size:]
+    assert m_frame_length(header) == len(payload)
+    return payload
+
+
+@pytest.mark.parametrize("o", [b"", "", (), None, _LARGE],
+    ids=["bytes", "str", "tuple", "none", "large"])
+def test_frame_round_trip(o):
+    assert m_unframe(_unframe(m_frame(o))) == o
+
+
+def test_frame_unpickleable():
+    with pytest.raises(InterchangeException):
+        m_frame(threading.Lock())
+
+
+def _reply(*objects) -> bytes:
+    stream = io.BytesIO()
+    writer = ReplyWriter(stream)
+    writer.begin()
+    for o in objects:
+        writer.dump(o)
+    writer.end()
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize("body", [(), (_REPLY_OK, b""), (_REPLY_OK, _LARGE)],
+    ids=["empty", "empty-payload", "large"])
+def test_reply_round_trip(body):
+    payload = _unframe(_reply(body, _STATUS))
+    assert m_unframe_reply(payload) == (_STATUS, *body)
+
+
+def test_reply_writer_reuse():
+    # Frames are independent of those written before them (the buffer and
+    # pickler memo are reset between replies)
+    stream = io.BytesIO()
+    writer = ReplyWriter(stream)
+    for body in [(_REPLY_OK, _LARGE), (_REPLY_OK, "x"), (_REPLY_OK, "x")]:
+        writer.begin()
+        writer.dump(body)
+        writer.dump(_STATUS)
+        writer.end()
+    frames = stream.getvalue()
+    first = _FRAME_HEADER.size + m_frame_length(frames[:_FRAME_HEADER.size])
+    assert frames[first:] == _reply((_REPLY_OK, "x"), _STATUS) * 2
+
+
+def test_reply_writer_unpickleable():
+    # A failed dump leaves the frame as it was
+    stream = io.BytesIO()
+    writer = ReplyWriter(stream)
+    writer.begin()
+    with pytest.raises(InterchangeException):
+        writer.dump((_REPLY_OK, threading.Lock()))
+    writer.dump((_REPLY_OK, "fallback"))
+    writer.dump(_STATUS)
+    writer.end()
+    assert stream.getvalue() == _reply((_REPLY_OK, "fallback"), _STATUS)
+
+
+_AGENT = """
+import threading
+
+class UnpickleableError(Exception):
+    def __init__(self):
+        super().__init__("no pickling")
+        self.lock = threading.Lock()
+
+class Agent:
+    def __init__(self, **referee):
+        pass
+
+    def result(self, **referee):
+        return threading.Lock()
+
+    def error(self, **referee):
+        raise UnpickleableError()
+"""
+
+
+@pytest.fixture
+def agent_proc(tmp_path):
+    (tmp_path / "unpickleable_agent.py").write_text(_AGENT)
+    payload = m_pickle(("unpickleable_agent", "Agent", 0, 0, 1.0, "process",
+        "rss", False, "full", None, (), {}))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", _SUBPROC_MODULE, payload],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL, cwd=Path(__file__).parent.parent,
+        env={**os.environ, "PYTHONPATH": str(tmp_path)})
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def _recv_reply(proc: subprocess.Popen) -> tuple:
+    assert proc.stdout is not None
+    header = proc.stdout.read(_FRAME_HEADER.size)
+    return m_unframe_reply(proc.stdout.read(m_frame_length(header)))
+
+
+def _send(proc: subprocess.Popen, data: bytes):
+    assert proc.stdin is not None
+    proc.stdin.write(data)
+    proc.stdin.flush()
+
+
+def test_subprocess_unpickleable_reply(agent_proc):
+    assert _recv_reply(agent_proc)[1:] == (_REPLY_OK, _ACK)
+
+    _send(agent_proc, m_frame(("result", (), {})))
+    status, *body = _recv_reply(agent_proc)
+    assert isinstance(status, AsyncProcessStatus)
+    assert body == [_REPLY_OK, "<unpickleable>"]
+
+    _send(agent_proc, m_frame(("error", (), {})))
+    _, reply, e, stacktrace_str = _recv_reply(agent_proc)
+    assert reply == _REPLY_EXC
+    assert isinstance(e, RuntimeError)
+    assert str(e) == "UnpickleableError: no pickling"
+    assert "UnpickleableError" in stacktrace_str
+
+
+def test_subprocess_truncated_header(agent_proc):
+    _recv_reply(agent_proc)
+    # EOF part way through a header ends the process cleanly
+    _send(agent_proc, m_frame(("result", (), {}))[:_FRAME_HEADER.size - 1])
+    assert agent_proc.stdin is not None
+    agent_proc.stdin.close()
+    assert agent_proc.wait(timeout=30) == 0
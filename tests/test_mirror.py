@@ -0,0 +1,32 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tests of the shared-memory board mirror (`referee.game.mirror`).
+
+import time
+
+import pytest
+
+from referee.game import PlayerColor
+from referee.game.mirror import BoardMirror, BoardMirrorView, _SEQ
+
+
+def test_read():
+    with BoardMirror() as mirror:
+        view = BoardMirrorView(mirror.name)
+        state = view.read()
+        assert (state.turn_count, state.turn_color) == (0, PlayerColor.RED)
+        assert state.legal_move_count > 0 and state.occupancy() == {}
+        view.close()
+
+
+def test_read_gives_up_on_unfinished_update():
+    with BoardMirror() as mirror:
+        view = BoardMirrorView(mirror.name)
+        # A writer that died part way through an update (odd `seq`)
+        _SEQ.pack_into(mirror._shm.buf, 0, 1)
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            view.read()
+        assert time.monotonic() - start < 10
+        view.close()
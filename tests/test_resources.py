@@ -0,0 +1,106 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from referee.agent.resources import CountdownTimer, MemoryWatcher, \
+    accounting_clock, children_cpu_time, set_space_line
+
+_WORK = 0.5 # Seconds of CPU-bound work per timed call
+
+
+def _busy(seconds: float):
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        pass
+
+
+def _charged(mode: str, space: MemoryWatcher | None) -> float:
+    # Time charged for a CPU-bound call, less the CPU time of the call itself
+    timer = CountdownTimer(0, clock=accounting_clock(mode), collect=False)
+    start = time.thread_time()
+    if space is not None:
+        with space, timer:
+            _busy(_WORK)
+    else:
+        with timer:
+            _busy(_WORK)
+    return timer.delta() - (time.thread_time() - start)
+
+
+@pytest.mark.parametrize("mode", ["process", "tree"])
+def test_sampler_not_charged(mode):
+    set_space_line("uss")
+    space = MemoryWatcher(0, mode="uss")
+    assert space.enabled()
+    without = _charged(mode, None)
+    with_sampler = _charged(mode, space)
+    # The memory sampler's CPU time (sampling USS at 200Hz throughout the
+    # call) isn't charged to the agent
+    assert abs(with_sampler - without) < 0.01 * _WORK
+
+
+def test_tree_counts_waited_for_grandchildren():
+    # A running child whose own (exited) child did the work
+    busy = f"import time\nwhile time.process_time() < {_WORK}: pass"
+    child = f"import subprocess, sys, time\n" \
+        f"subprocess.run([sys.executable, '-c', {busy!r}])\n" \
+        f"print(flush=True)\ntime.sleep(30)"
+    proc = subprocess.Popen([sys.executable, "-c", child],
+        stdout=subprocess.PIPE)
+    try:
+        proc.stdout.readline()
+        assert children_cpu_time() >= _WORK
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_tree_clock_monotonic():
+    clock = accounting_clock("tree")
+    readings = []
+    for _ in range(5):
+        subprocess.run([sys.executable, "-c", "pass"])
+        readings.append(clock())
+    assert readings == sorted(readings)
+
+
+_LIMIT = 3 # Seconds
+
+_SWALLOWING_AGENT = """
+from random_agent.program import Agent as _Agent
+
+class Agent(_Agent):
+    def action(self, **referee):
+        while True:
+            try:
+                while True:
+                    pass
+            except Exception:
+                pass # (including the referee's ResourceLimitException)
+"""
+
+
+@pytest.mark.parametrize("mode", ["process", "tree"])
+def test_swallowed_deadline(tmp_path, mode):
+    # An agent that catches the deadline's exception and carries on is still
+    # cut off promptly: soon after its time limit, rather than at the CPU
+    # rlimit (over twice the limit) or the receive timeout
+    (tmp_path / "swallowing_agent").mkdir()
+    (tmp_path / "swallowing_agent" / "__init__.py").write_text(
+        _SWALLOWING_AGENT)
+    env = {**os.environ, "PYTHONPATH": str(tmp_path)}
+    start = time.monotonic()
+    proc = subprocess.run(
+        [sys.executable, "-m", "referee", "-t", str(_LIMIT), "-v", "1",
+            "--time-accounting", mode, "swallowing_agent", "random_agent"],
+        capture_output=True, text=True, timeout=60, env=env,
+        cwd=Path(__file__).parent.parent)
+    assert "exceeded available time" in proc.stdout
+    assert time.monotonic() - start < _LIMIT + 3
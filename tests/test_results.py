@@ -0,0 +1,91 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Tests of the results store and its statistics (`referee.results`).
+
+import math
+
+import pytest
+
+from referee.game import PlayerColor
+from referee.results import GameRecord, MoveRecord, ResultsStore, \
+    percentile, wilson_interval
+
+
+def test_wilson_interval():
+    assert wilson_interval(0.5, 0) == (0.0, 1.0)
+    low, high = wilson_interval(0.5, 100)
+    assert low == pytest.approx(0.4038, abs=1e-4)
+    assert high == pytest.approx(0.5962, abs=1e-4)
+    low, high = wilson_interval(1.0, 10)
+    assert low == pytest.approx(0.7225, abs=1e-4) and high == 1.0
+    low, high = wilson_interval(0.0, 10)
+    assert low == 0.0 and high == pytest.approx(0.2775, abs=1e-4)
+
+
+def test_percentile():
+    values = [float(v) for v in range(10, 0, -1)]
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 50) == 5.0
+    assert percentile(values, 95) == 10.0
+    assert percentile(values, 100) == 10.0
+    assert percentile([3.0], 99) == 3.0
+    assert math.isnan(percentile([], 50))
+
+
+def _move(turn: int, color: PlayerColor, cpu: float, space: float = 1.0):
+    return MoveRecord(turn, color, time_delta=cpu, time_used=cpu,
+        compute=2 * cpu, space_curr=space, space_peak=space)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ResultsStore(tmp_path / "results.db") as store:
+        yield store
+
+
+def test_add_replaces_by_key(store):
+    store.add(GameRecord("a", "b", winner=PlayerColor.RED,
+        key="t:0", moves=[_move(1, PlayerColor.RED, 0.1)]))
+    game_id = store.add(GameRecord("a", "b", winner=PlayerColor.BLUE,
+        key="t:0", moves=[_move(1, PlayerColor.RED, 0.2)]))
+    # Games without a key are never replaced
+    store.add(GameRecord("a", "b"))
+    store.add(GameRecord("a", "b"))
+
+    rows = store._db.execute(
+        "SELECT key, winner FROM games ORDER BY id").fetchall()
+    assert rows == [("t:0", "BLUE"), (None, None), (None, None)]
+    # (The replaced game's moves go with it)
+    assert store._db.execute(
+        "SELECT game_id, time_delta FROM moves").fetchall() \
+        == [(game_id, 0.2)]
+
+
+def test_win_rates(store):
+    for winner in [PlayerColor.RED, PlayerColor.RED, None]:
+        store.add(GameRecord("a", "b", winner=winner))
+    store.add(GameRecord("b", "a", winner=PlayerColor.BLUE))
+
+    a, b = store.win_rates()
+    assert (a.agent, a.games, a.wins, a.draws, a.losses) == ("a", 4, 3, 1, 0)
+    assert (b.agent, b.games, b.wins, b.draws, b.losses) == ("b", 4, 0, 1, 3)
+    assert a.score == 0.875 and b.score == 0.125
+    assert (a.low, a.high) == wilson_interval(0.875, 4)
+    assert (b.low, b.high) == wilson_interval(0.125, 4)
+
+
+def test_move_latencies(store):
+    store.add(GameRecord("a", "b", moves=[
+        _move(turn, PlayerColor.RED if turn % 2 else PlayerColor.BLUE,
+            cpu=turn / 100, space=turn)
+        for turn in range(1, 21)
+    ]))
+
+    a, b = store.move_latencies()
+    # RED (a) moves on odd turns, BLUE (b) on even turns
+    assert (a.agent, a.moves, a.space_peak) == ("a", 10, 19)
+    assert a.cpu == {50: 0.09, 95: 0.19, 99: 0.19}
+    assert a.wall == {50: 0.18, 95: 0.38, 99: 0.38}
+    assert (b.agent, b.moves, b.space_peak) == ("b", 10, 20)
+    assert b.cpu == {50: 0.10, 95: 0.20, 99: 0.20}
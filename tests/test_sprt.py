@@ -0,0 +1,51 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Run with `python -m pytest tests`.
+
+import math
+
+import pytest
+
+from referee.match import MatchSummary, Sprt
+from referee.options import parse_package_spec
+
+_A = parse_package_spec("random_agent")
+_SPRT = Sprt(0, 50)
+
+
+def _summary(wins: int = 0, draws: int = 0, losses: int = 0) -> MatchSummary:
+    return MatchSummary(_A, _A, games=wins + draws + losses,
+        wins=wins, draws=draws, losses=losses)
+
+
+def test_no_games():
+    assert _SPRT.llr(_summary()) == 0.0
+    assert _SPRT.decision(_summary()) is None
+
+
+@pytest.mark.parametrize("draws", [1, 2, 10, 1000])
+def test_all_draws(draws):
+    llr = _SPRT.llr(_summary(draws=draws))
+    assert math.isfinite(llr)
+    # A scores 1/2, so the evidence favours H0 (A is no stronger) over H1
+    assert llr < 0
+
+
+@pytest.mark.parametrize("games", [1, 2, 10, 100])
+def test_all_wins(games):
+    llr = _SPRT.llr(_summary(wins=games))
+    assert math.isfinite(llr) and llr > 0
+
+
+@pytest.mark.parametrize("games", [1, 2, 10, 100])
+def test_all_losses(games):
+    llr = _SPRT.llr(_summary(losses=games))
+    assert math.isfinite(llr) and llr < 0
+
+
+def test_decisions():
+    assert _SPRT.decision(_summary(wins=1000)) == "H1"
+    assert _SPRT.decision(_summary(losses=1000)) == "H0"
+    assert _SPRT.decision(_summary(draws=10000)) == "H0"
+    assert _SPRT.decision(_summary(wins=1, losses=1)) is None